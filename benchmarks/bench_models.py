@@ -0,0 +1,245 @@
+# Time the model engines across grid size, density, move range and number
+# of races: populate(), a single update() iteration and a full run, with
+# the cost per agent step and the peak memory of a populate + iteration.
+# Results can be saved as a baseline and later runs compared against it.
+#
+#     python benchmarks/bench_models.py --save baseline.json
+#     python benchmarks/bench_models.py --compare baseline.json
+#     python benchmarks/bench_models.py --models virus --engines grid jit \
+#         --sizes 200 1000 2000 --iters 50
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the shared modules live once in common/, so the two model directories
+# have no module names in common and can both go on the path
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+sys.path.insert(0, os.path.join(ROOT, 'infection-model'))
+sys.path.insert(0, os.path.join(ROOT, 'schelling-model'))
+
+import numpy as np  # noqa: E402
+from infection_model import VirusModel  # noqa: E402
+from virus_grid import VirusGridModel  # noqa: E402
+from virus_jit import VirusJitModel  # noqa: E402
+from schelling_model import Schelling  # noqa: E402
+from schelling_grid import SchellingGrid  # noqa: E402
+from schelling_jit import SchellingJit  # noqa: E402
+from jit import HAVE_NUMBA  # noqa: E402
+
+VIRUS_ENGINES = {'dict': VirusModel, 'grid': VirusGridModel,
+                 'jit': VirusJitModel}
+SCHELLING_ENGINES = {'dict': Schelling, 'grid': SchellingGrid,
+                     'jit': SchellingJit}
+
+
+class Case(object):
+    """
+    One benchmark: a model engine with one set of parameters.
+    """
+
+    def __init__(self, model, engine, params, make, run):
+        super(Case, self).__init__()
+        self.model = model
+        self.engine = engine
+        self.params = params
+        # make(num_iter) returns a fresh model, run(model) updates it
+        self.make = make
+        self.run = run
+
+    @property
+    def key(self):
+        return "/".join([self.model, self.engine] +
+                        ["{}={}".format(name, value)
+                         for name, value in sorted(self.params.items())])
+
+
+def virus_case(engine, size, ratio_empty, max_range, seed):
+    cls = VIRUS_ENGINES[engine]
+    return Case('virus', engine,
+                {'size': size, 'ratio_empty': ratio_empty,
+                 'max_range': max_range},
+                lambda num_iter: cls("bench", size, size, 0.03, 14,
+                                     ratio_empty, 0.01, num_iter, max_range,
+                                     seed=seed),
+                lambda model: model.update(False))
+
+
+def schelling_case(engine, size, ratio_empty, num_races, seed):
+    cls = SCHELLING_ENGINES[engine]
+    return Case('schelling', engine,
+                {'size': size, 'ratio_empty': ratio_empty,
+                 'num_races': num_races},
+                lambda num_iter: cls(size, size, ratio_empty, 0.5, num_iter,
+                                     num_races, seed=seed),
+                lambda model: model.update())
+
+
+def cases(args):
+    """
+    This function yields the cases to run. Every axis is varied on its
+    own around the base point, so the cases grow with the sum of the
+    axis lengths, not their product.
+    """
+    base_ratio = args.ratios[0]
+    for engine in args.engines:
+        if 'virus' in args.models:
+            points = set()
+            points.update((size, base_ratio, 1) for size in args.sizes)
+            points.update((args.base_size, ratio, 1) for ratio in args.ratios)
+            points.update((args.base_size, base_ratio, max_range)
+                          for max_range in args.ranges)
+            for point in sorted(points):
+                yield virus_case(engine, *point, seed=args.seed)
+
+        if 'schelling' in args.models:
+            points = set()
+            points.update((size, base_ratio, 2) for size in args.sizes)
+            points.update((args.base_size, ratio, 2) for ratio in args.ratios)
+            points.update((args.base_size, base_ratio, num_races)
+                          for num_races in args.races)
+            for point in sorted(points):
+                yield schelling_case(engine, *point, seed=args.seed)
+
+
+def measure(case, iters, repeat):
+    """
+    This function returns the best wall times of populate(), of one
+    update() iteration and of a run of up to iters iterations, the cost
+    per agent step of the run and the peak memory of populate() plus one
+    iteration.
+    """
+    populate = step = run = float('inf')
+    for _ in range(repeat):
+        model = case.make(1)
+        start = time.perf_counter()
+        model.populate()
+        populate = min(populate, time.perf_counter() - start)
+        start = time.perf_counter()
+        case.run(model)
+        step = min(step, time.perf_counter() - start)
+
+        model = case.make(iters)
+        model.populate()
+        start = time.perf_counter()
+        case.run(model)
+        run = min(run, time.perf_counter() - start)
+
+    n_cells = case.params['size'] ** 2
+    n_agents = n_cells - int(case.params['ratio_empty'] * n_cells)
+    # the virus models also record the initial population
+    n_steps = model.n_recorded - 1 if case.model == 'virus' \
+        else model.n_recorded
+
+    tracemalloc.start()
+    model = case.make(1)
+    model.populate()
+    case.run(model)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'populate_ms': populate * 1e3,
+            'step_ms': step * 1e3,
+            'run_ms': run * 1e3,
+            'steps': n_steps,
+            'agents': n_agents,
+            'ns_per_agent_step': run * 1e9 / max(n_agents * n_steps, 1),
+            'peak_kib': peak / 1024}
+
+
+def compare(results, baseline, tolerance):
+    """
+    This function prints how the results changed against a baseline and
+    returns the keys of the cases that got slower by more than
+    tolerance.
+    """
+    row = "{:<64}{:>12}{:>12}{:>9}"
+    print()
+    print(row.format("case", "base ms", "now ms", "ratio"))
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]['run_ms']
+        ratio = result['run_ms'] / before if before else float('inf')
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = "  slower"
+        print(row.format(key, "{:.2f}".format(before),
+                         "{:.2f}".format(result['run_ms']),
+                         "{:.2f}".format(ratio)) + flag)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the model engines across grid size, density, "
+                    "range and number of races")
+    parser.add_argument('--models', nargs='+', default=['virus', 'schelling'],
+                        choices=['virus', 'schelling'])
+    parser.add_argument('--engines', nargs='+',
+                        default=['dict', 'grid'] + (['jit'] if HAVE_NUMBA
+                                                    else []),
+                        choices=sorted(VIRUS_ENGINES))
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[50, 200, 1000])
+    parser.add_argument('--base-size', type=int, default=200,
+                        help="grid size used when varying the other axes")
+    parser.add_argument('--ratios', type=float, nargs='+',
+                        default=[0.9, 0.3, 0.6, 0.95],
+                        help="ratio_empty values, the first is the base")
+    parser.add_argument('--ranges', type=int, nargs='+', default=[1, 2, 3, 5])
+    parser.add_argument('--races', type=int, nargs='+', default=[2, 3, 5, 7])
+    parser.add_argument('--iters', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', default=None,
+                        help="write the results to this JSON baseline")
+    parser.add_argument('--compare', default=None,
+                        help="compare the results with this JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="slowdown of a full run reported as a regression")
+    args = parser.parse_args()
+
+    row = "{:<64}{:>10}{:>10}{:>11}{:>8}{:>14}{:>12}"
+    print(row.format("case", "pop ms", "step ms", "run ms", "steps",
+                     "ns/agent-step", "peak KiB"))
+    results = {}
+    for case in cases(args):
+        result = measure(case, args.iters, args.repeat)
+        results[case.key] = result
+        print(row.format(case.key,
+                         "{:.2f}".format(result['populate_ms']),
+                         "{:.2f}".format(result['step_ms']),
+                         "{:.2f}".format(result['run_ms']),
+                         result['steps'],
+                         "{:.1f}".format(result['ns_per_agent_step']),
+                         "{:.0f}".format(result['peak_kib'])))
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump({'meta': {'python': platform.python_version(),
+                                'numpy': np.__version__,
+                                'numba': HAVE_NUMBA,
+                                'machine': platform.platform(),
+                                'iters': args.iters},
+                       'results': results}, f, indent=1, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n{} case(s) slower than the baseline by more than "
+                  "{:.0f}%".format(len(regressions), args.tolerance * 100))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Compare the per-iteration agent snapshot taken by the update() loops:
+# the copy.deepcopy of the agent dicts they used to make against the
+# tuple of keys they take now.
+#
+#     python benchmarks/bench_snapshot.py --sizes 50 200 1000
+
+import argparse
+import copy
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the shared modules live once in common/, so the two model directories
+# have no module names in common and can both go on the path
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+sys.path.insert(0, os.path.join(ROOT, 'infection-model'))
+sys.path.insert(0, os.path.join(ROOT, 'schelling-model'))
+
+from infection_model import VirusModel  # noqa: E402
+from schelling_model import Schelling  # noqa: E402
+
+
+def deepcopy_snapshot(dicts):
+    return [copy.deepcopy(d) for d in dicts]
+
+
+def key_snapshot(dicts):
+    return [tuple(d) for d in dicts]
+
+
+def measure(snapshot, dicts, repeat):
+    """
+    This function returns the best wall time over repeat calls of
+    snapshot(dicts) and the peak memory allocated by one call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        snapshot(dicts)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    snapshot(dicts)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def models(size, ratio_empty):
+    schelling = Schelling(size, size, ratio_empty, 0.3, 1, seed=0)
+    schelling.populate()
+    yield "Schelling", [schelling.agents]
+
+    virus = VirusModel("bench", size, size, 0.03, 14, ratio_empty, 0.01, 1,
+                       seed=0)
+    virus.populate()
+    yield "VirusModel", [virus.healthy_agents, virus.infected_agents]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the per-iteration agent snapshot")
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[50, 200, 1000])
+    parser.add_argument('--ratio-empty', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    row = "{:<11}{:>6}{:>10}{:>14}{:>12}{:>16}{:>14}"
+    print(row.format("model", "size", "agents", "deepcopy ms",
+                     "keys ms", "deepcopy KiB", "keys KiB"))
+    for size in args.sizes:
+        for name, dicts in models(size, args.ratio_empty):
+            n_agents = sum(len(d) for d in dicts)
+            t_deep, m_deep = measure(deepcopy_snapshot, dicts, args.repeat)
+            t_keys, m_keys = measure(key_snapshot, dicts, args.repeat)
+            print(row.format(name, size, n_agents,
+                             "{:.2f}".format(t_deep * 1e3),
+                             "{:.2f}".format(t_keys * 1e3),
+                             "{:.0f}".format(m_deep / 1024),
+                             "{:.0f}".format(m_keys / 1024)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# caching simulation runs on disk
+
+import os
+import numpy as np
+from results import run_key, run_metadata, save_run, load_run
+
+
+class RunCache(object):
+    """
+    An on-disk cache of finished runs. A run is keyed by the model
+    class, its ENGINE_VERSION, its parameters and its seed, and holds the
+    metrics and the final state. A cache hit refreshes the file's
+    modification time, and whenever the cache grows past max_bytes the
+    least recently used runs are deleted.
+
+    Only seeded runs are cached, since a run with seed=None is never
+    the same twice; get() and put() ignore them.
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        super(RunCache, self).__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, model):
+        """
+        This method returns the cache file of a model's run.
+        """
+        metadata = run_metadata(model)
+        key = run_key(metadata['model'], metadata['engine_version'],
+                      metadata['params'], metadata['seed'])
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, model):
+        """
+        This method returns the cached run of model (see
+        results.load_run), or None when it has not been cached.
+        """
+        if not model.seeded:
+            return None
+        path = self.path(model)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        run = load_run(path)
+        # a run cached before the final state was kept in checkpoint
+        # form cannot be put back
+        return run if 'rng_state' in run else None
+
+    def put(self, model):
+        """
+        This method caches the finished run of model.
+        """
+        if not model.seeded:
+            return
+        save_run(self.path(model), model, with_state=True)
+        self.evict()
+
+    def run(self, model, *args, **kwargs):
+        """
+        This method populates and updates model, unless its run is
+        cached, in which case the cached metrics and final state are
+        loaded into it instead. Extra arguments go to model.update().
+
+        The key of a run is its parameters and seed, which only say what
+        a fresh model does. A model that was populated, stepped or
+        resumed before is updated as it is, without populating it
+        again, and a model without a seed is run in full; neither run is
+        cached.
+
+        Returns:
+        hit : boolean
+                Whether the run came from the cache
+        """
+        if not self.fresh(model):
+            model.update(*args, **kwargs)
+            return False
+        run = self.get(model)
+        if run is not None:
+            model.load_result(run)
+            return True
+        model.populate()
+        model.update(*args, **kwargs)
+        self.put(model)
+        return False
+
+    def fresh(self, model):
+        """
+        This method tells whether model is as it was built: nothing
+        recorded, no iteration done and its random stream untouched.
+        """
+        unused = np.random.default_rng(model.seed_sequence)
+        return model.n_recorded == 0 and model.iteration == 0 and \
+            model.rng.bit_generator.state == unused.bit_generator.state
+
+    def size(self):
+        """
+        This method returns the total size of the cached runs in bytes.
+        """
+        return sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory)
+                   if name.endswith(".npz"))
+
+    def evict(self):
+        """
+        This method deletes the least recently used runs until the cache
+        fits in max_bytes.
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in files:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        """
+        This method deletes every cached run.
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.directory, name))
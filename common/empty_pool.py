@@ -0,0 +1,56 @@
+# empty cell pool
+
+
+class EmptyPool(object):
+    """
+    The set of empty cells on a grid. Cells are kept in a list so that a
+    uniform random pick is a single index; a dict maps every cell to its
+    slot in that list. Removing a cell moves the last cell into the freed
+    slot, so add, remove, choice and membership tests are all O(1).
+    """
+
+    def __init__(self, cells=()):
+        super(EmptyPool, self).__init__()
+        self.cells = list(cells)
+        self.index = {cell: i for i, cell in enumerate(self.cells)}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return cell in self.index
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def add(self, cell):
+        """
+        This method marks a cell as empty.
+        """
+        if cell not in self.index:
+            self.index[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def remove(self, cell):
+        """
+        This method marks a cell as occupied. Raises KeyError if the
+        cell is not empty.
+        """
+        i = self.index.pop(cell)
+        last = self.cells.pop()
+        if i < len(self.cells):
+            # fill the hole with the last cell
+            self.cells[i] = last
+            self.index[last] = i
+
+    def choice(self, roll):
+        """
+        This method returns a uniformly random empty cell.
+
+        Parameters:
+        -----------
+        roll : float
+                A uniform draw in [0, 1), e.g. from numpy's Generator.random
+        """
+        n = len(self.cells)
+        return self.cells[min(int(roll * n), n - 1)]
@@ -0,0 +1,195 @@
+# Opt-in profiling of a model run. Instruments wraps the methods of one
+# model instance with timers and counters, so a model that is not
+# instrumented runs exactly the code it always did, e.g.
+#
+#     instruments = Instruments(model)
+#     instruments.observe(lambda model, i: print(i, model.n_recorded))
+#     model.populate()
+#     model.update(False)
+#     log.info(json.dumps(instruments.summary()))
+
+import functools
+import time
+from empty_pool import EmptyPool
+from neighbors import Neighborhood
+
+# the model methods that are timed when a model has them; times include
+# the methods they call
+PHASES = ('populate', 'update', 'step', 'step_synchronous', 'update_dirty',
+          'died', 'recovered', 'contracted', 'is_unsatisfied', 'pick_empty',
+          'move_to_empty', 'move_agent', 'move_all', 'count_all',
+          'snapshot', 'plot')
+
+COUNTERS = ('neighbor_lookups', 'neighbor_cells', 'grid_counts',
+            'moves_attempted', 'moves_blocked', 'pool_adds', 'pool_removes',
+            'pool_choices')
+
+
+class Instruments(object):
+    """
+    Phase timers, counters and per-iteration observers for one model.
+
+    Timers record the number of calls and the wall time of every method
+    in PHASES. Counters record neighbor lookups and the cells they
+    returned, whole-grid neighbor counts, moves attempted and blocked
+    (no empty spot in reach, VirusModel only; a Schelling agent always
+    finds a house, so its moves are the move_to_empty calls) and
+    operations on the pool of empty cells.
+    Observers are called as observer(model, i) after the metrics of
+    iteration i are recorded, i counting recorded rows.
+    """
+
+    def __init__(self, model=None):
+        super(Instruments, self).__init__()
+        self.phases = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.observers = []
+        self.iterations = 0
+        self.model = None
+        # (object, attribute) pairs wrapped on the instance
+        self.wrapped = []
+        if model is not None:
+            self.attach(model)
+
+    def observe(self, observer):
+        """
+        This method adds a per-iteration observer.
+        """
+        self.observers.append(observer)
+
+    def attach(self, model):
+        """
+        This method instruments the model.
+        """
+        if self.model is not None:
+            self.detach()
+        self.model = model
+        for name in PHASES:
+            if hasattr(model, name):
+                self.wrap(model, name, self.timed(name, getattr(model, name)))
+        if hasattr(model, 'pick_empty'):
+            self.wrap(model, 'pick_empty',
+                      self.counted_moves(getattr(model, 'pick_empty')))
+        self.wrap(model, 'record', self.observed(model.record))
+        for name in ('populate', 'load_state_arrays',
+                     'load_checkpoint_arrays'):
+            if hasattr(model, name):
+                # these replace the pool of empty cells
+                self.wrap(model, name, self.repooled(getattr(model, name)))
+        for value in list(vars(model).values()):
+            if isinstance(value, Neighborhood):
+                self.attach_neighborhood(value)
+        self.attach_pools()
+
+    def detach(self):
+        """
+        This method removes the instrumentation from the model.
+        """
+        for obj, name in reversed(self.wrapped):
+            vars(obj).pop(name, None)
+        self.wrapped = []
+        self.model = None
+
+    def wrap(self, obj, name, wrapper):
+        setattr(obj, name, wrapper)
+        self.wrapped.append((obj, name))
+
+    def timed(self, name, method):
+        stats = self.phases.setdefault(name, [0, 0.0])
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+        return wrapper
+
+    def counted(self, name, method):
+        counters = self.counters
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            counters[name] += 1
+            return result
+        return wrapper
+
+    def counted_moves(self, method):
+        counters = self.counters
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            spot = method(*args, **kwargs)
+            counters['moves_attempted'] += 1
+            if spot is None:
+                counters['moves_blocked'] += 1
+            return spot
+        return wrapper
+
+    def observed(self, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            self.iterations += 1
+            for observer in self.observers:
+                observer(self.model, self.model.n_recorded - 1)
+            return result
+        return wrapper
+
+    def repooled(self, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            self.attach_pools()
+            return result
+        return wrapper
+
+    def attach_neighborhood(self, neighborhood):
+        """
+        This method counts the lookups of a neighbors.Neighborhood.
+        """
+        counters = self.counters
+        cells = neighborhood.cells
+
+        @functools.wraps(cells)
+        def counted_cells(cell):
+            result = cells(cell)
+            counters['neighbor_lookups'] += 1
+            counters['neighbor_cells'] += len(result)
+            return result
+        self.wrap(neighborhood, 'cells', counted_cells)
+        self.wrap(neighborhood, 'count',
+                  self.counted('grid_counts', neighborhood.count))
+
+    def attach_pools(self):
+        """
+        This method counts the operations on the model's pools of empty
+        cells.
+        """
+        for pool in list(vars(self.model).values()):
+            if isinstance(pool, EmptyPool) and 'add' not in vars(pool):
+                self.wrap(pool, 'add', self.counted('pool_adds', pool.add))
+                self.wrap(pool, 'remove',
+                          self.counted('pool_removes', pool.remove))
+                self.wrap(pool, 'choice',
+                          self.counted('pool_choices', pool.choice))
+
+    def summary(self):
+        """
+        This method returns what was measured as a dict of plain values,
+        ready for json.dumps.
+
+        Returns:
+        summary : dict
+                'iterations' (recorded rows), 'phases' ({name: {'calls',
+                'seconds'}} for the phases that ran) and 'counters'
+        """
+        return {'model': type(self.model).__name__ if self.model else None,
+                'iterations': self.iterations,
+                'phases': {name: {'calls': calls, 'seconds': seconds}
+                           for name, (calls, seconds) in self.phases.items()
+                           if calls},
+                'counters': dict(self.counters)}
@@ -0,0 +1,52 @@
+# Optional Numba support. With numba installed, njit compiles the kernels
+# of the *_jit engines to machine code; without it they run as plain
+# Python over the same arrays, which gives the same results, only slower.
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """
+        This function stands in for numba.njit and returns the function
+        unchanged, used bare (@njit) or with options (@njit(cache=True)).
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda function: function
+
+
+# The dict engines visit agents in dict insertion order. The jit engines
+# keep that order in a log: an array of cells in insertion order, where
+# pos[cell] is the slot of the cell's current entry, or -1 once its agent
+# is gone. Removing an agent leaves its entry behind; compact_log() drops
+# the stale entries.
+
+@njit(cache=True)
+def append_log(log, n, pos, cell):
+    """
+    This function appends cell to the first n entries of log and returns
+    the new length.
+    """
+    log[n] = cell
+    pos[cell] = n
+    return n + 1
+
+
+@njit(cache=True)
+def compact_log(log, n, pos):
+    """
+    This function drops the entries of log[:n] that are no longer the
+    current entry of their cell and returns the new length. The order of
+    the live entries is kept.
+    """
+    k = 0
+    for j in range(n):
+        cell = log[j]
+        if pos[cell] == j:
+            log[k] = cell
+            pos[cell] = k
+            k += 1
+    return k
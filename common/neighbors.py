@@ -0,0 +1,199 @@
+# neighbor queries on a grid
+
+import itertools
+import numpy as np
+
+
+def moore_offsets(radius=1, include_center=False):
+    """
+    This function returns the (dx, dy) offsets of a Moore neighborhood,
+    the (2 * radius + 1) square around a cell, in row-major order.
+    """
+    span = range(-radius, radius + 1)
+    return [(dx, dy) for dx, dy in itertools.product(span, span)
+            if include_center or (dx, dy) != (0, 0)]
+
+
+def von_neumann_offsets(radius=1, include_center=False):
+    """
+    This function returns the (dx, dy) offsets of a von Neumann
+    neighborhood, the cells within a Manhattan distance of radius, in
+    row-major order.
+    """
+    return [(dx, dy) for dx, dy in moore_offsets(radius, include_center)
+            if abs(dx) + abs(dy) <= radius]
+
+
+OFFSETS = {'moore': moore_offsets, 'von_neumann': von_neumann_offsets}
+BOUNDARIES = ('bounded', 'torus')
+
+
+class Neighborhood(object):
+    """
+    The neighbors of the cells of a grid. The offset table is built once;
+    looking up a cell's neighbors only adds the offsets and applies the
+    boundary rule: 'bounded' drops cells outside the grid, 'torus' wraps
+    them around to the other side.
+
+    Array code works with flat cell indices (x * size_y + y) instead:
+    table() holds the neighbors of every cell in CSR form and count()
+    counts set neighbors for a whole grid at once.
+
+    Parameters:
+    -----------
+    shape : tuple
+            The size of the grid along x and y
+    radius : integer
+            The reach of the neighborhood
+    kind : string
+            'moore' or 'von_neumann'
+    boundary : string
+            'bounded' or 'torus'. A torus must be at least 2 * radius + 1
+            cells along each axis, or a neighborhood would wrap onto
+            itself and hold the same cell twice.
+    include_center : boolean
+            Whether a cell is its own neighbor
+    """
+
+    def __init__(self, shape, radius=1, kind='moore', boundary='bounded',
+                 include_center=False):
+        super(Neighborhood, self).__init__()
+        if kind not in OFFSETS:
+            raise ValueError("unknown neighborhood {!r}".format(kind))
+        if boundary not in BOUNDARIES:
+            raise ValueError("unknown boundary {!r}".format(boundary))
+        if boundary == 'torus' and min(shape) < 2 * radius + 1:
+            raise ValueError("a torus of shape {} is too small for radius "
+                             "{}".format(tuple(shape), radius))
+        self.shape = tuple(shape)
+        self.radius = radius
+        self.kind = kind
+        self.boundary = boundary
+        self.offsets = OFFSETS[kind](radius, include_center)
+        # CSR neighbor table, built by table() on first use, and the
+        # distance of every entry, built by table_distances()
+        self.indptr = None
+        self.indices = None
+        self.distances = None
+
+    def cells(self, cell):
+        """
+        This method returns the list of neighbors of cell.
+        """
+        x, y = cell
+        size_x, size_y = self.shape
+        if self.boundary == 'torus':
+            return [((x + dx) % size_x, (y + dy) % size_y)
+                    for dx, dy in self.offsets]
+        return [(x + dx, y + dy) for dx, dy in self.offsets
+                if 0 <= x + dx < size_x and 0 <= y + dy < size_y]
+
+    def shift(self, xs, ys, dx, dy):
+        """
+        This method moves arrays of cells by one offset.
+
+        Returns:
+        xs, ys : numpy arrays
+                The shifted cells
+        inside : numpy array of bool
+                Which shifted cells are on the grid
+        """
+        xs = np.asarray(xs) + dx
+        ys = np.asarray(ys) + dy
+        size_x, size_y = self.shape
+        if self.boundary == 'torus':
+            return xs % size_x, ys % size_y, np.ones(xs.shape, dtype=bool)
+        inside = (xs >= 0) & (xs < size_x) & (ys >= 0) & (ys < size_y)
+        return xs, ys, inside
+
+    def table(self):
+        """
+        This method returns the neighbors of every cell as a CSR-style
+        pair of arrays over flat indices: the neighbors of cell i are
+        indices[indptr[i]:indptr[i + 1]], in offset order.
+
+        Returns:
+        indptr : numpy array of int64
+                Where the neighbors of each cell start, size_x * size_y + 1
+                entries
+        indices : numpy array of int32
+                The flat indices of the neighbors
+        """
+        if self.indptr is None:
+            size_x, size_y = self.shape
+            xs, ys = np.divmod(np.arange(size_x * size_y), size_y)
+            cells = np.empty((len(xs), len(self.offsets)), dtype=np.int32)
+            inside = np.empty(cells.shape, dtype=bool)
+            for k, (dx, dy) in enumerate(self.offsets):
+                nx, ny, inside[:, k] = self.shift(xs, ys, dx, dy)
+                cells[:, k] = nx * size_y + ny
+
+            self.indptr = np.zeros(len(xs) + 1, dtype=np.int64)
+            np.cumsum(inside.sum(axis=1), out=self.indptr[1:])
+            self.indices = cells[inside]
+        return self.indptr, self.indices
+
+    def offset_distances(self):
+        """
+        This method returns how far every offset reaches: the Chebyshev
+        distance for 'moore', the Manhattan distance for 'von_neumann'.
+        table_distances() gives the same for every entry of table().
+        """
+        offsets = np.abs(np.array(self.offsets, dtype=np.int32))
+        if self.kind == 'moore':
+            return offsets.max(axis=1)
+        return offsets.sum(axis=1)
+
+    def table_distances(self):
+        """
+        This method returns the distance of every neighbor in table()
+        from its cell, aligned with indices.
+        """
+        if self.distances is None:
+            # the entries of table() are the offsets that stay on the
+            # grid, cell by cell in offset order
+            size_x, size_y = self.shape
+            xs, ys = np.divmod(np.arange(size_x * size_y), size_y)
+            inside = np.empty((len(xs), len(self.offsets)), dtype=bool)
+            for k, (dx, dy) in enumerate(self.offsets):
+                inside[:, k] = self.shift(xs, ys, dx, dy)[2]
+            self.distances = np.broadcast_to(self.offset_distances(),
+                                             inside.shape)[inside]
+        return self.distances
+
+    def flat_cells(self, i):
+        """
+        This method returns the flat indices of the neighbors of flat
+        cell i.
+        """
+        indptr, indices = self.table()
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def count(self, mask):
+        """
+        This method counts, for every cell, how many of its neighbors
+        are set in mask, with one shifted copy of the grid per offset.
+
+        Parameters:
+        -----------
+        mask : numpy array of bool
+                The grid to count. Only the last two axes are spatial,
+                so a stack of grids is counted at once.
+
+        Returns:
+        counts : numpy array of int16
+                The neighbor count of every cell, same shape as mask
+        """
+        size_x, size_y = mask.shape[-2:]
+        counts = np.zeros(mask.shape, dtype=np.int16)
+        if self.boundary == 'torus':
+            for dx, dy in self.offsets:
+                counts += np.roll(mask, (-dx, -dy), axis=(-2, -1))
+            return counts
+
+        r = self.radius
+        padded = np.pad(mask, [(0, 0)] * (mask.ndim - 2) + [(r, r)] * 2)
+        for dx, dy in self.offsets:
+            counts += padded[..., r + dx:r + dx + size_x,
+                             r + dy:r + dy + size_y]
+        return counts
@@ -0,0 +1,222 @@
+# storing run results
+
+import hashlib
+import json
+import os
+import numpy as np
+
+
+def seed_key(seed_sequence):
+    """
+    This function returns a JSON friendly description of a SeedSequence
+    that is enough to rebuild it.
+    """
+    return {'entropy': seed_sequence.entropy,
+            'spawn_key': list(seed_sequence.spawn_key)}
+
+
+def run_key(model_name, engine_version, params, seed):
+    """
+    This function hashes a model name, its engine version, its parameters
+    and its seed into the key a run is stored under.
+
+    Parameters:
+    -----------
+    model_name : string
+            The model class, e.g. 'VirusModel'
+    engine_version : integer
+            The ENGINE_VERSION of the model class
+    params : dict
+            The parameters returned by model.params()
+    seed : dict
+            The seed returned by seed_key()
+    """
+    text = json.dumps([model_name, engine_version, params, seed],
+                      sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def run_metadata(model):
+    """
+    This function returns the metadata stored with a run of model.
+    """
+    return {'model': type(model).__name__,
+            'engine_version': model.ENGINE_VERSION,
+            'params': model.params(),
+            'seed': seed_key(model.seed_sequence)}
+
+
+def save_run(file_name, model, with_state=False):
+    """
+    This function saves the metrics of a finished run as an .npz file,
+    one array per metric plus a JSON metadata string. With with_state
+    the final state of the model is saved too, in the form of
+    checkpoint_arrays() plus its random stream, so load_result() puts
+    back exactly the model that finished. state_arrays() only draws the
+    grid: it cannot tell the cells of dead agents from empty spots.
+    """
+    metadata = run_metadata(model)
+    arrays = {'metric_' + name: values
+              for name, values in model.recorded_metrics().items()}
+    if with_state:
+        metadata['rng_state'] = model.rng.bit_generator.state
+        arrays.update({'checkpoint_' + name: values
+                       for name, values in model.checkpoint_arrays().items()})
+    np.savez(file_name, metadata=json.dumps(metadata), **arrays)
+
+
+def load_run(file_name):
+    """
+    This function loads a run saved by save_run().
+
+    Returns:
+    run : dict
+            The metadata ('model', 'engine_version', 'params', 'seed')
+            plus 'metrics' and 'checkpoint', dicts of arrays, and
+            'rng_state' when the final state was saved
+    """
+    with np.load(file_name) as data:
+        run = json.loads(str(data['metadata']))
+        run['metrics'] = {name[len('metric_'):]: data[name]
+                          for name in data.files if name.startswith('metric_')}
+        run['checkpoint'] = {name[len('checkpoint_'):]: data[name]
+                             for name in data.files
+                             if name.startswith('checkpoint_')}
+    return run
+
+
+def save_checkpoint(file_name, model):
+    """
+    This function saves what a run of model needs to carry on exactly
+    where it is: the metrics recorded so far, the arrays returned by
+    model.checkpoint_arrays(), the state of its random stream and the
+    number of iterations done. The file is written next to file_name
+    and then moved over it, so a run killed while saving still leaves
+    the previous checkpoint behind.
+
+    Parameters:
+    -----------
+    file_name : string
+            The path of the checkpoint, used as is (no .npz is added)
+    model : VirusModel or Schelling
+            The model, of any engine
+    """
+    metadata = run_metadata(model)
+    metadata['iteration'] = model.iteration
+    metadata['rng_state'] = model.rng.bit_generator.state
+    arrays = {'metric_' + name: values
+              for name, values in model.recorded_metrics().items()}
+    arrays.update({'checkpoint_' + name: values
+                   for name, values in model.checkpoint_arrays().items()})
+    partial = file_name + ".part"
+    with open(partial, 'wb') as f:
+        np.savez(f, metadata=json.dumps(metadata), **arrays)
+    os.replace(partial, file_name)
+
+
+def load_checkpoint(file_name):
+    """
+    This function loads a checkpoint saved by save_checkpoint().
+
+    Returns:
+    run : dict
+            The metadata of load_run() plus 'iteration', 'rng_state',
+            'metrics' and 'checkpoint', a dict of arrays
+    """
+    with np.load(file_name) as data:
+        run = json.loads(str(data['metadata']))
+        run['metrics'] = {name[len('metric_'):]: data[name]
+                          for name in data.files if name.startswith('metric_')}
+        run['checkpoint'] = {name[len('checkpoint_'):]: data[name]
+                             for name in data.files
+                             if name.startswith('checkpoint_')}
+    return run
+
+
+class ResultStore(object):
+    """
+    A directory of saved runs, one .npz file per run named after its
+    run_key(), so a run is found again from its parameters and seed.
+    """
+
+    def __init__(self, directory):
+        super(ResultStore, self).__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, model):
+        """
+        This method returns the key of a model's run.
+        """
+        metadata = run_metadata(model)
+        return run_key(metadata['model'], metadata['engine_version'],
+                       metadata['params'], metadata['seed'])
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def keys(self):
+        """
+        This method returns the keys of every stored run.
+        """
+        return sorted(name[:-4] for name in os.listdir(self.directory)
+                      if name.endswith(".npz"))
+
+    def save(self, model):
+        """
+        This method stores the run of model and returns its key.
+        """
+        key = self.key(model)
+        save_run(self.path(key), model)
+        return key
+
+    def load(self, key):
+        """
+        This method loads a stored run, see load_run().
+        """
+        return load_run(self.path(key))
+
+    def table(self):
+        """
+        This method gathers every stored run into one long table, one
+        row per run and timestep.
+
+        Returns:
+        table : dict
+                Maps a column name to an array: 'key', 'step', every
+                numeric parameter and every metric
+        """
+        columns = {}
+        runs = [(key, self.load(key)) for key in self.keys()]
+        for key, run in runs:
+            n_steps = max(len(values) for values in run['metrics'].values())
+            values = {'key': np.full(n_steps, key), 'step': np.arange(n_steps)}
+            for name, value in run['params'].items():
+                values[name] = np.full(n_steps, value)
+            for name, metric in run['metrics'].items():
+                values[name] = metric
+            for name, value in values.items():
+                columns.setdefault(name, []).append(value)
+        return {name: np.concatenate(parts) for name, parts in columns.items()}
+
+
+def write_table(table, directory):
+    """
+    This function writes a table as one .npy file per column, so that
+    read_table() can memory-map it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, column in table.items():
+        np.save(os.path.join(directory, name + ".npy"), column)
+
+
+def read_table(directory, mmap_mode='r'):
+    """
+    This function reads a table written by write_table().
+    """
+    return {name[:-4]: np.load(os.path.join(directory, name),
+                               mmap_mode=mmap_mode)
+            for name in sorted(os.listdir(directory)) if name.endswith(".npy")}
@@ -0,0 +1,120 @@
+# parameter sweeps
+
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+def parameter_grid(grid):
+    """
+    This function expands a dict of parameter value lists into the list
+    of every combination.
+
+    Parameters:
+    -----------
+    grid : dict
+            Maps a parameter name to the list of values to try
+
+    Returns:
+    points : list of dicts
+            One {name: value} dict per combination
+    """
+    names = list(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_sweep(run, grid, replicates=1, seed=None, workers=None, **fixed):
+    """
+    This function runs every combination of grid for a number of
+    replicates, fanned out over a process pool. Each run gets its own
+    SeedSequence spawned from one base SeedSequence, so a sweep is
+    reproducible from its base seed, and any single run from the seed
+    and spawn_key stored in its rows, also once read back from a csv
+    file: run_seed(row).
+
+    Parameters:
+    -----------
+    run : function
+            A module level function run(params, seed) returning a list
+            of row dicts, e.g. one per iteration; seed is the
+            SeedSequence of the run
+    grid : dict
+            Maps a parameter name to the list of values to try
+    replicates : integer
+            How many independent runs per combination
+    seed : integer or None
+            The base seed of the sweep
+    workers : integer or None
+            The number of processes; 1 runs everything in this process
+    fixed : keyword arguments
+            Parameters shared by every run
+
+    Returns:
+    rows : list of dicts
+            The rows of every run, each tagged with its parameters,
+            replicate number, the entropy of the base seed ('seed') and
+            the spawn_key of the run, as written by format_spawn_key()
+    """
+    points = parameter_grid(grid)
+    jobs = list(itertools.product(points, range(replicates)))
+    base = np.random.SeedSequence(seed)
+    # the children themselves go to the runs: their full entropy pool
+    # keeps the streams of a large sweep apart
+    children = base.spawn(len(jobs))
+    params = [dict(fixed, **point) for point, _ in jobs]
+
+    if workers == 1:
+        results = list(map(run, params, children))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, params, children))
+
+    rows = []
+    for (point, replicate), run_params, child, run_rows in zip(
+            jobs, params, children, results):
+        for row in run_rows:
+            rows.append(dict(run_params, replicate=replicate,
+                             seed=base.entropy,
+                             spawn_key=format_spawn_key(child.spawn_key),
+                             **row))
+    return rows
+
+
+def format_spawn_key(spawn_key):
+    """
+    This function writes a spawn_key as its integers joined by '-', e.g.
+    (0, 3) as '0-3', which a csv file keeps as it is.
+    """
+    return '-'.join(str(key) for key in spawn_key)
+
+
+def parse_spawn_key(text):
+    """
+    This function reads back a spawn_key written by format_spawn_key().
+    """
+    return tuple(int(key) for key in text.split('-')) if text else ()
+
+
+def run_seed(row):
+    """
+    This function returns the SeedSequence of the run a sweep row came
+    from, as a row of run_sweep() or read back from its csv file.
+    """
+    return np.random.SeedSequence(int(row['seed']),
+                                  spawn_key=parse_spawn_key(row['spawn_key']))
+
+
+def write_csv(rows, file_name):
+    """
+    This function writes sweep rows to a csv file. An empty sweep writes
+    an empty file, since there are no columns to name.
+    """
+    if not rows:
+        open(file_name, 'w').close()
+        return
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,133 @@
+# Per-agent attributes kept as arrays. Every attribute (days ill, a
+# per-agent max_range, a strain...) is one NumPy array indexed by the flat
+# cell of the agent, so the vectorized engines move, clear and read the
+# attributes of many agents with one fancy-indexing operation each, and an
+# agent costs a few bytes per attribute instead of a Python object. The
+# store only keeps attributes with their agents; what they mean is up to
+# the engine that reads them.
+
+import numpy as np
+
+
+class AgentStore(object):
+    """
+    The attributes of the agents on a grid, as a struct of arrays: one
+    flat array of n_cells values per attribute, indexed by the cell the
+    agent lives in. An empty cell holds the default of every attribute.
+    move() carries every attribute along with the agents, so an engine
+    that moves its agents through the store keeps any attribute added to
+    it. view() gives attribute access to a single agent and records()
+    gathers some agents into a NumPy structured array.
+    """
+
+    def __init__(self, n_cells):
+        super(AgentStore, self).__init__()
+        self.n_cells = n_cells
+        self.columns = {}
+        self.defaults = {}
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def add(self, name, dtype, default=0, array=None):
+        """
+        This method adds an attribute and returns its flat array.
+
+        Parameters:
+        -----------
+        name : string
+                The name of the attribute
+        dtype : numpy dtype
+                The type of its values
+        default : scalar
+                The value of the attribute in an empty cell
+        array : array or None
+                An existing contiguous array of n_cells values to keep
+                the attribute in, shared with the caller; a new one
+                filled with default when not given
+        """
+        if name in self.columns:
+            raise ValueError("the agents already have a {!r} "
+                             "attribute".format(name))
+        if array is None:
+            array = np.full(self.n_cells, default, dtype=dtype)
+        column = array.reshape(-1)
+        if column.size != self.n_cells or not np.shares_memory(column,
+                                                                array):
+            raise ValueError("{!r} must be a contiguous array of {} "
+                             "values".format(name, self.n_cells))
+        self.columns[name] = column
+        self.defaults[name] = default
+        return column
+
+    def move(self, sources, targets):
+        """
+        This method moves the agents in the flat cells sources to the
+        empty cells targets, with all their attributes.
+        """
+        for name, column in self.columns.items():
+            column[targets] = column[sources]
+            column[sources] = self.defaults[name]
+
+    def clear(self, cells):
+        """
+        This method resets every attribute of the given flat cells to
+        its default, e.g. after their agents died.
+        """
+        for name, column in self.columns.items():
+            column[cells] = self.defaults[name]
+
+    def view(self, cell):
+        """
+        This method returns an AgentView of the agent in a flat cell.
+        """
+        return AgentView(self, cell)
+
+    def records(self, cells):
+        """
+        This method returns the attributes of the agents in the given
+        flat cells as a structured array, one field per attribute.
+        """
+        records = np.empty(len(cells), dtype=[(name, column.dtype)
+                                              for name, column
+                                              in self.columns.items()])
+        for name, column in self.columns.items():
+            records[name] = column[cells]
+        return records
+
+
+class AgentView(object):
+    """
+    One agent of an AgentStore. Its attributes read and write the arrays
+    of the store, so a view is only valid while the agent stays in its
+    cell. Views have no __dict__ and are cheap to make and drop.
+    """
+
+    __slots__ = ('store', 'cell')
+
+    def __init__(self, store, cell):
+        object.__setattr__(self, 'store', store)
+        object.__setattr__(self, 'cell', cell)
+
+    def __getattr__(self, name):
+        if name in AgentView.__slots__:
+            raise AttributeError(name)
+        try:
+            return self.store.columns[name][self.cell].item()
+        except KeyError:
+            raise AttributeError("the agents have no {!r} "
+                                 "attribute".format(name))
+
+    def __setattr__(self, name, value):
+        if name not in self.store.columns:
+            raise AttributeError("the agents have no {!r} "
+                                 "attribute".format(name))
+        self.store.columns[name][self.cell] = value
+
+    def __repr__(self):
+        return "AgentView({}, {})".format(self.cell, {
+            name: column[self.cell].item()
+            for name, column in self.store.columns.items()})
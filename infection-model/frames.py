@@ -0,0 +1,207 @@
+# Streaming snapshots of a model run. Frames are uint8 status grids that
+# are appended to one memory-mapped .npy file while the model runs, and
+# rendered to a PNG sequence, a GIF or an MP4 afterwards, e.g.
+#
+#     python frames.py virus_01_frames.npy virus_01.gif --fps 10
+#     python frames.py virus_01_frames.npy "png/frame_{:04d}.png" --workers 8
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.animation import FFMpegWriter, PillowWriter
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+import numpy as np
+
+# empty, healthy and infected, as in VirusModel.plot()
+DEFAULT_COLORS = ['w', 'g', 'b']
+
+
+def steps_file(file_name):
+    """
+    This function returns the name of the file that stores the timestep
+    of every frame in file_name.
+    """
+    return os.path.splitext(file_name)[0] + "_steps.npy"
+
+
+class FrameWriter(object):
+    """
+    A sink for status grid snapshots. Frames are written straight into a
+    memory-mapped .npy file with room for max_frames frames, which is
+    doubled whenever it fills up. The timestep of every written frame is
+    saved next to it after each frame, so a run that is killed still
+    leaves a readable frame file, and unused frames are simply ignored.
+    """
+
+    def __init__(self, file_name, shape, max_frames):
+        super(FrameWriter, self).__init__()
+        self.file_name = file_name
+        self.frames = np.lib.format.open_memmap(
+            file_name, mode='w+', dtype=np.uint8,
+            shape=(max(max_frames, 1),) + tuple(shape))
+        self.steps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.steps)
+
+    def write(self, step, grid):
+        """
+        This method appends one frame.
+
+        Parameters:
+        -----------
+        step : integer
+                The timestep of the frame
+        grid : numpy array
+                The status grid, e.g. from VirusModel.status_grid()
+        """
+        if len(self.steps) == len(self.frames):
+            self.grow()
+        self.frames[len(self.steps)] = grid
+        self.steps.append(step)
+        self.flush()
+
+    def grow(self):
+        """
+        This method doubles the number of frames the file can hold. The
+        frames are copied into a new file that then replaces the old one.
+        """
+        partial = self.file_name + ".part"
+        frames = np.lib.format.open_memmap(
+            partial, mode='w+', dtype=np.uint8,
+            shape=(2 * len(self.frames),) + self.frames.shape[1:])
+        frames[:len(self.frames)] = self.frames
+        frames.flush()
+        del self.frames
+        os.replace(partial, self.file_name)
+        self.frames = frames
+
+    def flush(self):
+        """
+        This method flushes the frames to disk and writes the timesteps
+        of the written ones. The timesteps are written next to their file
+        and then moved over it, so they never list a frame that is not
+        in the frame file.
+        """
+        self.frames.flush()
+        partial = steps_file(self.file_name) + ".part"
+        with open(partial, 'wb') as f:
+            np.save(f, np.array(self.steps, dtype=np.int64))
+        os.replace(partial, steps_file(self.file_name))
+
+    def close(self):
+        """
+        This method flushes the frames to disk and writes the timesteps.
+        """
+        self.flush()
+
+
+def load_frames(file_name):
+    """
+    This function opens a frame file written by FrameWriter.
+
+    Returns:
+    frames : numpy memmap
+            The written frames, (n_frames, x, y)
+    steps : numpy array
+            The timestep of every frame
+    """
+    steps = np.load(steps_file(file_name))
+    frames = np.load(file_name, mmap_mode='r')
+    return frames[:len(steps)], steps
+
+
+def frame_figure(frame, colors):
+    """
+    This function builds a figure showing one frame, drawn like
+    VirusModel.plot().
+    """
+    fig = Figure()
+    ax = fig.subplots()
+    image = ax.imshow(frame.T, origin='lower',
+                      extent=(0, frame.shape[0], 0, frame.shape[1]),
+                      cmap=ListedColormap(colors), vmin=0,
+                      vmax=len(colors) - 1, interpolation='nearest')
+    ax.set_xticks([])
+    ax.set_yticks([])
+    return fig, ax, image
+
+
+def render_png(file_name, index, out, title, colors):
+    """
+    This function renders a single frame to a PNG file.
+    """
+    frames, steps = load_frames(file_name)
+    fig, ax, image = frame_figure(frames[index], colors)
+    ax.set_title(title.format(int(steps[index])), fontsize=10,
+                 fontweight='bold')
+    fig.savefig(out.format(index))
+
+
+def render_frames(file_name, out, title="Timestep {}", colors=DEFAULT_COLORS,
+                  fps=10, workers=None):
+    """
+    This function renders a frame file. An out name ending in .gif or
+    .mp4 gives one animation; anything else is treated as a pattern like
+    "frame_{:04d}.png" and gives one PNG per frame, rendered in parallel.
+
+    Parameters:
+    -----------
+    file_name : string
+            The frame file written by FrameWriter
+    out : string
+            The animation file or PNG name pattern
+    title : string
+            The title of each frame; {} is replaced by the timestep
+    colors : list
+            One color per cell state
+    fps : integer
+            Frames per second of an animation
+    workers : integer or None
+            The number of processes rendering PNG frames
+    """
+    frames, steps = load_frames(file_name)
+    ext = os.path.splitext(out)[1].lower()
+
+    if ext in ('.gif', '.mp4'):
+        writer = PillowWriter(fps=fps) if ext == '.gif' \
+            else FFMpegWriter(fps=fps)
+        fig, ax, image = frame_figure(frames[0], colors)
+        with writer.saving(fig, out, dpi=fig.dpi):
+            for frame, step in zip(frames, steps):
+                image.set_data(frame.T)
+                ax.set_title(title.format(int(step)), fontsize=10,
+                             fontweight='bold')
+                writer.grab_frame()
+        return
+
+    out_dir = os.path.dirname(out)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(render_png, file_name, i, out, title, colors)
+                for i in range(len(steps))]
+        for job in jobs:
+            job.result()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="Render a frame file written during a model run")
+    parser.add_argument('frames')
+    parser.add_argument('out')
+    parser.add_argument('--title', default="Timestep {}")
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    render_frames(args.frames, args.out, args.title, fps=args.fps,
+                  workers=args.workers)
@@ -1,7 +1,22 @@
 # Infection class
 
 class infection(object):
-	"""This is the class implementation for a model infection"""
-	def __init__(self, mortality):
+	"""This is the class implementation for a model infection
+
+	mortality is the chance of dying in a timestep and cycle_time the
+	number of days ill before recovering, as in VirusModel.
+	transmissibility is the chance that one infected neighbor passes the
+	infection on in a timestep, and immunity the strains (indices into
+	the list of strains of a model) that an agent can no longer catch
+	once it recovers from this one. By default every exposed agent is
+	infected and nobody becomes immune, like in the single-strain models.
+	"""
+	__slots__ = ('mortality', 'cycle_time', 'transmissibility', 'immunity')
+
+	def __init__(self, mortality, cycle_time=14, transmissibility=1.0,
+			immunity=()):
 		super(infection, self).__init__()
 		self.mortality = mortality
+		self.cycle_time = cycle_time
+		self.transmissibility = transmissibility
+		self.immunity = tuple(immunity)
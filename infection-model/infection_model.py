@@ -2,20 +2,59 @@
 # different rules.
 
 import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
 import numpy as np
 import itertools
-import random
-import copy
-from list_funcs import intersection
+import common_path  # noqa: F401
+from empty_pool import EmptyPool
+from neighbors import Neighborhood
+from results import save_checkpoint, load_checkpoint
 import os
 
+# cell states, as returned by VirusModel.status_grid()
+EMPTY = 0
+HEALTHY = 1
+INFECTED = 2
+STATUS_COLORS = ListedColormap(['w', 'g', 'b'])
+
 
 class VirusModel(object):
-    """A model of virus spreading"""
+    """A model of virus spreading
+
+    With frontier=True the model keeps self.exposure, the number of
+    infected neighbors of every cell next to an infected agent, up to
+    date as infected agents appear, move, recover and die. contracted()
+    then only has to look the agent up in that dict. The infection rules
+    and the random draws are unchanged, so a seeded run gives the same
+    population series either way.
+
+    Agents catch the virus from the neighborhood of radius 1 and move
+    within the neighborhood of radius max_range.
+
+    By default an iteration is asynchronous: agents act one at a time,
+    in the order of the agent dicts, and each one sees what the agents
+    before it did. With synchronous=True an iteration is three phases
+    (deaths and recoveries, infection, moves) and within a phase every
+    agent reads the state left by the previous phase, so the order of
+    the agents does not matter. Agents that pick the same empty spot
+    are resolved by a seeded random priority: the highest one moves and
+    the others stay put. Spots freed by deaths can be moved into in the
+    next phase. VirusGridModel is the vectorized form of this mode and
+    gives the same results for the same seed.
+    neighborhood ('moore' or 'von_neumann') and boundary ('bounded' or
+    'torus') set the shape of the neighborhoods and what happens at the
+    edge of the grid; see neighbors.Neighborhood.
+    """
+
+    # bump whenever a change alters the results of a seeded run, so that
+    # cached runs are not reused
+    ENGINE_VERSION = 1
 
     def __init__(self, ID, height, width, mortality,
                  cycle_time, ratio_empty, ratio_infected,
-                 num_iter, max_range=1):
+                 num_iter, max_range=1, seed=None, frontier=False,
+                 neighborhood='moore', boundary='bounded',
+                 synchronous=False):
         super(VirusModel, self).__init__()
         self.ID = ID
         self.height = height
@@ -26,166 +65,569 @@ class VirusModel(object):
         self.cycle_time = cycle_time
         self.num_iter = num_iter
         self.max_range = max_range
+        self.neighborhood = neighborhood
+        self.boundary = boundary
+        self.contacts = Neighborhood((height, width), 1, neighborhood,
+                                     boundary)
+        self.reach = Neighborhood((height, width), max_range, neighborhood,
+                                  boundary, include_center=True)
+        # every model owns its random stream; seed may be an integer or
+        # a numpy SeedSequence. Without a seed a run cannot be repeated,
+        # so a RunCache leaves it alone
+        self.seeded = seed is not None
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.rng = np.random.default_rng(seed)
+        self.frontier = frontier
+        self.synchronous = synchronous
 
         self.infected_agents = {}
+        # infected neighbor counts of the cells around infected agents,
+        # only kept when frontier is on
+        self.exposure = {}
         self.healthy_agents = {}
-        # tracks the number of healthy vs infected people at each timestep
-        self.infected_population = []
-        self.healthy_population = []
-        self.deaths_per_iter = []
+        # tracks the number of healthy vs infected people and deaths at
+        # each timestep, preallocated for num_iter iterations
+        self.metrics = {name: np.zeros(num_iter + 1, dtype=np.int64)
+                        for name in ('healthy', 'infected', 'deaths')}
+        self.n_recorded = 0
+        # iterations done by the current run, so that an update() after
+        # resume() carries on from there
+        self.iteration = 0
+        # the figure reused by plot()
+        self.fig = None
+        self.ax = None
+        self.image = None
+
+    @property
+    def healthy_population(self):
+        """the number of healthy people at each recorded timestep"""
+        return self.metrics['healthy'][:self.n_recorded]
+
+    @property
+    def infected_population(self):
+        """the number of infected people at each recorded timestep"""
+        return self.metrics['infected'][:self.n_recorded]
+
+    @property
+    def deaths_per_iter(self):
+        """the number of deaths in each iteration"""
+        return self.metrics['deaths'][1:self.n_recorded]
+
+    def record(self, healthy, infected, deaths):
+        """
+        This method stores the populations at the end of a timestep.
+        """
+        if self.n_recorded == len(self.metrics['deaths']):
+            # update() was called again, make room for another run
+            for name, values in self.metrics.items():
+                self.metrics[name] = np.concatenate(
+                    [values, np.zeros(self.num_iter + 1, dtype=values.dtype)])
+        self.metrics['healthy'][self.n_recorded] = healthy
+        self.metrics['infected'][self.n_recorded] = infected
+        self.metrics['deaths'][self.n_recorded] = deaths
+        self.n_recorded += 1
+
+    def recorded_metrics(self):
+        """
+        This method returns the recorded part of every metric buffer.
+        """
+        return {name: values[:self.n_recorded]
+                for name, values in self.metrics.items()}
+
+    def params(self):
+        """
+        This method returns the parameters that define a run.
+        """
+        return {'height': self.height,
+                'width': self.width,
+                'mortality': self.mortality,
+                'cycle_time': self.cycle_time,
+                'ratio_empty': self.ratio_empty,
+                'ratio_infected': self.ratio_infected,
+                'num_iter': self.num_iter,
+                'max_range': self.max_range,
+                'neighborhood': self.neighborhood,
+                'boundary': self.boundary,
+                'synchronous': self.synchronous}
 
     def populate(self):
         """
         This method is used to initially populate a grid with randomly
         distributed people that can move around.
         """
-        # create the grid
-        self.grid = list(
-            itertools.product(
-                range(
-                    0, self.height), range(
-                    0, self.width)))
-        random.shuffle(self.grid)
+        # shuffle the flat cell indices and look the (x, y) keys up in
+        # row-major order; product() shares the coordinate ints between
+        # the keys, which keeps the dicts small
+        n_cells = self.height * self.width
+        cells = list(itertools.product(range(self.height), range(self.width)))
+        cells = [cells[i] for i in self.rng.permutation(n_cells).tolist()]
 
         # initialize populations
-        self.n_empty = int(self.ratio_empty * len(self.grid))
-        self.empty_spots = self.grid[:self.n_empty]
-        self.inhabited = self.grid[self.n_empty:]
+        self.n_empty = int(self.ratio_empty * n_cells)
+        self.empty_spots = EmptyPool(cells[:self.n_empty])
+
+        self.n_infected = int(self.ratio_infected * (n_cells - self.n_empty))
+        start = self.n_empty + self.n_infected
+        self.healthy_agents.update(dict.fromkeys(cells[start:], 0))
+        self.infected_agents.update(
+            dict.fromkeys(cells[self.n_empty:start], 0))
+        if self.frontier:
+            self.build_exposure()
+
+    def build_exposure(self):
+        """
+        This method recounts the infected neighbors of every cell next
+        to an infected agent.
+        """
+        self.exposure = {}
+        for agent in self.infected_agents:
+            self.shift_exposure(agent, 1)
 
-        self.n_infected = int(self.ratio_infected * len(self.inhabited))
-        healthy = self.inhabited[self.n_infected:]
-        infected = self.inhabited[:self.n_infected]
+    def shift_exposure(self, agent, step):
+        """
+        This method adds step to the exposure of the cells around agent
+        after an infected agent arrives there (step=1) or leaves (step=-1).
+        """
+        for neighbor in self.contacts.cells(agent):
+            count = self.exposure.get(neighbor, 0) + step
+            if count:
+                self.exposure[neighbor] = count
+            else:
+                del self.exposure[neighbor]
+
+    def set_infected(self, agent, days_ill):
+        """
+        This method places an infected agent at the given location.
+        """
+        self.infected_agents[agent] = days_ill
+        if self.frontier:
+            self.shift_exposure(agent, 1)
 
-        self.healthy_agents = dict(list(self.healthy_agents.items()) + list(dict(zip(healthy,
-                                                                                     [0] * len(healthy))).items()))
+    def clear_infected(self, agent):
+        """
+        This method removes the infected agent at the given location.
+        """
+        del self.infected_agents[agent]
+        if self.frontier:
+            self.shift_exposure(agent, -1)
 
-        self.infected_agents = dict(list(self.infected_agents.items()) + list(dict(zip(infected,
-                                                                                       [0] * len(infected))).items()))
+    def exposed(self, agent):
+        """
+        This method checks if any of the neighbors of an agent are
+        infected.
+        """
+        if self.frontier:
+            # only agents on the frontier have an infected neighbor
+            return agent in self.exposure
+        # probe each neighbor of the agent
+        return any(neighbor in self.infected_agents
+                   for neighbor in self.contacts.cells(agent))
 
     def contracted(self, agent):
         """
         This method checks if any of an agent contracts the virus
         by checking if any of the neighbors are infected
         """
-        x = agent[0]
-        y = agent[1]
-
-        # get the neighbors of the agent
-        neighbors = list(
-            itertools.product(
-                range(
-                    x - 1,
-                    x + 2),
-                range(
-                    y - 1,
-                    y + 2)))
-        neighbors.remove((x, y))  # remove the current agent
-        # get inhabited neighbors list
-        inf_neighbors = intersection(neighbors, self.infected_agents)
-
-        if len(inf_neighbors) > 0:
-
-            self.infected_agents[agent] = 0
+        if self.exposed(agent):
+
+            self.set_infected(agent, 0)
             del self.healthy_agents[agent]
             return True
         else:
             return False
 
+    def died(self, agent, roll):
+        """
+        This method removes an infected agent whose mortality roll is
+        at or below the mortality, and tells whether it died.
+        """
+        if roll <= self.mortality:
+            self.clear_infected(agent)
+            return True
+        else:
+            return False
+
     def recovered(self, agent):
         days_ill = self.infected_agents[agent]
         if days_ill > self.cycle_time:
             self.healthy_agents[agent] = 0
-            del self.infected_agents[agent]
+            self.clear_infected(agent)
             return True
         else:
             self.infected_agents[agent] += 1
             return False
 
-    def update(self, plot):
-        """
-        This method executes an asynchronous update for the model
+    def update(self, plot, frames=None, snapshot_every=10, checkpoint=None,
+               checkpoint_every=100):
         """
+        This method executes an asynchronous update for the model, or a
+        synchronous one if the model was made with synchronous=True. A
+        run restored by resume() carries on from its iteration.
 
-        # add initial population
-        self.infected_population.append(len(self.infected_agents))
-        self.healthy_population.append(len(self.healthy_agents))
-
-        for i in range(self.num_iter):
-            n_deaths = 0
-            # create a copy of the old agents
-            self.old_h_agents = copy.deepcopy(self.healthy_agents)
-            self.old_i_agents = copy.deepcopy(self.infected_agents)
-
-            for agent in self.old_i_agents:
-                roll = random.random()
-                if roll <= self.mortality:
-                    del self.infected_agents[agent]
-                    n_deaths += 1
-
-                elif self.recovered(agent):
-                    self.move_to_empty(agent, False)
+        Parameters:
+        -----------
+        plot : boolean
+                Whether to save a PNG of the grid every snapshot_every
+                timesteps
+        frames : FrameWriter or None
+                A frames.FrameWriter that receives the status grid every
+                snapshot_every timesteps
+        snapshot_every : integer
+                The number of timesteps between snapshots
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every timesteps, see save_checkpoint()
+        checkpoint_every : integer
+                The number of timesteps between checkpoints
+        """
 
-                else:
-                    self.move_to_empty(agent, True)
+        if self.iteration == 0:
+            # add initial population
+            self.record(len(self.healthy_agents), len(self.infected_agents),
+                        0)
 
-            for agent in self.old_h_agents:
-                # check if agent gets sick
-                if self.contracted(agent):
-                    # move agent
-                    self.move_to_empty(agent, True)
-                else:
-                    # move agent
-                    self.move_to_empty(agent, False)
+        for i in range(self.iteration, self.num_iter):
+            if self.synchronous:
+                n_deaths = self.step_synchronous()
+            else:
+                n_deaths = self.step()
 
-            self.healthy_population.append(len(self.healthy_agents))
-            self.infected_population.append(len(self.infected_agents))
-            self.deaths_per_iter.append(n_deaths)
+            self.record(len(self.healthy_agents), len(self.infected_agents),
+                        n_deaths)
 
-            # if you want to plot the changes
-            if (i % 10 == 0) and plot:
-                plot_title = "Timestep {} of Outbreak: Sparsity = {}%, Mortality={}%".format(
-                    i, ratio_empty * 100, death_rate * 100)
-                fname = "virus_{}_tstep_{}.png".format(self.ID, i)
-                self.plot(plot_title, fname, False)
+            # if you want to record the changes
+            if i % snapshot_every == 0:
+                self.snapshot(i, plot, frames)
 
             if len(self.infected_agents) == 0:
                 # simulation stops if there are no more infected people
                 # print("no more infected people")
                 break
 
-    def move_to_empty(self, agent, inf):
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def end_iteration(self, checkpoint, checkpoint_every):
         """
-        This method moves the agent to an empty nearby square
+        This method counts a finished iteration of a run that goes on,
+        and saves a checkpoint to the file checkpoint (if not None) every
+        checkpoint_every iterations.
+        """
+        self.iteration += 1
+        if checkpoint is not None and self.iteration % checkpoint_every == 0:
+            self.save_checkpoint(checkpoint)
+
+    def save_checkpoint(self, file_name):
+        """
+        This method saves the run so far to file_name, from where
+        resume() can carry it on. See results.save_checkpoint().
         """
+        save_checkpoint(file_name, self)
 
-        x = agent[0]
-        y = agent[1]
+    def resume(self, file_name):
+        """
+        This method restores a checkpoint saved by save_checkpoint(): the
+        agents, the empty spots, the metrics, the random stream and the
+        iteration. The next update() then carries the run on as if it had
+        never stopped. The model must be of the same class and grid size;
+        other parameters may differ, which forks a what-if run from the
+        checkpoint (give it a new self.rng to change the draws too).
+        """
+        run = load_checkpoint(file_name)
+        if run['model'] != type(self).__name__ or \
+                (run['params']['height'], run['params']['width']) != \
+                (self.height, self.width):
+            raise ValueError("{} is a checkpoint of a {} on a {}x{} grid"
+                             .format(file_name, run['model'],
+                                     run['params']['height'],
+                                     run['params']['width']))
+        self.load_metrics(run['metrics'])
+        self.load_checkpoint_arrays(run['checkpoint'])
+        self.rng.bit_generator.state = run['rng_state']
+        self.iteration = run['iteration']
+
+    def step(self):
+        """
+        This method runs one asynchronous iteration and returns the
+        number of deaths.
+        """
+        n_deaths = 0
+        # snapshot who is where at the start of the iteration; only the
+        # keys are copied, days ill are always read from the live dicts
+        self.old_h_agents = tuple(self.healthy_agents)
+        self.old_i_agents = tuple(self.infected_agents)
+
+        # draw the mortality rolls and move rolls for the whole
+        # iteration at once
+        n_infected = len(self.old_i_agents)
+        death_rolls = self.rng.random(n_infected)
+        move_rolls = self.rng.random(n_infected + len(self.old_h_agents))
+
+        for agent, roll, move_roll in zip(self.old_i_agents, death_rolls,
+                                          move_rolls):
+            if self.died(agent, roll):
+                n_deaths += 1
+
+            elif self.recovered(agent):
+                self.move_to_empty(agent, False, move_roll)
+
+            else:
+                self.move_to_empty(agent, True, move_roll)
+
+        for agent, move_roll in zip(self.old_h_agents,
+                                    move_rolls[n_infected:]):
+            # check if agent gets sick
+            if self.contracted(agent):
+                # move agent
+                self.move_to_empty(agent, True, move_roll)
+            else:
+                # move agent
+                self.move_to_empty(agent, False, move_roll)
+
+        return n_deaths
+
+    def step_synchronous(self):
+        """
+        This method runs one synchronous iteration and returns the
+        number of deaths. Agents are visited in (x, y) order and every
+        decision of a phase is made before any of them is applied.
+        """
+        healthy = sorted(self.healthy_agents)
+
+        # deaths and recoveries
+        infected = sorted(self.infected_agents)
+        death_rolls = self.rng.random(len(infected))
+        n_deaths = 0
+        for agent, roll in zip(infected, death_rolls):
+            if self.died(agent, roll):
+                self.empty_spots.add(agent)
+                n_deaths += 1
+            else:
+                self.recovered(agent)
+
+        # healthy agents next to an infected agent catch the virus
+        exposed = [agent for agent in healthy if self.exposed(agent)]
+        for agent in exposed:
+            self.set_infected(agent, 0)
+            del self.healthy_agents[agent]
 
-        neighbors = list(itertools.product(range(x - self.max_range, x + (self.max_range + 1)),
-                                           range(y - self.max_range, y + (self.max_range + 1))))
-        # neighbors.remove((x,y)) # remove the current agent --> forces
-        # movement
-        # get inhabited neighors list
-        neighbors = intersection(neighbors, self.empty_spots)
+        # everyone picks an empty spot, the highest priority gets it
+        agents = sorted(list(self.healthy_agents) + list(self.infected_agents))
+        move_rolls = self.rng.random(len(agents))
+        moves = []
+        for agent, roll in zip(agents, move_rolls):
+            new_spot = self.pick_empty(agent, roll)
+            if new_spot is not None:
+                moves.append((agent, new_spot))
+        priorities = self.rng.random(len(moves))
+        winners = {}
+        for (agent, new_spot), priority in zip(moves, priorities):
+            if new_spot not in winners or priority > winners[new_spot][1]:
+                winners[new_spot] = (agent, priority)
+        for new_spot, (agent, priority) in winners.items():
+            self.move_agent(agent, new_spot, agent in self.infected_agents)
+
+        return n_deaths
+
+    def snapshot(self, i, plot, frames):
+        """
+        This method records the grid at timestep i, as a frame when a
+        FrameWriter is given and as a PNG when plot is True.
+        """
+        if frames is not None:
+            frames.write(i, self.status_grid())
+        if plot:
+            plot_title = "Timestep {} of Outbreak: Sparsity = {}%, Mortality={}%".format(
+                i, self.ratio_empty * 100, self.mortality * 100)
+            fname = "virus_{}_tstep_{}.png".format(self.ID, i)
+            self.plot(plot_title, fname, False)
+
+    def pick_empty(self, agent, roll=None):
+        """
+        This method returns a random empty spot within reach of the
+        agent, or None if there is none.
 
+        Parameters:
+        -----------
+        agent : tuple
+                The (x, y) location of the agent
+        roll : float
+                A uniform draw in [0, 1) that picks the spot. Drawn from
+                self.rng when not given.
+        """
+        # the agent's own spot is part of its reach but is never empty
+        # get empty neighbors list
+        neighbors = [spot for spot in self.reach.cells(agent)
+                     if spot in self.empty_spots]
+        if len(neighbors) == 0:
+            return None
+        if roll is None:
+            roll = self.rng.random()
+        return neighbors[min(int(roll * len(neighbors)), len(neighbors) - 1)]
+
+    def move_to_empty(self, agent, inf, roll=None):
+        """
+        This method moves the agent to an empty nearby square
+
+        Parameters:
+        -----------
+        agent : tuple
+                The (x, y) location of the agent
+        inf : boolean
+                Whether the agent is infected
+        roll : float
+                A uniform draw in [0, 1) that picks the new square. Drawn
+                from self.rng when not given.
+        """
         # select a random new empty spot
-        if len(neighbors) > 0:
-            new_spot = random.choice(neighbors)
-        else:
-            return
+        new_spot = self.pick_empty(agent, roll)
+        if new_spot is not None:
+            self.move_agent(agent, new_spot, inf)
+
+    def move_agent(self, agent, new_spot, inf):
+        """
+        This method moves the agent to the empty spot new_spot.
+        """
         if not inf:
             self.healthy_agents[new_spot] = 0
             del self.healthy_agents[agent]
         else:
-            self.infected_agents[new_spot] = self.infected_agents[agent]
-            del self.infected_agents[agent]
+            self.set_infected(new_spot, self.infected_agents[agent])
+            self.clear_infected(agent)
 
         self.empty_spots.remove(new_spot)
-        self.empty_spots.append(agent)
+        self.empty_spots.add(agent)
+
+    def status_grid(self):
+        """
+        This method returns the grid as an array of cell states (EMPTY,
+        HEALTHY or INFECTED), indexed by [x, y].
+        """
+        grid = np.full((self.height, self.width), EMPTY, dtype=np.uint8)
+        for agents, state in ((self.healthy_agents, HEALTHY),
+                              (self.infected_agents, INFECTED)):
+            if agents:
+                xs, ys = np.array(list(agents), dtype=np.intp).T
+                grid[xs, ys] = state
+        return grid
+
+    def state_arrays(self):
+        """
+        This method returns the state of the grid as arrays: the cell
+        states and the days ill of every infected agent. They picture the
+        grid, but do not restore a run: the cells of dead agents look
+        empty, and the order of the agents is lost. checkpoint_arrays()
+        keeps both.
+        """
+        days_ill = np.zeros((self.height, self.width), dtype=np.int32)
+        if self.infected_agents:
+            xs, ys = np.array(list(self.infected_agents), dtype=np.intp).T
+            days_ill[xs, ys] = list(self.infected_agents.values())
+        return {'status': self.status_grid(), 'days_ill': days_ill}
+
+    def load_state_arrays(self, state):
+        """
+        This method rebuilds the agents from the arrays returned by
+        state_arrays(). Every empty cell becomes an empty spot, also the
+        cells of dead agents, so use load_checkpoint_arrays() to carry
+        on a run.
+        """
+        status = state['status']
+        xs, ys = np.nonzero(status == HEALTHY)
+        self.healthy_agents = dict.fromkeys(zip(xs.tolist(), ys.tolist()), 0)
+        xs, ys = np.nonzero(status == INFECTED)
+        self.infected_agents = dict(zip(zip(xs.tolist(), ys.tolist()),
+                                        state['days_ill'][xs, ys].tolist()))
+        xs, ys = np.nonzero(status == EMPTY)
+        self.empty_spots = EmptyPool(zip(xs.tolist(), ys.tolist()))
+        if self.frontier:
+            self.build_exposure()
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint. Cells are flat x * width + y indices, kept in the
+        order of the agent dicts and of the empty spots, since that order
+        decides which agent gets which random draw.
+        """
+        return {'healthy': self.flat_cells(self.healthy_agents),
+                'infected': self.flat_cells(self.infected_agents),
+                'days_ill': np.array(list(self.infected_agents.values()),
+                                     dtype=np.int64),
+                'empty': self.flat_cells(self.empty_spots)}
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method rebuilds the agents and the empty spots from the
+        arrays returned by checkpoint_arrays(), in their order.
+        """
+        self.healthy_agents = dict.fromkeys(
+            self.cell_keys(arrays['healthy']), 0)
+        self.infected_agents = dict(zip(self.cell_keys(arrays['infected']),
+                                        arrays['days_ill'].tolist()))
+        self.empty_spots = EmptyPool(self.cell_keys(arrays['empty']))
+        if self.frontier:
+            self.build_exposure()
+
+    def flat_cells(self, cells):
+        """
+        This method returns an array of the flat indices of (x, y) cells.
+        """
+        cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        return cells[:, 0] * self.width + cells[:, 1]
+
+    def cell_keys(self, flat):
+        """
+        This method returns the (x, y) keys of an array of flat indices.
+        """
+        xs, ys = np.divmod(flat, self.width)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def load_metrics(self, metrics):
+        """
+        This method puts stored metrics back into the metric buffers.
+        """
+        for name, values in metrics.items():
+            self.metrics[name] = np.zeros(max(len(values), self.num_iter + 1),
+                                          dtype=np.int64)
+            self.metrics[name][:len(values)] = values
+            self.n_recorded = len(values)
+
+    def load_result(self, run):
+        """
+        This method puts a run stored with its final state (see
+        results.save_run) back into the model: its metrics, its agents
+        and empty spots in their order, and its random stream.
+        """
+        self.load_metrics(run['metrics'])
+        self.load_checkpoint_arrays(run['checkpoint'])
+        self.rng.bit_generator.state = run['rng_state']
+
+    def figure(self):
+        """
+        This method returns the figure and axes used by plot(), creating
+        them on first use or after they were closed.
+        """
+        if self.fig is None or not plt.fignum_exists(self.fig.number):
+            self.fig, self.ax = plt.subplots()
+            self.image = None
+        return self.fig, self.ax
+
+    def close_plot(self):
+        """
+        This method closes the figure used by plot().
+        """
+        if self.fig is not None:
+            plt.close(self.fig)
+        self.fig = self.ax = self.image = None
 
     def plot(self, title, file_name, show):
         """
-        This method plots the population of agents on a graph.
+        This method plots the population of agents on a graph. The whole
+        grid is drawn as one image, and the figure is reused by later
+        calls.
 
         Parameters:
         -----------
@@ -198,22 +640,25 @@ class VirusModel(object):
         if not os.path.exists(path):
             os.mkdir(path)
 
-        fig, ax = plt.subplots()
-
-        for agent in self.healthy_agents:
-            ax.scatter(agent[0] + 0.5, agent[1] + 0.5, color='g')
-        for agent in self.infected_agents:
-            ax.scatter(agent[0] + 0.5, agent[1] + 0.5, color='b')
+        fig, ax = self.figure()
+        status = self.status_grid()
+
+        if self.image is None:
+            self.image = ax.imshow(status.T, origin='lower',
+                                   extent=(0, status.shape[0],
+                                           0, status.shape[1]),
+                                   cmap=STATUS_COLORS, vmin=EMPTY,
+                                   vmax=INFECTED, interpolation='nearest')
+            ax.set_xticks([])
+            ax.set_yticks([])
+        else:
+            self.image.set_data(status.T)
 
         ax.set_title(title, fontsize=10, fontweight='bold')
-        ax.set_xlim(0, self.width)
-        ax.set_ylim(0, self.height)
-        ax.set_xticks([])
-        ax.set_yticks([])
         if show:
             plt.show()
         elif not show:
-            plt.savefig(path + file_name)
+            fig.savefig(path + file_name)
 
     def plot_nchanges(self, title, file_name, show):
         """
@@ -258,7 +703,8 @@ class VirusModel(object):
         if show:
             plt.show()
         elif not show:
-            plt.savefig(path + file_name)
+            fig.savefig(path + file_name)
+            plt.close(fig)
 
 
 if __name__ == '__main__':
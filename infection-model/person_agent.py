@@ -2,6 +2,10 @@
 
 class person(object):
 	"""An individual person"""
+	# no per-instance __dict__; many agents are better kept in an
+	# agent_store.AgentStore
+	__slots__ = ('age', 'healthy', 'max_range')
+
 	def __init__(self, age, healthy, max_range,):
 		super(person, self).__init__()
 		self.age = age
@@ -0,0 +1,305 @@
+# Many replicates of the vectorized infection model stepped together. The
+# replicates are stacked into one (replicates, height, width) status tensor,
+# so every phase of an iteration is a handful of array operations over all
+# of them, and a small grid no longer pays the Python overhead of one
+# model per replicate.
+
+import os
+import matplotlib.pyplot as plt
+import numpy as np
+from infection_model import EMPTY, HEALTHY, INFECTED
+from virus_grid import run_illness, spread_infection, pick_moves
+import common_path  # noqa: F401
+from neighbors import Neighborhood
+
+
+class VirusEnsemble(object):
+    """An ensemble of replicate runs of VirusGridModel.
+
+    Every replicate follows the rules of VirusGridModel (the synchronous
+    rules of VirusModel) on its own grid, self.status[r], starting from
+    its own random population. The phases are the ones of VirusGridModel
+    (see virus_grid.py), applied to the stack of grids, so the random
+    draws of a phase are made in one batch for all the replicates, in
+    the flat (r, x, y) order of the agents, from the one stream of the
+    ensemble. With one replicate a
+    seeded ensemble gives the same run as VirusGridModel with the same
+    seed; with more, each replicate is a different but equally valid
+    draw.
+
+    A replicate stops, like VirusModel, after the first iteration that
+    leaves it without infected agents. It is then left out of the later
+    iterations and of their draws, and its series end there.
+    self.n_recorded[r] is the length of the series of replicate r.
+    """
+
+    # bump whenever a change alters the results of a seeded run, so that
+    # cached runs are not reused
+    ENGINE_VERSION = 1
+
+    def __init__(self, ID, height, width, mortality,
+                 cycle_time, ratio_empty, ratio_infected,
+                 num_iter, replicates, max_range=1, seed=None,
+                 neighborhood='moore', boundary='bounded'):
+        super(VirusEnsemble, self).__init__()
+        self.ID = ID
+        self.height = height
+        self.width = width
+        self.mortality = mortality
+        self.cycle_time = cycle_time
+        self.ratio_empty = ratio_empty
+        self.ratio_infected = ratio_infected
+        self.num_iter = num_iter
+        self.replicates = replicates
+        self.max_range = max_range
+        self.neighborhood = neighborhood
+        self.boundary = boundary
+        self.contacts = Neighborhood((height, width), 1, neighborhood,
+                                     boundary)
+        self.reach = Neighborhood((height, width), max_range, neighborhood,
+                                  boundary, include_center=True)
+        # every model owns its random stream; seed may be an integer or
+        # a numpy SeedSequence. Without a seed a run cannot be repeated,
+        # so a RunCache leaves it alone
+        self.seeded = seed is not None
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.rng = np.random.default_rng(seed)
+
+        self.status = np.zeros((replicates, height, width), dtype=np.int8)
+        self.days_ill = np.zeros((replicates, height, width), dtype=np.int32)
+        # replicates that still have infected agents
+        self.active = np.ones(replicates, dtype=bool)
+        # tracks the number of healthy vs infected people and deaths of
+        # every replicate at each timestep, preallocated for num_iter
+        # iterations
+        self.metrics = {name: np.zeros((replicates, num_iter + 1),
+                                       dtype=np.int64)
+                        for name in ('healthy', 'infected', 'deaths')}
+        self.n_recorded = np.zeros(replicates, dtype=np.int64)
+
+    def params(self):
+        """
+        This method returns the parameters that define a run.
+        """
+        return {'height': self.height,
+                'width': self.width,
+                'mortality': self.mortality,
+                'cycle_time': self.cycle_time,
+                'ratio_empty': self.ratio_empty,
+                'ratio_infected': self.ratio_infected,
+                'num_iter': self.num_iter,
+                'replicates': self.replicates,
+                'max_range': self.max_range,
+                'neighborhood': self.neighborhood,
+                'boundary': self.boundary}
+
+    def populate(self):
+        """
+        This method populates the grid of every replicate with randomly
+        distributed people, like VirusGridModel.populate().
+        """
+        n_cells = self.height * self.width
+        self.n_empty = int(self.ratio_empty * n_cells)
+        self.n_infected = int(self.ratio_infected * (n_cells - self.n_empty))
+
+        status = self.status.reshape(self.replicates, -1)
+        status[:] = EMPTY
+        for r in range(self.replicates):
+            cells = self.rng.permutation(n_cells)
+            status[r, cells[self.n_empty:]] = HEALTHY
+            status[r, cells[self.n_empty:self.n_empty + self.n_infected]] = \
+                INFECTED
+        self.days_ill[:] = 0
+        self.active[:] = True
+        self.n_recorded[:] = 0
+
+    def record(self, rows, status, deaths):
+        """
+        This method stores the populations of some replicates at the end
+        of a timestep.
+
+        Parameters:
+        -----------
+        rows : array
+                The replicates to record
+        status : array
+                Their status grids
+        deaths : array
+                Their number of deaths in the timestep
+        """
+        columns = self.n_recorded[rows]
+        if len(rows) and columns.max() == self.metrics['deaths'].shape[1]:
+            # update() was called again, make room for another run
+            for name, values in self.metrics.items():
+                self.metrics[name] = np.concatenate(
+                    [values, np.zeros((self.replicates, self.num_iter + 1),
+                                      dtype=values.dtype)], axis=1)
+        self.metrics['healthy'][rows, columns] = \
+            (status == HEALTHY).sum(axis=(1, 2))
+        self.metrics['infected'][rows, columns] = \
+            (status == INFECTED).sum(axis=(1, 2))
+        self.metrics['deaths'][rows, columns] = deaths
+        self.n_recorded[rows] += 1
+
+    def recorded_metrics(self):
+        """
+        This method returns the recorded series of every replicate.
+
+        Returns:
+        metrics : dict
+                Maps a metric name ('healthy', 'infected', 'deaths') to a
+                list of one array per replicate
+        """
+        return {name: [row[:n] for row, n in zip(values, self.n_recorded)]
+                for name, values in self.metrics.items()}
+
+    def update(self):
+        """
+        This method steps every replicate until it has no more infected
+        people, or for num_iter iterations. Only the replicates still
+        running are kept in the tensors that are stepped, so the cost of
+        an iteration follows the number of running replicates.
+        """
+        self.active[:] = True
+        rows = np.arange(self.replicates)
+        status = self.status
+        days_ill = self.days_ill
+        self.record(rows, status, np.zeros(len(rows), dtype=np.int64))
+
+        for i in range(self.num_iter):
+            deaths = self.step(status, days_ill)
+            self.record(rows, status, deaths)
+
+            # a replicate stops if there are no more infected people
+            running = (status == INFECTED).any(axis=(1, 2))
+            if not running.all():
+                self.status[rows] = status
+                self.days_ill[rows] = days_ill
+                self.active[rows[~running]] = False
+                rows = rows[running]
+                status = status[running]
+                days_ill = days_ill[running]
+            if len(rows) == 0:
+                break
+
+        self.status[rows] = status
+        self.days_ill[rows] = days_ill
+
+    def step(self, status, days_ill):
+        """
+        This method runs one iteration of the replicates whose grids are
+        given and returns the number of deaths of each.
+
+        Parameters:
+        -----------
+        status : array
+                The (replicates, height, width) status grids, updated in
+                place
+        days_ill : array
+                The matching days-ill grids, updated in place
+        """
+        n_cells = self.height * self.width
+        flat_status = status.reshape(-1)
+        flat_days = days_ill.reshape(-1)
+        healthy = flat_status == HEALTHY
+
+        # mortality and recovery rolls for every infected agent
+        dead, _ = run_illness(flat_status, flat_days, self.rng,
+                              self.mortality, self.cycle_time)
+        flat_days[dead] = 0
+
+        # healthy agents next to an infected agent catch the virus
+        spread_infection(flat_status, healthy, status.shape, self.contacts)
+
+        self.move_all(flat_status, flat_days)
+        return np.bincount(dead // n_cells, minlength=len(status))
+
+    def move_all(self, status, days_ill):
+        """
+        This method moves every agent to a random empty spot within
+        max_range on its own grid, resolving collisions by random
+        priority.
+
+        Parameters:
+        -----------
+        status : array
+                The flat status grids of the replicates, updated in place
+        days_ill : array
+                The flat days-ill grids, updated in place
+        """
+        movers, targets = pick_moves(status, self.height * self.width,
+                                     self.reach, self.rng)
+        status[targets] = status[movers]
+        days_ill[targets] = days_ill[movers]
+        status[movers] = EMPTY
+        days_ill[movers] = 0
+
+    def plot_nchanges(self, title, file_name, show):
+        """
+        This method plots the mean healthy and infected populations and
+        the mean cumulative deaths over the replicates, with the range
+        they span. A stopped replicate keeps its last values.
+
+        Parameters:
+        -----------
+        title : string
+                The title of the graph
+        file_name : string
+                The file name of the graph, saved under
+                ./figures/virus_<ID>/
+        """
+        path = "./figures/virus_{}/".format(self.ID)
+        if not os.path.exists(path):
+            os.mkdir(path)
+
+        n_steps = self.n_recorded.max()
+        steps = np.arange(n_steps)
+        # hold every series at its last value once its replicate stopped
+        held = np.minimum(steps, self.n_recorded[:, None] - 1)
+        rows = np.arange(self.replicates)[:, None]
+        deaths = self.metrics['deaths'].cumsum(axis=1)
+
+        fig, ax = plt.subplots()
+        for values, label, color in (
+                (self.metrics['healthy'], "Healthy Population", 'g'),
+                (self.metrics['infected'], "Infected Population", 'b'),
+                (deaths, "Cumulative Deaths", 'r')):
+            series = values[rows, held]
+            ax.plot(steps, series.mean(axis=0), label=label, color=color)
+            ax.fill_between(steps, series.min(axis=0), series.max(axis=0),
+                            color=color, alpha=0.2)
+
+        ax.legend()
+        ax.set_xlabel("Iteration Number")
+        ax.set_ylabel("Population")
+        ax.set_title(title, fontsize=10, fontweight='bold')
+        if show:
+            plt.show()
+        elif not show:
+            fig.savefig(path + file_name)
+            plt.close(fig)
+
+
+if __name__ == '__main__':
+
+    width, height = 50, 50
+    death_rate = 0.03
+    cycle_time = 14
+    max_iter = 500
+    ratio_empty = 0.9
+    ratio_infected = 0.01
+    max_range = 1
+    replicates = 1000
+
+    ensemble = VirusEnsemble("ensemble_01", height, width, death_rate,
+                             cycle_time, ratio_empty, ratio_infected,
+                             max_iter, replicates, max_range)
+
+    ensemble.populate()
+    ensemble.update()
+    ensemble.plot_nchanges(
+        "Population Trends: Death Rate={}%, Sparsity={}%, {} Replicates"
+        .format(death_rate * 100, ratio_empty * 100, replicates),
+        "/virus_ensemble_populations.png", show=False)
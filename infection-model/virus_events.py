@@ -0,0 +1,467 @@
+# An event-driven version of the infection model. Instead of visiting every
+# agent at every timestep, each agent keeps the times of its next death,
+# recovery, infection and move in a heap, and the model jumps from one
+# event to the next (the next-reaction method of Gibson and Bruck). Time is
+# continuous and the cost follows the number of events, not the size of the
+# grid times the number of steps.
+
+import heapq
+import math
+import numpy as np
+from infection_model import VirusModel
+from frames import FrameWriter
+import common_path  # noqa: F401
+from neighbors import Neighborhood
+
+# event kinds
+DEATH = 0
+RECOVERY = 1
+INFECTION = 2
+MOVE = 3
+
+
+class VirusEventModel(VirusModel):
+    """A model of virus spreading in continuous time.
+
+    The stepped rules become rates, so that one time unit matches one
+    timestep of VirusModel:
+
+    - an infected agent dies at the constant rate -log(1 - mortality),
+      which gives the same chance of dying within a time unit,
+    - it recovers cycle_time + 2 time units after it was infected, when
+      the stepped model lets it recover,
+    - a healthy agent is infected at infection_rate times the number of
+      its infected neighbors,
+    - every agent tries to move move_rate times per time unit, to a
+      random empty spot within max_range.
+
+    The cell of a dead agent becomes empty, like in the synchronous
+    rules. Populations are recorded at every whole time unit, so the
+    series compare with those of the stepped engines, but they follow
+    a different process and only agree in distribution. Moves are most
+    of the events unless move_rate is lowered.
+
+    With move_radius, only the agents within move_radius of an infected
+    agent (in the neighborhood of the model) move, and only to spots
+    that are within move_radius of one too; the others stay put until
+    the outbreak comes near, or leaves them behind. The population
+    starts out uniformly random, and random moves inside an area they
+    cannot leave keep it so, so a frozen population far from the
+    infected agents looks like a moving one. The cost of moves then
+    follows the size of the outbreak rather than the population.
+    move_radius must be at least max_range, so that infected agents
+    move freely.
+
+    self.infected_agents maps infected agents to the time they were
+    infected, rather than to their days ill, and the exposure counts of
+    frontier=True are always kept, since they give the infection rates.
+    A checkpoint holds the pending events along with the agents, so a
+    resumed run handles the same events in the same order.
+    """
+
+    ENGINE_VERSION = 1
+
+    def __init__(self, ID, height, width, mortality,
+                 cycle_time, ratio_empty, ratio_infected,
+                 num_iter, max_range=1, seed=None, neighborhood='moore',
+                 boundary='bounded', infection_rate=1.0, move_rate=1.0,
+                 move_radius=None):
+        super(VirusEventModel, self).__init__(ID, height, width, mortality,
+                                              cycle_time, ratio_empty,
+                                              ratio_infected, num_iter,
+                                              max_range, seed, frontier=True,
+                                              neighborhood=neighborhood,
+                                              boundary=boundary)
+        self.infection_rate = infection_rate
+        self.move_rate = move_rate
+        self.move_radius = move_radius
+        # the number of infected agents within move_radius of the cells
+        # near the outbreak, only kept when move_radius is set
+        self.nearby = {}
+        if move_radius is not None:
+            if move_radius < max_range:
+                raise ValueError("move_radius must be at least max_range")
+            self.moving_area = Neighborhood((height, width), move_radius,
+                                            neighborhood, boundary,
+                                            include_center=True)
+        self.death_rate = -math.log1p(-mortality) if mortality < 1 \
+            else math.inf
+        self.time = 0.0
+        # a heap of events as (time, seq, kind, agent) entries; an entry
+        # is only live while self.pending[(agent, kind)] is that entry
+        self.events = []
+        self.pending = {}
+        self.seq = 0
+
+    def params(self):
+        """
+        This method returns the parameters that define a run.
+        """
+        params = super(VirusEventModel, self).params()
+        params.update({'infection_rate': self.infection_rate,
+                       'move_rate': self.move_rate,
+                       'move_radius': self.move_radius})
+        return params
+
+    def schedule(self, agent, kind, time):
+        """
+        This method sets the time of the next event of a kind for the
+        agent, replacing any pending one.
+        """
+        self.seq += 1
+        entry = (time, self.seq, kind, agent)
+        self.pending[(agent, kind)] = entry
+        heapq.heappush(self.events, entry)
+
+    def cancel(self, agent, kind):
+        """
+        This method drops the pending event of a kind for the agent.
+        """
+        self.pending.pop((agent, kind), None)
+
+    def after(self, rate):
+        """
+        This method returns the time of the next event of a Poisson
+        process with the given rate, or None if the rate is zero.
+        """
+        if rate == 0:
+            return None
+        if rate == math.inf:
+            return self.time
+        return self.time + self.rng.exponential(1 / rate)
+
+    def schedule_rate(self, agent, kind, rate):
+        """
+        This method schedules the next event of a kind for the agent at
+        the given rate, or cancels it if the rate is zero.
+        """
+        time = self.after(rate)
+        if time is None:
+            self.cancel(agent, kind)
+        else:
+            self.schedule(agent, kind, time)
+
+    def schedule_infection(self, agent):
+        """
+        This method redraws the infection time of a healthy agent from
+        its current number of infected neighbors. Exponential waiting
+        times have no memory, so redrawing after a change of rate is
+        exact.
+        """
+        self.schedule_rate(agent, INFECTION,
+                           self.infection_rate * self.exposure.get(agent, 0))
+
+    def schedule_illness(self, agent):
+        """
+        This method schedules the death and the recovery of an agent
+        that was just infected.
+        """
+        self.schedule_rate(agent, DEATH, self.death_rate)
+        self.schedule(agent, RECOVERY,
+                      self.infected_agents[agent] + self.cycle_time + 2)
+
+    def schedule_move(self, agent):
+        """
+        This method schedules the next move of an agent that has none
+        pending, if it is allowed to move.
+        """
+        if (agent, MOVE) in self.pending:
+            return
+        if self.move_radius is None or agent in self.nearby:
+            self.schedule_rate(agent, MOVE, self.move_rate)
+
+    def build_nearby(self):
+        """
+        This method recounts the infected agents within move_radius of
+        every cell near the outbreak.
+        """
+        self.nearby = {}
+        if self.move_radius is not None:
+            for agent in self.infected_agents:
+                for cell in self.moving_area.cells(agent):
+                    self.nearby[cell] = self.nearby.get(cell, 0) + 1
+
+    def shift_nearby(self, agent, step):
+        """
+        This method adds step to the nearby counts around agent after an
+        infected agent arrives there (step=1) or leaves (step=-1), and
+        starts or stops the moves of the agents whose cells join or
+        leave the moving area.
+        """
+        for cell in self.moving_area.cells(agent):
+            count = self.nearby.get(cell, 0) + step
+            if count:
+                self.nearby[cell] = count
+                if count == 1 and step == 1 and \
+                        (cell in self.healthy_agents or
+                         cell in self.infected_agents):
+                    self.schedule_move(cell)
+            else:
+                del self.nearby[cell]
+                self.cancel(cell, MOVE)
+
+    def set_infected(self, agent, days_ill):
+        """
+        This method places an infected agent at the given location.
+        """
+        super(VirusEventModel, self).set_infected(agent, days_ill)
+        if self.move_radius is not None:
+            self.shift_nearby(agent, 1)
+
+    def clear_infected(self, agent):
+        """
+        This method removes the infected agent at the given location.
+        """
+        super(VirusEventModel, self).clear_infected(agent)
+        if self.move_radius is not None:
+            self.shift_nearby(agent, -1)
+
+    def pick_empty(self, agent, roll=None):
+        """
+        This method returns a random empty spot within reach of the
+        agent, or None if there is none. With move_radius the spot must
+        be in the moving area too, so agents do not leak out of it.
+        """
+        if self.move_radius is None:
+            return super(VirusEventModel, self).pick_empty(agent, roll)
+        spots = [spot for spot in self.reach.cells(agent)
+                 if spot in self.empty_spots and spot in self.nearby]
+        if len(spots) == 0:
+            return None
+        if roll is None:
+            roll = self.rng.random()
+        return spots[min(int(roll * len(spots)), len(spots) - 1)]
+
+    def reschedule_neighbors(self, agent):
+        """
+        This method redraws the infection times of the healthy agents
+        around agent, after the infected agents next to them changed.
+        """
+        for neighbor in self.contacts.cells(agent):
+            if neighbor in self.healthy_agents:
+                self.schedule_infection(neighbor)
+
+    def start(self):
+        """
+        This method schedules the first events of every agent at time 0.
+        """
+        self.time = 0.0
+        self.events = []
+        self.pending = {}
+        self.build_nearby()
+        for agent in self.infected_agents:
+            self.infected_agents[agent] = 0.0
+            self.schedule_illness(agent)
+            self.schedule_move(agent)
+        for agent in self.healthy_agents:
+            self.schedule_infection(agent)
+            self.schedule_move(agent)
+
+    def update(self, plot, frames=None, snapshot_every=10, checkpoint=None,
+               checkpoint_every=100):
+        """
+        This method runs the events of num_iter time units, or until
+        no infected agents are left. A run restored by resume() carries
+        on from its iteration.
+
+        Parameters:
+        -----------
+        plot : boolean
+                Whether to save a PNG of the grid every snapshot_every
+                time units
+        frames : FrameWriter or None
+                A frames.FrameWriter that receives the status grid every
+                snapshot_every time units
+        snapshot_every : integer
+                The number of time units between snapshots
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every time units, see save_checkpoint()
+        checkpoint_every : integer
+                The number of time units between checkpoints
+        """
+        if self.iteration == 0:
+            self.start()
+
+            # add initial population
+            self.record(len(self.healthy_agents), len(self.infected_agents),
+                        0)
+
+        for i in range(self.iteration, self.num_iter):
+            n_deaths = self.run_until(i + 1)
+
+            self.record(len(self.healthy_agents), len(self.infected_agents),
+                        n_deaths)
+
+            # if you want to record the changes
+            if i % snapshot_every == 0:
+                self.snapshot(i, plot, frames)
+
+            if len(self.infected_agents) == 0:
+                # simulation stops if there are no more infected people
+                break
+
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def run_until(self, end):
+        """
+        This method handles the events up to time end in time order and
+        returns the number of deaths among them.
+        """
+        n_deaths = 0
+        while self.events and self.events[0][0] <= end:
+            entry = heapq.heappop(self.events)
+            time, seq, kind, agent = entry
+            if self.pending.get((agent, kind)) is not entry:
+                # replaced or cancelled since it was scheduled
+                continue
+            del self.pending[(agent, kind)]
+            self.time = time
+
+            if kind == DEATH:
+                self.die(agent)
+                n_deaths += 1
+            elif kind == RECOVERY:
+                self.recover(agent)
+            elif kind == INFECTION:
+                self.infect(agent)
+            else:
+                self.move(agent)
+        self.time = end
+        return n_deaths
+
+    def die(self, agent):
+        """
+        This method removes an infected agent, leaving its cell empty.
+        """
+        self.cancel(agent, RECOVERY)
+        self.cancel(agent, MOVE)
+        self.clear_infected(agent)
+        self.empty_spots.add(agent)
+        self.reschedule_neighbors(agent)
+
+    def recover(self, agent):
+        """
+        This method turns an infected agent healthy.
+        """
+        self.cancel(agent, DEATH)
+        self.clear_infected(agent)
+        self.healthy_agents[agent] = 0
+        self.schedule_infection(agent)
+        self.reschedule_neighbors(agent)
+
+    def infect(self, agent):
+        """
+        This method turns a healthy agent infected.
+        """
+        del self.healthy_agents[agent]
+        self.set_infected(agent, self.time)
+        self.schedule_illness(agent)
+        self.reschedule_neighbors(agent)
+
+    def move(self, agent):
+        """
+        This method moves an agent to a random empty spot within reach,
+        if there is one, and schedules its next move. Its pending death
+        and recovery go with it.
+        """
+        new_spot = self.pick_empty(agent)
+        if new_spot is None:
+            self.schedule_move(agent)
+            return
+
+        inf = agent in self.infected_agents
+        self.move_agent(agent, new_spot, inf)
+        self.schedule_move(new_spot)
+        if inf:
+            for kind in (DEATH, RECOVERY):
+                entry = self.pending.pop((agent, kind), None)
+                if entry is not None:
+                    self.schedule(new_spot, kind, entry[0])
+            self.reschedule_neighbors(agent)
+            self.reschedule_neighbors(new_spot)
+        else:
+            self.cancel(agent, INFECTION)
+            self.schedule_infection(new_spot)
+
+    def state_arrays(self):
+        """
+        This method returns the cell states and the whole days every
+        infected agent has been ill.
+        """
+        infected_at = self.infected_agents
+        self.infected_agents = {agent: int(self.time - time)
+                                for agent, time in infected_at.items()}
+        try:
+            return super(VirusEventModel, self).state_arrays()
+        finally:
+            self.infected_agents = infected_at
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint: the agents and empty spots of VirusModel, with the
+        time every infected agent was infected instead of its days ill,
+        the clock, the event counter and every pending event as its time,
+        sequence number, kind and flat cell.
+        """
+        arrays = super(VirusEventModel, self).checkpoint_arrays()
+        del arrays['days_ill']
+        arrays['infected_at'] = np.array(list(self.infected_agents.values()),
+                                         dtype=np.float64)
+        arrays['time'] = np.array(self.time)
+        arrays['seq'] = np.array(self.seq)
+        entries = sorted(self.pending.values())
+        arrays['event_time'] = np.array([entry[0] for entry in entries],
+                                        dtype=np.float64)
+        arrays['event_seq'] = np.array([entry[1] for entry in entries],
+                                       dtype=np.int64)
+        arrays['event_kind'] = np.array([entry[2] for entry in entries],
+                                        dtype=np.int8)
+        arrays['event_agent'] = self.flat_cells(entry[3] for entry in entries)
+        return arrays
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method restores the arrays returned by checkpoint_arrays().
+        Stale heap entries are not saved, and the live ones pop in the
+        same (time, seq) order from the rebuilt heap.
+        """
+        arrays = dict(arrays, days_ill=arrays['infected_at'])
+        super(VirusEventModel, self).load_checkpoint_arrays(arrays)
+        self.build_nearby()
+        self.time = float(arrays['time'])
+        self.seq = int(arrays['seq'])
+        self.events = list(zip(arrays['event_time'].tolist(),
+                               arrays['event_seq'].tolist(),
+                               arrays['event_kind'].tolist(),
+                               self.cell_keys(arrays['event_agent'])))
+        # sorted entries are already a heap
+        self.events.sort()
+        self.pending = {(entry[3], entry[2]): entry for entry in self.events}
+
+
+if __name__ == '__main__':
+
+    width, height = 200, 200
+    death_rate = 0.03
+    cycle_time = 14
+    max_iter = 500
+    ratio_empty = 0.95
+    ratio_infected = 0.01
+    max_range = 1
+
+    virus_events = VirusEventModel("events_01", height, width, death_rate,
+                                   cycle_time, ratio_empty, ratio_infected,
+                                   max_iter, max_range)
+
+    virus_events.populate()
+    # stream every 10th time unit to disk, render later with frames.py
+    with FrameWriter("virus_events_01_frames.npy", (height, width),
+                     max_iter // 10 + 1) as frames:
+        virus_events.update(False, frames)
+    virus_events.plot_nchanges(
+        "Population Trends: Death Rate={}%, Sparsity={}%".format(
+            death_rate * 100, ratio_empty * 100),
+        "/virus_events_populations.png", show=False)
@@ -0,0 +1,344 @@
+# A vectorized version of the infection model. Instead of dicts keyed by
+# (x, y) tuples the population lives in dense NumPy arrays: a status grid
+# and a days-ill grid. Each step is a handful of whole-grid operations.
+
+import numpy as np
+from infection_model import VirusModel, EMPTY, HEALTHY, INFECTED
+from agent_store import AgentStore
+from frames import FrameWriter
+
+
+# The phases of an iteration work on flat status and days-ill arrays that
+# hold one grid or a stack of grids of n_cells cells each, so that
+# VirusGridModel (one grid) and virus_ensemble.VirusEnsemble (one grid per
+# replicate) step the same code and draw the same random numbers.
+
+def run_illness(status, days_ill, rng, mortality, cycle_time, strain=None):
+    """
+    This function draws the mortality rolls of every infected agent and
+    lets the survivors recover or get one more day ill, in place. It
+    returns the flat cells of the agents that died, whose days ill are
+    left for the caller to clear, and of the agents that recovered.
+
+    With strain, the strain code of every flat cell, mortality and
+    cycle_time are arrays indexed by strain code, and every agent gets
+    the rates of its own strain.
+    """
+    infected = np.flatnonzero(status == INFECTED)
+    if strain is not None:
+        mortality = mortality[strain[infected]]
+    dead = rng.random(len(infected)) <= mortality
+    status[infected[dead]] = EMPTY
+    survivors = infected[~dead]
+    if strain is not None:
+        cycle_time = cycle_time[strain[survivors]]
+    recovering = days_ill[survivors] > cycle_time
+    status[survivors[recovering]] = HEALTHY
+    days_ill[survivors[recovering]] = 0
+    days_ill[survivors[~recovering]] += 1
+    return infected[dead], survivors[recovering]
+
+
+def spread_infection(status, healthy, shape, contacts):
+    """
+    This function infects, in place, the agents in healthy (a mask of
+    the flat cells that were healthy at the start of the iteration) that
+    have an infected neighbor.
+
+    Parameters:
+    -----------
+    status : array
+            The flat status of the grids
+    healthy : array
+            The flat mask of the healthy agents
+    shape : tuple
+            The shape of the grids, (height, width) or (replicates,
+            height, width)
+    contacts : Neighborhood
+            The neighborhood in which the virus spreads
+    """
+    exposed = contacts.count((status == INFECTED).reshape(shape)) > 0
+    status[healthy & exposed.reshape(-1)] = INFECTED
+
+
+def pick_moves(status, n_cells, reach, rng, ranges=None):
+    """
+    This function lets every agent pick a random empty spot within
+    reach on its own grid, and resolves collisions by random priority.
+
+    Parameters:
+    -----------
+    status : array
+            The flat status of the grids
+    n_cells : integer
+            The number of cells of one grid
+    reach : Neighborhood
+            The spots within max_range of a cell, the cell included
+    ranges : array or None
+            How far the agent in every flat cell may move, at most the
+            radius of reach; every agent may use all of reach when None
+
+    Returns:
+    movers : array
+            The flat cells of the agents that move
+    targets : array
+            The flat cells they move to
+    """
+    indptr, indices = reach.table()
+
+    agents = np.flatnonzero(status)
+    if len(agents) == 0:
+        return agents, agents
+    cells = agents % n_cells
+    base = agents - cells
+
+    # candidate spots for every agent, one row per agent, read from the
+    # neighbor table of one grid; short rows are padded
+    start = indptr[cells]
+    slot = np.arange(len(reach.offsets))
+    free = slot < (indptr[cells + 1] - start)[:, None]
+    entries = np.where(free, start[:, None] + slot, 0)
+    spots = indices[entries] + base[:, None]
+    free &= status[spots] == EMPTY
+    if ranges is not None:
+        # only the spots within the agent's own range
+        free &= reach.table_distances()[entries] <= ranges[agents][:, None]
+
+    # pick one of the free spots uniformly at random
+    n_free = free.sum(axis=1)
+    pick = (rng.random(len(agents)) * n_free).astype(np.int64)
+    chosen = free & (np.cumsum(free, axis=1) - 1 == pick[:, None])
+    movers = agents[n_free > 0]
+    targets = spots[chosen]
+
+    # when two agents want the same spot the higher priority wins
+    priority = rng.random(len(movers))
+    order = np.lexsort((-priority, targets))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = targets[order][1:] != targets[order][:-1]
+    return movers[order[first]], targets[order[first]]
+
+
+class VirusGridModel(VirusModel):
+    """A model of virus spreading on dense NumPy grids.
+
+    This is VirusModel(synchronous=True) with every phase applied to all
+    agents at once: mortality and recovery rolls are drawn for all
+    infected agents in one vector, exposure comes from one shifted-array
+    sum over the infected grid, and every agent then moves to a random
+    empty spot within max_range. When several agents pick the same spot
+    the one with the highest random priority gets it and the others stay
+    put. A seeded run gives the same results as the dict model.
+    Neighborhoods come from the flat CSR tables of neighbors.Neighborhood,
+    so the 'torus' boundary and von Neumann neighborhoods work here too.
+
+    self.attributes is an agent_store.AgentStore of per-agent
+    attributes. days_ill is the first; others added to it move with
+    their agents and are cleared when they die, but the rules only read
+    the ones they know of. An integer 'max_range' attribute limits how
+    far each agent moves: an agent only picks spots within its own
+    max_range, and never beyond the max_range of the model.
+    """
+
+    ENGINE_VERSION = 1
+
+    def __init__(self, ID, height, width, mortality,
+                 cycle_time, ratio_empty, ratio_infected,
+                 num_iter, max_range=1, seed=None, neighborhood='moore',
+                 boundary='bounded'):
+        super(VirusGridModel, self).__init__(ID, height, width, mortality,
+                                             cycle_time, ratio_empty,
+                                             ratio_infected, num_iter,
+                                             max_range, seed,
+                                             neighborhood=neighborhood,
+                                             boundary=boundary,
+                                             synchronous=True)
+        self.status = np.zeros((height, width), dtype=np.int8)
+        self.days_ill = np.zeros((height, width), dtype=np.int32)
+        self.attributes = AgentStore(height * width)
+        self.attributes.add('days_ill', np.int32, array=self.days_ill)
+
+    @property
+    def healthy_agents(self):
+        """healthy agents as a {(x, y): 0} dict, like VirusModel"""
+        xs, ys = np.nonzero(self.status == HEALTHY)
+        return dict.fromkeys(zip(xs.tolist(), ys.tolist()), 0)
+
+    @healthy_agents.setter
+    def healthy_agents(self, agents):
+        if agents:
+            raise AttributeError("VirusGridModel keeps agents in self.status")
+
+    @property
+    def infected_agents(self):
+        """infected agents as a {(x, y): days_ill} dict, like VirusModel"""
+        xs, ys = np.nonzero(self.status == INFECTED)
+        return dict(zip(zip(xs.tolist(), ys.tolist()),
+                        self.days_ill[xs, ys].tolist()))
+
+    @infected_agents.setter
+    def infected_agents(self, agents):
+        if agents:
+            raise AttributeError("VirusGridModel keeps agents in self.status")
+
+    def populate(self):
+        """
+        This method is used to initially populate a grid with randomly
+        distributed people that can move around.
+        """
+        n_cells = self.height * self.width
+        cells = self.rng.permutation(n_cells)
+
+        self.n_empty = int(self.ratio_empty * n_cells)
+        self.n_infected = int(self.ratio_infected * (n_cells - self.n_empty))
+
+        status = self.status.reshape(-1)
+        status[:] = EMPTY
+        status[cells[self.n_empty:]] = HEALTHY
+        status[cells[self.n_empty:self.n_empty + self.n_infected]] = INFECTED
+        self.attributes.clear(slice(None))
+
+    def update(self, plot, frames=None, snapshot_every=10, checkpoint=None,
+               checkpoint_every=100):
+        """
+        This method executes a synchronous update for the model
+
+        Parameters:
+        -----------
+        plot : boolean
+                Whether to save a PNG of the grid every snapshot_every
+                timesteps
+        frames : FrameWriter or None
+                A frames.FrameWriter that receives the status grid every
+                snapshot_every timesteps
+        snapshot_every : integer
+                The number of timesteps between snapshots
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every timesteps, see save_checkpoint()
+        checkpoint_every : integer
+                The number of timesteps between checkpoints
+        """
+        status = self.status.reshape(-1)
+
+        if self.iteration == 0:
+            self.record((status == HEALTHY).sum(), (status == INFECTED).sum(),
+                        0)
+
+        for i in range(self.iteration, self.num_iter):
+            n_deaths = self.step()
+
+            self.record((status == HEALTHY).sum(), (status == INFECTED).sum(),
+                        n_deaths)
+
+            # if you want to record the changes
+            if i % snapshot_every == 0:
+                self.snapshot(i, plot, frames)
+
+            if self.infected_population[-1] == 0:
+                # simulation stops if there are no more infected people
+                break
+
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def status_grid(self):
+        """
+        This method returns the grid as an array of cell states (EMPTY,
+        HEALTHY or INFECTED), indexed by [x, y].
+        """
+        return self.status.astype(np.uint8)
+
+    def state_arrays(self):
+        """
+        This method returns copies of the status grid and of the grid of
+        every agent attribute, days ill included.
+        """
+        state = {'status': self.status_grid()}
+        for name, column in self.attributes.columns.items():
+            state[name] = column.reshape(self.height, self.width).copy()
+        return state
+
+    def load_state_arrays(self, state):
+        """
+        This method restores the grids returned by state_arrays(). Agent
+        attributes missing from state are reset to their defaults.
+        """
+        self.status[:] = state['status']
+        self.attributes.clear(slice(None))
+        for name, column in self.attributes.columns.items():
+            if name in state:
+                column[:] = state[name].reshape(-1)
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint. The grids are all there is: agents are visited in
+        (x, y) order.
+        """
+        return self.state_arrays()
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method restores the arrays returned by checkpoint_arrays().
+        """
+        self.load_state_arrays(arrays)
+
+    def step(self):
+        """
+        This method runs one synchronous iteration and returns the
+        number of deaths.
+        """
+        status = self.status.reshape(-1)
+        healthy = status == HEALTHY
+
+        # mortality and recovery rolls for every infected agent
+        dead, _ = run_illness(status, self.days_ill.reshape(-1), self.rng,
+                              self.mortality, self.cycle_time)
+        self.attributes.clear(dead)
+
+        # healthy agents next to an infected agent catch the virus
+        spread_infection(status, healthy, self.status.shape, self.contacts)
+
+        self.move_all()
+        return len(dead)
+
+    def move_all(self):
+        """
+        This method moves every agent to a random empty spot within
+        max_range, or within its own max_range attribute, resolving
+        collisions by random priority.
+        """
+        status = self.status.reshape(-1)
+        ranges = self.attributes['max_range'] \
+            if 'max_range' in self.attributes else None
+        movers, targets = pick_moves(status, len(status), self.reach,
+                                     self.rng, ranges)
+        status[targets] = status[movers]
+        status[movers] = EMPTY
+        self.attributes.move(movers, targets)
+
+
+if __name__ == '__main__':
+
+    width, height = 2000, 2000
+    death_rate = 0.03
+    cycle_time = 14
+    max_iter = 500
+    ratio_empty = 0.9
+    ratio_infected = 0.01
+    max_range = 1
+
+    virus_grid = VirusGridModel("grid_01", height, width, death_rate,
+                                cycle_time, ratio_empty, ratio_infected,
+                                max_iter, max_range)
+
+    virus_grid.populate()
+    # stream every 10th timestep to disk, render later with frames.py
+    with FrameWriter("virus_grid_01_frames.npy", (height, width),
+                     max_iter // 10 + 1) as frames:
+        virus_grid.update(False, frames)
+    virus_grid.plot_nchanges(
+        "Population Trends: Death Rate={}%, Sparsity={}%".format(
+            death_rate * 100, ratio_empty * 100),
+        "/virus_grid_populations.png", show=False)
@@ -0,0 +1,323 @@
+# A compiled version of the infection model. The agents live in flat
+# arrays and each iteration is one call of a Numba kernel that visits them
+# one at a time, exactly like VirusModel.update(), so a seeded run gives
+# the same results as VirusModel. Without numba the kernel runs as plain
+# Python; see jit.py.
+
+import numpy as np
+from infection_model import VirusModel, EMPTY, HEALTHY, INFECTED
+import common_path  # noqa: F401
+from jit import njit, append_log, compact_log
+from frames import FrameWriter
+
+# a cell freed by a death; VirusModel does not put it back into the
+# pool of empty spots, so nobody can move there
+DEAD = 3
+
+
+@njit(cache=True)
+def pick_empty(cell, status, indptr, indices, roll):
+    """
+    This function returns a random empty cell within reach of cell, or
+    -1 if there is none, picked like VirusModel.move_to_empty().
+    """
+    n_free = 0
+    for k in range(indptr[cell], indptr[cell + 1]):
+        if status[indices[k]] == EMPTY:
+            n_free += 1
+    if n_free == 0:
+        return -1
+    pick = min(int(roll * n_free), n_free - 1)
+    for k in range(indptr[cell], indptr[cell + 1]):
+        if status[indices[k]] == EMPTY:
+            if pick == 0:
+                return indices[k]
+            pick -= 1
+    return -1
+
+
+@njit(cache=True)
+def virus_step(status, days_ill, infected, n_infected, infected_pos,
+               healthy, n_healthy, healthy_pos, contact_ptr, contacts,
+               reach_ptr, reach, mortality, cycle_time, death_rolls,
+               move_rolls):
+    """
+    This function runs one iteration of VirusModel.update() over the
+    flat arrays and returns the number of deaths and the new lengths of
+    the infected and healthy logs.
+    """
+    n_deaths = 0
+    n_i = n_infected
+    n_h = n_healthy
+
+    for j in range(n_infected):
+        cell = infected[j]
+        if death_rolls[j] <= mortality:
+            status[cell] = DEAD
+            days_ill[cell] = 0
+            infected_pos[cell] = -1
+            n_deaths += 1
+            continue
+
+        if days_ill[cell] > cycle_time:
+            # recovered, and moves as a healthy agent
+            status[cell] = HEALTHY
+            days_ill[cell] = 0
+            infected_pos[cell] = -1
+            n_h = append_log(healthy, n_h, healthy_pos, cell)
+            new = pick_empty(cell, status, reach_ptr, reach, move_rolls[j])
+            if new >= 0:
+                status[new] = HEALTHY
+                n_h = append_log(healthy, n_h, healthy_pos, new)
+                status[cell] = EMPTY
+                healthy_pos[cell] = -1
+        else:
+            days_ill[cell] += 1
+            new = pick_empty(cell, status, reach_ptr, reach, move_rolls[j])
+            if new >= 0:
+                status[new] = INFECTED
+                days_ill[new] = days_ill[cell]
+                n_i = append_log(infected, n_i, infected_pos, new)
+                status[cell] = EMPTY
+                days_ill[cell] = 0
+                infected_pos[cell] = -1
+
+    for j in range(n_healthy):
+        cell = healthy[j]
+        roll = move_rolls[n_infected + j]
+        exposed = False
+        for k in range(contact_ptr[cell], contact_ptr[cell + 1]):
+            if status[contacts[k]] == INFECTED:
+                exposed = True
+                break
+
+        if exposed:
+            status[cell] = INFECTED
+            healthy_pos[cell] = -1
+            n_i = append_log(infected, n_i, infected_pos, cell)
+        new = pick_empty(cell, status, reach_ptr, reach, roll)
+        if new >= 0:
+            status[new] = status[cell]
+            if exposed:
+                n_i = append_log(infected, n_i, infected_pos, new)
+                infected_pos[cell] = -1
+            else:
+                n_h = append_log(healthy, n_h, healthy_pos, new)
+                healthy_pos[cell] = -1
+            status[cell] = EMPTY
+
+    n_i = compact_log(infected, n_i, infected_pos)
+    n_h = compact_log(healthy, n_h, healthy_pos)
+    return n_deaths, n_i, n_h
+
+
+class VirusJitModel(VirusModel):
+    """A model of virus spreading, compiled with Numba.
+
+    The rules, the order in which agents are visited and the random
+    draws are those of VirusModel: self.status and self.days_ill hold
+    the grid as flat arrays, and self.infected and self.healthy hold the
+    agents in the insertion order of VirusModel's dicts (see jit.py).
+    Neighborhoods come from the CSR tables of neighbors.Neighborhood.
+    """
+
+    ENGINE_VERSION = 1
+
+    def __init__(self, ID, height, width, mortality,
+                 cycle_time, ratio_empty, ratio_infected,
+                 num_iter, max_range=1, seed=None, neighborhood='moore',
+                 boundary='bounded'):
+        super(VirusJitModel, self).__init__(ID, height, width, mortality,
+                                            cycle_time, ratio_empty,
+                                            ratio_infected, num_iter,
+                                            max_range, seed,
+                                            neighborhood=neighborhood,
+                                            boundary=boundary)
+        n_cells = height * width
+        self.status = np.zeros(n_cells, dtype=np.int8)
+        self.days_ill = np.zeros(n_cells, dtype=np.int64)
+        self.infected_pos = np.full(n_cells, -1, dtype=np.int64)
+        self.healthy_pos = np.full(n_cells, -1, dtype=np.int64)
+        self.set_agents(np.zeros(0, dtype=np.int64),
+                        np.zeros(0, dtype=np.int64))
+
+    @property
+    def healthy_agents(self):
+        """healthy agents as a {(x, y): 0} dict, like VirusModel"""
+        xs, ys = np.divmod(self.healthy[:self.n_healthy], self.width)
+        return dict.fromkeys(zip(xs.tolist(), ys.tolist()), 0)
+
+    @healthy_agents.setter
+    def healthy_agents(self, agents):
+        if agents:
+            raise AttributeError("VirusJitModel keeps agents in self.status")
+
+    @property
+    def infected_agents(self):
+        """infected agents as a {(x, y): days_ill} dict, like VirusModel"""
+        cells = self.infected[:self.n_infected]
+        xs, ys = np.divmod(cells, self.width)
+        return dict(zip(zip(xs.tolist(), ys.tolist()),
+                        self.days_ill[cells].tolist()))
+
+    @infected_agents.setter
+    def infected_agents(self, agents):
+        if agents:
+            raise AttributeError("VirusJitModel keeps agents in self.status")
+
+    def set_agents(self, healthy, infected):
+        """
+        This method fills the logs with the given flat cells, in order.
+        An agent adds at most two entries an iteration, so three times
+        the population leaves room for the live entries and one
+        iteration of new ones.
+        """
+        n_agents = len(healthy) + len(infected)
+        for name, cells in (('healthy', healthy), ('infected', infected)):
+            log = np.zeros(3 * n_agents + 1, dtype=np.int64)
+            log[:len(cells)] = cells
+            pos = getattr(self, name + '_pos')
+            pos[:] = -1
+            pos[cells] = np.arange(len(cells))
+            setattr(self, name, log)
+            setattr(self, 'n_' + name, len(cells))
+
+    def populate(self):
+        """
+        This method is used to initially populate a grid with randomly
+        distributed people that can move around.
+        """
+        n_cells = self.height * self.width
+        cells = self.rng.permutation(n_cells)
+
+        self.n_empty = int(self.ratio_empty * n_cells)
+        self.n_infected = int(self.ratio_infected * (n_cells - self.n_empty))
+        infected = cells[self.n_empty:self.n_empty + self.n_infected]
+        healthy = cells[self.n_empty + self.n_infected:]
+
+        self.status[:] = EMPTY
+        self.status[healthy] = HEALTHY
+        self.status[infected] = INFECTED
+        self.days_ill[:] = 0
+        self.set_agents(healthy, infected)
+
+    def update(self, plot, frames=None, snapshot_every=10, checkpoint=None,
+               checkpoint_every=100):
+        """
+        This method executes an asynchronous update for the model
+
+        Parameters:
+        -----------
+        plot : boolean
+                Whether to save a PNG of the grid every snapshot_every
+                timesteps
+        frames : FrameWriter or None
+                A frames.FrameWriter that receives the status grid every
+                snapshot_every timesteps
+        snapshot_every : integer
+                The number of timesteps between snapshots
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every timesteps, see save_checkpoint()
+        checkpoint_every : integer
+                The number of timesteps between checkpoints
+        """
+        contact_ptr, contacts = self.contacts.table()
+        reach_ptr, reach = self.reach.table()
+
+        if self.iteration == 0:
+            self.record(self.n_healthy, self.n_infected, 0)
+
+        for i in range(self.iteration, self.num_iter):
+            death_rolls = self.rng.random(self.n_infected)
+            move_rolls = self.rng.random(self.n_infected + self.n_healthy)
+
+            n_deaths, self.n_infected, self.n_healthy = virus_step(
+                self.status, self.days_ill, self.infected, self.n_infected,
+                self.infected_pos, self.healthy, self.n_healthy,
+                self.healthy_pos, contact_ptr, contacts, reach_ptr, reach,
+                self.mortality, self.cycle_time, death_rolls, move_rolls)
+
+            self.record(self.n_healthy, self.n_infected, n_deaths)
+
+            # if you want to record the changes
+            if i % snapshot_every == 0:
+                self.snapshot(i, plot, frames)
+
+            if self.n_infected == 0:
+                # simulation stops if there are no more infected people
+                break
+
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def status_grid(self):
+        """
+        This method returns the grid as an array of cell states (EMPTY,
+        HEALTHY or INFECTED), indexed by [x, y].
+        """
+        grid = self.status.astype(np.uint8)
+        grid[grid == DEAD] = EMPTY
+        return grid.reshape(self.height, self.width)
+
+    def state_arrays(self):
+        """
+        This method returns the cell states and the days-ill grid.
+        """
+        return {'status': self.status_grid(),
+                'days_ill': self.days_ill.reshape(
+                    self.height, self.width).astype(np.int32)}
+
+    def load_state_arrays(self, state):
+        """
+        This method restores the grids returned by state_arrays(). The
+        agents are ordered like the ones VirusModel rebuilds.
+        """
+        self.status[:] = state['status'].reshape(-1)
+        self.days_ill[:] = state['days_ill'].reshape(-1)
+        self.set_agents(np.flatnonzero(self.status == HEALTHY),
+                        np.flatnonzero(self.status == INFECTED))
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint: the flat grids, DEAD cells included, and the live
+        part of the logs, in order.
+        """
+        return {'status': self.status.copy(),
+                'days_ill': self.days_ill.copy(),
+                'healthy': self.healthy[:self.n_healthy].copy(),
+                'infected': self.infected[:self.n_infected].copy()}
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method restores the arrays returned by checkpoint_arrays().
+        """
+        self.status[:] = arrays['status']
+        self.days_ill[:] = arrays['days_ill']
+        self.set_agents(arrays['healthy'], arrays['infected'])
+
+
+if __name__ == '__main__':
+
+    width, height = 2000, 2000
+    death_rate = 0.03
+    cycle_time = 14
+    max_iter = 500
+    ratio_empty = 0.9
+    ratio_infected = 0.01
+    max_range = 1
+
+    virus_jit = VirusJitModel("jit_01", height, width, death_rate,
+                              cycle_time, ratio_empty, ratio_infected,
+                              max_iter, max_range)
+
+    virus_jit.populate()
+    # stream every 10th timestep to disk, render later with frames.py
+    with FrameWriter("virus_jit_01_frames.npy", (height, width),
+                     max_iter // 10 + 1) as frames:
+        virus_jit.update(False, frames)
+    virus_jit.plot_nchanges(
+        "Population Trends: Death Rate={}%, Sparsity={}%".format(
+            death_rate * 100, ratio_empty * 100),
+        "/virus_jit_populations.png", show=False)
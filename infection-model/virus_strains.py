@@ -0,0 +1,242 @@
+# The vectorized infection model with several strains of the virus going
+# around at once. Every infected agent carries a strain code in the agent
+# store, each strain has its own mortality, cycle time, transmissibility and
+# immunity, and the exposure of every cell to every strain comes from one
+# batched neighbor count.
+
+import numpy as np
+from infection_model import HEALTHY, INFECTED
+from virus_grid import VirusGridModel, run_illness
+from infection_agent import infection
+from frames import FrameWriter
+
+
+class VirusStrainModel(VirusGridModel):
+    """A model of several virus strains spreading on dense NumPy grids.
+
+    strains is a list of infection_agent.infection, one per strain; by
+    default a single strain made of mortality and cycle_time, which
+    gives the same results as VirusGridModel for the same seed. The
+    initial infected agents are split evenly between the strains.
+
+    self.attributes holds two more columns: 'strain', 0 for an agent
+    that is not infected and k + 1 for one infected with strains[k],
+    and 'immune', a bit mask of the strains an agent can no longer
+    catch. Each iteration follows VirusGridModel, with the mortality
+    and the cycle time of each agent's strain. A healthy agent with n
+    infected neighbors of a strain catches it with probability
+    1 - (1 - transmissibility) ** n, unless it is immune. When this is
+    not certain, or when several strains could infect it, the agent
+    draws one roll per strain and the strain with the smallest roll
+    relative to its probability wins, if that roll is below it.
+    Recovering from a strain makes an agent immune to the strains in
+    its immunity.
+
+    The metrics 'infected_k' and 'deaths_k' count the agents infected
+    with and killed by strains[k].
+    """
+
+    ENGINE_VERSION = 1
+
+    def __init__(self, ID, height, width, mortality,
+                 cycle_time, ratio_empty, ratio_infected,
+                 num_iter, max_range=1, seed=None, neighborhood='moore',
+                 boundary='bounded', strains=None):
+        super(VirusStrainModel, self).__init__(ID, height, width, mortality,
+                                               cycle_time, ratio_empty,
+                                               ratio_infected, num_iter,
+                                               max_range, seed,
+                                               neighborhood=neighborhood,
+                                               boundary=boundary)
+        if strains is None:
+            strains = [infection(mortality, cycle_time)]
+        if not 0 < len(strains) <= 64:
+            raise ValueError("a model has between 1 and 64 strains, "
+                             "not {}".format(len(strains)))
+        self.strains = list(strains)
+        n_strains = len(self.strains)
+
+        # the parameters of every strain code, code 0 (not infected)
+        # first
+        self.mortality_of = np.array(
+            [0.0] + [s.mortality for s in self.strains])
+        self.cycle_time_of = np.array(
+            [0] + [s.cycle_time for s in self.strains], dtype=np.int64)
+        self.transmissibility = np.array(
+            [s.transmissibility for s in self.strains])
+        self.immunity_of = np.zeros(n_strains + 1, dtype=np.uint64)
+        for k, strain in enumerate(self.strains):
+            for j in strain.immunity:
+                self.immunity_of[k + 1] |= np.uint64(1) << np.uint64(j)
+        self.codes = np.arange(1, n_strains + 1, dtype=np.int8)
+        # the deaths of every strain code in the last step
+        self.strain_deaths = np.zeros(n_strains + 1, dtype=np.int64)
+
+        self.strain = self.attributes.add('strain', np.int8)
+        self.immune = self.attributes.add('immune', np.uint64)
+        for k in range(n_strains):
+            for name in ('infected_{}', 'deaths_{}'):
+                self.metrics[name.format(k)] = np.zeros(num_iter + 1,
+                                                        dtype=np.int64)
+
+    @property
+    def infected_by_strain(self):
+        """the number of agents infected with each strain (one row per
+        strain) at each recorded timestep"""
+        return np.array([self.metrics['infected_{}'.format(k)]
+                         [:self.n_recorded]
+                         for k in range(len(self.strains))])
+
+    def params(self):
+        """
+        This method returns the parameters that define a run.
+        """
+        params = super(VirusStrainModel, self).params()
+        params['strains'] = [{'mortality': s.mortality,
+                              'cycle_time': s.cycle_time,
+                              'transmissibility': s.transmissibility,
+                              'immunity': list(s.immunity)}
+                             for s in self.strains]
+        return params
+
+    def populate(self):
+        """
+        This method is used to initially populate a grid with randomly
+        distributed people that can move around, the infected ones
+        split evenly between the strains.
+        """
+        super(VirusStrainModel, self).populate()
+        infected = np.flatnonzero(self.status.reshape(-1) == INFECTED)
+        for k, code in enumerate(self.codes):
+            self.strain[infected[k::len(self.codes)]] = code
+
+    def record(self, healthy, infected, deaths):
+        """
+        This method stores the populations at the end of a timestep,
+        per strain too.
+        """
+        super(VirusStrainModel, self).record(healthy, infected, deaths)
+        # deaths is the total of the step just run, or 0 before the first
+        if deaths:
+            self.record_strains(self.strain_deaths)
+        else:
+            self.record_strains(np.zeros(len(self.codes) + 1,
+                                         dtype=np.int64))
+
+    def record_strains(self, deaths):
+        """
+        This method stores the number of agents infected with and killed
+        by every strain in the last recorded timestep.
+
+        Parameters:
+        -----------
+        deaths : array
+                The number of deaths caused by each strain code
+        """
+        infected_by = np.bincount(self.strain.view(np.uint8),
+                                  minlength=len(self.codes) + 1)
+        for k in range(len(self.codes)):
+            self.metrics['infected_{}'.format(k)][self.n_recorded - 1] = \
+                infected_by[k + 1]
+            self.metrics['deaths_{}'.format(k)][self.n_recorded - 1] = \
+                deaths[k + 1]
+
+    def step(self):
+        """
+        This method runs one synchronous iteration, with the mortality
+        and the cycle time of every agent's strain, and returns the
+        number of deaths. The deaths of every strain code are kept in
+        self.strain_deaths for record().
+        """
+        status = self.status.reshape(-1)
+        healthy = status == HEALTHY
+
+        # mortality and recovery rolls for every infected agent,
+        # against the rates of its strain
+        dead, recovered = run_illness(status, self.days_ill.reshape(-1),
+                                      self.rng, self.mortality_of,
+                                      self.cycle_time_of, self.strain)
+        self.strain_deaths = np.bincount(self.strain[dead].view(np.uint8),
+                                         minlength=len(self.codes) + 1)
+        self.attributes.clear(dead)
+        self.immune[recovered] |= self.immunity_of[self.strain[recovered]]
+        self.strain[recovered] = 0
+
+        # healthy agents next to an infected agent may catch the virus
+        self.infect(np.flatnonzero(healthy))
+
+        self.move_all()
+        return len(dead)
+
+    def infect(self, healthy):
+        """
+        This method infects some of the given healthy agents (flat
+        cells) with a strain of one of their infected neighbors.
+        """
+        # infected neighbors of every cell, for every strain at once
+        strain = self.strain.reshape(self.height, self.width)
+        exposure = self.contacts.count(
+            strain[None] == self.codes[:, None, None])
+        exposure = exposure.reshape(len(self.codes), -1)[:, healthy]
+
+        # chance of catching each strain, one row per agent
+        chance = 1 - (1 - self.transmissibility) ** exposure.T
+        immune = (self.immune[healthy, None] >>
+                  np.arange(len(self.codes), dtype=np.uint64)) & 1
+        chance[immune.astype(bool)] = 0
+
+        # only agents with a single certain strain skip the rolls
+        possible = chance > 0
+        n_possible = possible.sum(axis=1)
+        certain = (n_possible == 1) & (chance.max(axis=1) == 1)
+        caught = np.where(certain, chance.argmax(axis=1), -1)
+        uncertain = np.flatnonzero((n_possible > 0) & ~certain)
+        if len(uncertain):
+            rolls = self.rng.random((len(uncertain), len(self.codes)))
+            with np.errstate(divide='ignore'):
+                ratio = rolls / chance[uncertain]
+            first = ratio.argmin(axis=1)
+            caught[uncertain] = np.where(
+                ratio[np.arange(len(uncertain)), first] < 1, first, -1)
+
+        new = caught >= 0
+        self.status.reshape(-1)[healthy[new]] = INFECTED
+        self.strain[healthy[new]] = self.codes[caught[new]]
+
+    def strain_grid(self):
+        """
+        This method returns the grid of strain codes: 0 where nobody is
+        infected and k + 1 where an agent has strains[k], indexed by
+        [x, y].
+        """
+        return self.strain.reshape(self.height, self.width).copy()
+
+
+if __name__ == '__main__':
+
+    width, height = 200, 200
+    cycle_time = 14
+    max_iter = 500
+    ratio_empty = 0.6
+    ratio_infected = 0.01
+    max_range = 1
+
+    # a mild strain that spreads easily and a deadly one that does not;
+    # getting over either protects against both
+    strains = [infection(0.01, cycle_time, transmissibility=0.6,
+                         immunity=(0, 1)),
+               infection(0.1, cycle_time, transmissibility=0.3,
+                         immunity=(0, 1))]
+    virus_strains = VirusStrainModel("strains_01", height, width,
+                                     strains[0].mortality, cycle_time,
+                                     ratio_empty, ratio_infected, max_iter,
+                                     max_range, strains=strains)
+
+    virus_strains.populate()
+    with FrameWriter("virus_strains_01_frames.npy", (height, width),
+                     max_iter // 10 + 1) as frames:
+        virus_strains.update(False, frames)
+    virus_strains.plot_nchanges(
+        "Population Trends: {} strains, Sparsity={}%".format(
+            len(strains), ratio_empty * 100),
+        "/virus_strains_populations.png", show=False)
@@ -0,0 +1,83 @@
+# Parameter sweeps of the infection model, e.g.
+#
+#     python virus_sweep.py --mortality 0.03 0.06 0.12 --ratio-empty 0.9 0.95 \
+#         --replicates 100 --seed 1 --out mortality_sweep.csv
+
+import argparse
+from infection_model import VirusModel
+from virus_grid import VirusGridModel
+from virus_jit import VirusJitModel
+import common_path  # noqa: F401
+from sweep import run_sweep, write_csv
+from results import ResultStore
+
+ENGINES = {'dict': VirusModel, 'grid': VirusGridModel,
+           'jit': VirusJitModel}
+
+
+def run_virus(params, seed):
+    """
+    This function runs one VirusModel simulation and returns one row
+    per iteration with the healthy and infected populations and the
+    number of deaths.
+
+    Parameters:
+    -----------
+    params : dict
+            The VirusModel arguments plus 'engine' ('dict', 'grid' or
+            'jit') and optionally 'store', a ResultStore directory
+            that receives the run
+    seed : numpy SeedSequence
+            The seed of this run
+    """
+    params = dict(params)
+    engine = ENGINES[params.pop('engine', 'dict')]
+    store = params.pop('store', None)
+    model = engine("sweep", seed=seed, **params)
+
+    model.populate()
+    model.update(False)
+    if store is not None:
+        ResultStore(store).save(model)
+
+    deaths = [0] + list(model.deaths_per_iter)
+    return [{'iteration': i,
+             'healthy': model.healthy_population[i],
+             'infected': model.infected_population[i],
+             'deaths': deaths[i]}
+            for i in range(len(model.healthy_population))]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="Sweep VirusModel parameters over a process pool")
+    parser.add_argument('--height', type=int, nargs='+', default=[50])
+    parser.add_argument('--width', type=int, nargs='+', default=[50])
+    parser.add_argument('--mortality', type=float, nargs='+', default=[0.03])
+    parser.add_argument('--cycle-time', type=int, nargs='+', default=[14])
+    parser.add_argument('--ratio-empty', type=float, nargs='+', default=[0.9])
+    parser.add_argument('--ratio-infected', type=float, nargs='+',
+                        default=[0.01])
+    parser.add_argument('--num-iter', type=int, nargs='+', default=[500])
+    parser.add_argument('--max-range', type=int, nargs='+', default=[1])
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='dict')
+    parser.add_argument('--replicates', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='virus_sweep.csv')
+    parser.add_argument('--store', default=None,
+                        help="also save every run to this ResultStore")
+    args = parser.parse_args()
+
+    grid = {'height': args.height,
+            'width': args.width,
+            'mortality': args.mortality,
+            'cycle_time': args.cycle_time,
+            'ratio_empty': args.ratio_empty,
+            'ratio_infected': args.ratio_infected,
+            'num_iter': args.num_iter,
+            'max_range': args.max_range}
+    rows = run_sweep(run_virus, grid, args.replicates, args.seed,
+                     args.workers, engine=args.engine, store=args.store)
+    write_csv(rows, args.out)
@@ -0,0 +1,460 @@
+# A multi-process version of the vectorized infection model. The grid is
+# split into strips of rows and every strip is stepped by its own process.
+# The grids live in shared memory: a process writes only its own strip and
+# reads the halo rows of its neighbors after a barrier, and agents that
+# move across a strip edge are handed to the process that owns the target.
+
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import threading
+import numpy as np
+from infection_model import EMPTY, HEALTHY, INFECTED
+from virus_grid import VirusGridModel
+import common_path  # noqa: F401
+from neighbors import Neighborhood
+
+# columns of the per-strip counters
+N_INFECTED, N_AGENTS, N_MOVERS, N_OUT, N_HEALTHY, N_SICK, N_DEATHS = range(7)
+N_COUNTERS = 7
+
+
+def shared_array(shape, dtype, name=None):
+    """
+    This function returns a numpy array backed by shared memory, and the
+    SharedMemory block that has to be kept open while the array is used.
+    With a name it attaches to an existing block.
+    """
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    if name is None:
+        block = shared_memory.SharedMemory(create=True, size=size)
+    else:
+        block = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf), block
+
+
+class Tile(object):
+    """
+    One strip of rows of a VirusTiledModel grid, stepped by one process.
+
+    Every random draw of an iteration is made in the global flat order
+    of the agents, as in VirusGridModel: each strip counts its agents,
+    and after a barrier it skips the PCG64 stream past the draws of the
+    strips before it. The results depend neither on the number of
+    strips nor on the timing of the processes.
+
+    Every barrier wait gives up after spec['timeout'] seconds, which
+    breaks the barrier for all processes: they raise
+    BrokenBarrierError instead of waiting for a process that died.
+    """
+
+    def __init__(self, spec, rank, barrier):
+        super(Tile, self).__init__()
+        self.rank = rank
+        self.barrier = barrier
+        self.timeout = spec['timeout']
+        self.mortality = spec['mortality']
+        self.cycle_time = spec['cycle_time']
+        self.shape = spec['shape']
+        self.x0, self.x1 = spec['rows'][rank]
+        self.n_tiles = len(spec['rows'])
+
+        self.blocks = []
+        arrays = {}
+        for name, (shape, dtype, block_name) in spec['arrays'].items():
+            arrays[name], block = shared_array(shape, dtype, block_name)
+            self.blocks.append(block)
+        self.status = arrays['status']
+        self.days_ill = arrays['days_ill']
+        self.counts = arrays['counts']
+        self.out_target = arrays['out_target']
+        self.out_priority = arrays['out_priority']
+        self.out_source = arrays['out_source']
+
+        self.contacts = Neighborhood(self.shape, 1, spec['neighborhood'],
+                                     spec['boundary'])
+        self.reach = Neighborhood(self.shape, spec['max_range'],
+                                  spec['neighborhood'], spec['boundary'],
+                                  include_center=True)
+        self.bitgen = np.random.PCG64()
+        self.bitgen.state = spec['rng_state']
+
+    def close(self):
+        """
+        This method detaches the shared memory.
+        """
+        self.status = self.days_ill = self.counts = None
+        self.out_target = self.out_priority = self.out_source = None
+        for block in self.blocks:
+            block.close()
+        self.blocks = []
+
+    def wait(self):
+        """
+        This method waits at the barrier for the other processes.
+        """
+        self.barrier.wait(self.timeout)
+
+    def draw(self, column, n):
+        """
+        This method returns this strip's n uniform draws out of the
+        draws of all strips, counted in the given counter column.
+        """
+        self.counts[self.rank, column] = n
+        self.wait()
+        counts = self.counts[:, column]
+        bitgen = np.random.PCG64()
+        bitgen.state = self.bitgen.state
+        bitgen.advance(int(counts[:self.rank].sum()))
+        self.bitgen.advance(int(counts.sum()))
+        return np.random.Generator(bitgen).random(n)
+
+    def step(self):
+        """
+        This method runs one iteration of VirusGridModel.update() on the
+        strip and leaves its populations in the counters.
+        """
+        width = self.shape[1]
+        status = self.status.reshape(-1)[self.x0 * width:self.x1 * width]
+        days_ill = self.days_ill.reshape(-1)[self.x0 * width:
+                                             self.x1 * width]
+        healthy = status == HEALTHY
+
+        # mortality and recovery rolls for every infected agent
+        infected = np.flatnonzero(status == INFECTED)
+        dead = self.draw(N_INFECTED, len(infected)) <= self.mortality
+        status[infected[dead]] = EMPTY
+        days_ill[infected[dead]] = 0
+        survivors = infected[~dead]
+        recovering = days_ill[survivors] > self.cycle_time
+        status[survivors[recovering]] = HEALTHY
+        days_ill[survivors[recovering]] = 0
+        days_ill[survivors[~recovering]] += 1
+        self.wait()
+
+        # healthy agents next to an infected agent catch the virus; all
+        # strips read their halos before anyone writes
+        exposed = self.exposed()
+        self.wait()
+        status[healthy & exposed] = INFECTED
+        self.wait()
+
+        # moves out of the strip are applied by the other strips
+        self.move_all()
+        self.wait()
+
+        self.counts[self.rank, N_HEALTHY] = (status == HEALTHY).sum()
+        self.counts[self.rank, N_SICK] = (status == INFECTED).sum()
+        self.counts[self.rank, N_DEATHS] = dead.sum()
+        self.wait()
+
+    def exposed(self):
+        """
+        This method returns, for every cell of the strip, whether it has
+        an infected neighbor, reading one halo row on either side.
+        """
+        height = self.shape[0]
+        if self.contacts.boundary == 'torus':
+            lo = self.x0 - 1
+            window = self.status[np.arange(lo, self.x1 + 1) % height]
+        else:
+            lo = max(self.x0 - 1, 0)
+            window = self.status[lo:min(self.x1 + 1, height)]
+        counts = self.contacts.count(window == INFECTED)
+        return (counts[self.x0 - lo:self.x1 - lo] > 0).reshape(-1)
+
+    def move_all(self):
+        """
+        This method moves the agents of the strip like
+        VirusGridModel.move_all(). Moves into another strip are posted to
+        this strip's outbox and resolved by the owner of the target.
+        """
+        width = self.shape[1]
+        f0, f1 = self.x0 * width, self.x1 * width
+        status = self.status.reshape(-1)
+        days_ill = self.days_ill.reshape(-1)
+
+        agents = np.flatnonzero(status[f0:f1]) + f0
+        picks = self.draw(N_AGENTS, len(agents))
+
+        # candidate spots for every agent, one column per offset
+        xs, ys = np.divmod(agents, width)
+        offsets = self.reach.offsets
+        spots = np.zeros((len(agents), len(offsets)), dtype=np.int64)
+        free = np.zeros(spots.shape, dtype=bool)
+        for k, (dx, dy) in enumerate(offsets):
+            nx, ny, inside = self.reach.shift(xs, ys, dx, dy)
+            spots[:, k] = np.where(inside, nx * width + ny, 0)
+            free[:, k] = inside
+        free &= status[spots] == EMPTY
+
+        # pick one of the free spots uniformly at random
+        n_free = free.sum(axis=1)
+        pick = (picks * n_free).astype(np.int64)
+        chosen = free & (np.cumsum(free, axis=1) - 1 == pick[:, None])
+        movers = agents[n_free > 0]
+        targets = spots[chosen]
+        priority = self.draw(N_MOVERS, len(movers))
+
+        # hand the moves into other strips to their owners
+        own = (targets >= f0) & (targets < f1)
+        n_out = len(targets) - own.sum()
+        self.out_target[self.rank, :n_out] = targets[~own]
+        self.out_priority[self.rank, :n_out] = priority[~own]
+        self.out_source[self.rank, :n_out] = movers[~own]
+        self.counts[self.rank, N_OUT] = n_out
+        self.wait()
+
+        claims = [(targets[own], priority[own], movers[own])]
+        for rank in {(self.rank - 1) % self.n_tiles,
+                     (self.rank + 1) % self.n_tiles} - {self.rank}:
+            n = self.counts[rank, N_OUT]
+            inbox = (self.out_target[rank, :n] >= f0) & \
+                (self.out_target[rank, :n] < f1)
+            claims.append((self.out_target[rank, :n][inbox],
+                           self.out_priority[rank, :n][inbox],
+                           self.out_source[rank, :n][inbox]))
+        targets, priority, movers = (np.concatenate(column)
+                                     for column in zip(*claims))
+
+        # when two agents want the same spot the higher priority wins,
+        # and on a tie the one first in flat order
+        order = np.lexsort((movers, -priority, targets))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = targets[order][1:] != targets[order][:-1]
+        movers = movers[order[first]]
+        targets = targets[order[first]]
+
+        status[targets] = status[movers]
+        days_ill[targets] = days_ill[movers]
+        status[movers] = EMPTY
+        days_ill[movers] = 0
+
+
+def paused(spec, i):
+    """
+    This function tells whether the workers wait after iteration i while
+    the main process reads the grid, for a snapshot or a checkpoint.
+    """
+    every = spec['checkpoint_every']
+    return i % spec['snapshot_every'] == 0 or \
+        (every > 0 and (i + 1) % every == 0)
+
+
+def run_tile(spec, rank, barrier):
+    """
+    This function steps one strip in a worker process until the run
+    ends, in lockstep with VirusTiledModel.update().
+    """
+    tile = Tile(spec, rank, barrier)
+    try:
+        for i in range(spec['start'], spec['num_iter']):
+            tile.step()
+            if paused(spec, i):
+                # wait while the main process reads the grid
+                tile.wait()
+            if tile.counts[:, N_SICK].sum() == 0:
+                break
+    except threading.BrokenBarrierError:
+        # another process failed or timed out, and reports it
+        pass
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        tile.close()
+
+
+class VirusTiledModel(VirusGridModel):
+    """A model of virus spreading, split over several processes.
+
+    The grid is cut into workers strips of rows and update() steps every
+    strip in its own process, the main process included. The strips
+    exchange halo rows and migrating agents through shared memory and
+    draw their random numbers from one PCG64 stream in the global order
+    of the agents, so a seeded run gives the same results as
+    VirusGridModel whatever the number of workers. Every strip must be
+    at least max_range rows tall; workers is lowered to fit.
+
+    A process that waits more than timeout seconds for the others gives
+    up, and so do all the others; update() then raises RuntimeError
+    instead of hanging on a worker that died.
+    """
+
+    ENGINE_VERSION = 1
+
+    def __init__(self, ID, height, width, mortality,
+                 cycle_time, ratio_empty, ratio_infected,
+                 num_iter, max_range=1, seed=None, neighborhood='moore',
+                 boundary='bounded', workers=None, timeout=600):
+        super(VirusTiledModel, self).__init__(ID, height, width, mortality,
+                                              cycle_time, ratio_empty,
+                                              ratio_infected, num_iter,
+                                              max_range, seed,
+                                              neighborhood=neighborhood,
+                                              boundary=boundary)
+        self.workers = workers
+        self.timeout = timeout
+
+    def strips(self):
+        """
+        This method returns the (first, last + 1) rows of every strip.
+        """
+        workers = self.workers or os.cpu_count() or 1
+        workers = max(min(workers, self.height // max(self.max_range, 1)), 1)
+        bounds = np.linspace(0, self.height, workers + 1).astype(int)
+        return [(int(x0), int(x1)) for x0, x1 in zip(bounds[:-1], bounds[1:])]
+
+    def update(self, plot, frames=None, snapshot_every=10, checkpoint=None,
+               checkpoint_every=100):
+        """
+        This method executes a synchronous update for the model over
+        several processes
+
+        Parameters:
+        -----------
+        plot : boolean
+                Whether to save a PNG of the grid every snapshot_every
+                timesteps
+        frames : FrameWriter or None
+                A frames.FrameWriter that receives the status grid every
+                snapshot_every timesteps
+        snapshot_every : integer
+                The number of timesteps between snapshots
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every timesteps, see save_checkpoint()
+        checkpoint_every : integer
+                The number of timesteps between checkpoints
+        """
+        if list(self.attributes.columns) != ['days_ill']:
+            raise ValueError("the strips only exchange days_ill, other agent "
+                             "attributes need VirusGridModel")
+        rows = self.strips()
+        # a strip only posts moves into the strips next to it
+        tallest = max(x1 - x0 for x0, x1 in rows)
+        capacity = min(tallest, 2 * self.max_range) * self.width
+        layout = {'status': (self.status.shape, np.int8),
+                  'days_ill': (self.days_ill.shape, np.int32),
+                  'counts': ((len(rows), N_COUNTERS), np.int64),
+                  'out_target': ((len(rows), capacity), np.int64),
+                  'out_priority': ((len(rows), capacity), np.float64),
+                  'out_source': ((len(rows), capacity), np.int64)}
+        blocks = []
+        arrays = {}
+        for name, (shape, dtype) in layout.items():
+            arrays[name], block = shared_array(shape, dtype)
+            blocks.append(block)
+        arrays['status'][:] = self.status
+        arrays['days_ill'][:] = self.days_ill
+        arrays['counts'][:] = 0
+
+        spec = {'shape': (self.height, self.width),
+                'rows': rows,
+                'mortality': self.mortality,
+                'cycle_time': self.cycle_time,
+                'max_range': self.max_range,
+                'neighborhood': self.neighborhood,
+                'boundary': self.boundary,
+                'start': self.iteration,
+                'num_iter': self.num_iter,
+                'snapshot_every': snapshot_every,
+                'checkpoint_every': checkpoint_every
+                if checkpoint is not None else 0,
+                'rng_state': self.rng.bit_generator.state,
+                'timeout': self.timeout,
+                'arrays': {name: (shape, dtype, block.name)
+                           for (name, (shape, dtype)), block
+                           in zip(layout.items(), blocks)}}
+
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(len(rows))
+        workers = [context.Process(target=run_tile,
+                                   args=(spec, rank, barrier))
+                   for rank in range(1, len(rows))]
+        for worker in workers:
+            worker.start()
+        tile = Tile(spec, 0, barrier)
+
+        if self.iteration == 0:
+            self.record((self.status == HEALTHY).sum(),
+                        (self.status == INFECTED).sum(), 0)
+        broken = False
+        try:
+            for i in range(self.iteration, self.num_iter):
+                tile.step()
+                if any(worker.exitcode for worker in workers):
+                    barrier.abort()
+                    broken = True
+                    break
+                totals = tile.counts.sum(axis=0)
+                self.record(totals[N_HEALTHY], totals[N_SICK],
+                            totals[N_DEATHS])
+
+                pause = paused(spec, i)
+                if pause:
+                    self.status[:] = tile.status
+                    self.days_ill[:] = tile.days_ill
+                    self.rng.bit_generator.state = tile.bitgen.state
+
+                # if you want to record the changes
+                if i % snapshot_every == 0:
+                    self.snapshot(i, plot, frames)
+
+                # simulation stops if there are no more infected people
+                stop = totals[N_SICK] == 0
+                if not stop:
+                    self.end_iteration(checkpoint, checkpoint_every)
+                if pause:
+                    tile.wait()
+                if stop:
+                    break
+        except threading.BrokenBarrierError:
+            broken = True
+        except BaseException:
+            barrier.abort()
+            raise
+        finally:
+            for worker in workers:
+                worker.join(self.timeout)
+                if worker.exitcode is None:
+                    worker.terminate()
+                    worker.join()
+            self.status[:] = tile.status
+            self.days_ill[:] = tile.days_ill
+            self.rng.bit_generator.state = tile.bitgen.state
+            tile.close()
+            arrays = None
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        failed = [worker.exitcode for worker in workers if worker.exitcode]
+        if broken or failed:
+            raise RuntimeError("the strips stopped at iteration {}: worker "
+                               "exit codes {}".format(
+                                   self.iteration,
+                                   [worker.exitcode for worker in workers]))
+        self.iteration = 0
+
+
+if __name__ == '__main__':
+
+    width, height = 10000, 10000
+    death_rate = 0.03
+    cycle_time = 14
+    max_iter = 500
+    ratio_empty = 0.9
+    ratio_infected = 0.01
+    max_range = 1
+
+    virus_tiles = VirusTiledModel("tiles_01", height, width, death_rate,
+                                  cycle_time, ratio_empty, ratio_infected,
+                                  max_iter, max_range)
+
+    virus_tiles.populate()
+    virus_tiles.update(False)
+    virus_tiles.plot_nchanges(
+        "Population Trends: Death Rate={}%, Sparsity={}%".format(
+            death_rate * 100, ratio_empty * 100),
+        "/virus_tiles_populations.png", show=False)
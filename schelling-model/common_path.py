@@ -0,0 +1,12 @@
+# The modules shared by both models (empty_pool, neighbors, results, cache,
+# sweep, jit and instrumentation) live in ../common. Importing this module
+# puts that directory on sys.path, so they import by their plain names from
+# the scripts, notebooks and benchmarks of either model.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMON = os.path.join(ROOT, 'common')
+if COMMON not in sys.path:
+    sys.path.insert(0, COMMON)
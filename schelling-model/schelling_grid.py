@@ -0,0 +1,329 @@
+# An array-backed version of the Schelling model. Race labels live in an
+# integer NumPy grid and the neighbor counts of every cell are computed
+# with shifted-array sums instead of one dict lookup per neighbor.
+
+import heapq
+import numpy as np
+from schelling_model import Schelling
+import common_path  # noqa: F401
+from empty_pool import EmptyPool
+from jit import compact_log
+
+
+class SchellingGrid(Schelling):
+    """A Schelling Segregation Model on an integer NumPy grid.
+
+    self.races holds 0 for an empty house and 1..num_races otherwise.
+    self.same[r - 1] counts the neighbors of race r around every cell and
+    self.total counts all neighbors, so checking an agent is two array
+    lookups, and the counts around the old and new houses of an agent
+    are patched after each move.
+
+    The agents move in the order of Schelling, with its random draws,
+    so a seeded run gives the same results as Schelling: self.log holds
+    the agents in the insertion order of Schelling's dict (see jit.py)
+    and self.pool the empty houses in the order of its EmptyPool. At the
+    start of an iteration every cell is checked at once and only the
+    unsatisfied agents are queued, by their place in the log. A move
+    queues the later agents around the two houses it changed, and every
+    queued agent is checked again against the counts when its turn
+    comes, like the incremental mode of Schelling.
+    """
+
+    ENGINE_VERSION = 2
+
+    def __init__(self, width, height, ratio_empty,
+                 tolerance, num_iter, num_races=2, seed=None,
+                 neighborhood='moore', boundary='bounded'):
+        super(SchellingGrid, self).__init__(width, height, ratio_empty,
+                                            tolerance, num_iter, num_races,
+                                            seed, neighborhood=neighborhood,
+                                            boundary=boundary)
+        n_houses = width * height
+        self.races = np.zeros((width, height), dtype=np.int8)
+        self.same = np.zeros((num_races, width, height), dtype=np.int16)
+        self.total = np.zeros((width, height), dtype=np.int16)
+        self.agent_pos = np.full(n_houses, -1, dtype=np.int64)
+        self.pool_pos = np.full(n_houses, -1, dtype=np.int64)
+        self.set_agents(np.zeros(0, dtype=np.int64),
+                        np.zeros(0, dtype=np.int64))
+
+    @property
+    def agents(self):
+        """agents as a {(x, y): race} dict, like Schelling"""
+        cells = self.log[:self.n_agents]
+        xs, ys = np.divmod(cells, self.height)
+        return dict(zip(zip(xs.tolist(), ys.tolist()),
+                        self.races[xs, ys].tolist()))
+
+    @agents.setter
+    def agents(self, agents):
+        if agents:
+            raise AttributeError("SchellingGrid keeps agents in self.races")
+
+    @property
+    def empty_houses(self):
+        """the empty houses as an EmptyPool, like Schelling"""
+        xs, ys = np.divmod(self.pool[:self.n_pool], self.height)
+        return EmptyPool(zip(xs.tolist(), ys.tolist()))
+
+    @empty_houses.setter
+    def empty_houses(self, houses):
+        if houses:
+            raise AttributeError("SchellingGrid keeps houses in self.pool")
+
+    def set_agents(self, agents, empty):
+        """
+        This method fills the agent log and the pool of empty houses
+        with the given flat cells, in order, like
+        SchellingJit.set_agents().
+        """
+        self.log = np.zeros(2 * len(agents) + 1, dtype=np.int64)
+        self.log[:len(agents)] = agents
+        self.agent_pos[:] = -1
+        self.agent_pos[agents] = np.arange(len(agents))
+        self.n_agents = len(agents)
+
+        self.pool = np.zeros(self.width * self.height, dtype=np.int64)
+        self.pool[:len(empty)] = empty
+        self.pool_pos[:] = -1
+        self.pool_pos[empty] = np.arange(len(empty))
+        self.n_pool = len(empty)
+
+    def populate(self):
+        """
+        This method initializes the population at the start of
+        the simulation. Agents are randomly distributed on the
+        grid.
+        """
+        n_houses = self.width * self.height
+        houses = self.rng.permutation(n_houses)
+
+        # how many are empty?
+        self.n_empty = int(self.ratio_empty * n_houses)
+
+        # where do members of each race live? Schelling adds them to
+        # its dict race by race
+        inhabited = houses[self.n_empty:]
+        by_race = [inhabited[i::self.num_races]
+                   for i in range(self.num_races)]
+        races = self.races.reshape(-1)
+        races[:] = 0
+        for i, cells in enumerate(by_race):
+            races[cells] = i + 1
+        self.set_agents(np.concatenate(by_race), houses[:self.n_empty])
+
+        self.count_all()
+
+    def count_all(self):
+        """
+        This method recomputes the same-race and total neighbor counts
+        of every cell.
+        """
+        for i in range(self.num_races):
+            self.same[i] = self.neighbors.count(self.races == i + 1)
+        self.total[:] = self.neighbors.count(self.races > 0)
+
+    def unsatisfied(self):
+        """
+        This method returns a boolean grid that is True where an agent
+        is unsatisfied based on the @tolerance parameter.
+        """
+        occupied = self.races > 0
+        similar = np.take_along_axis(
+            self.same, np.maximum(self.races - 1, 0)[None].astype(np.intp),
+            axis=0)[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unhappy = (similar / self.total) < self.tolerance
+        return occupied & (self.total > 0) & unhappy
+
+    def is_unsatisfied(self, x, y):
+        """
+        The method checks if an agent is satisfied based on
+        the @tolerance parameter.
+
+        Parameters:
+        -----------
+        x : integer
+                The x-coordinate of a particular agent
+        y : integer
+                The y-coordinate of a particular agent
+        """
+        race = self.races[x, y]
+        total = self.total[x, y]
+        if total == 0:
+            # we cannot be unhappy if we have no neighbors
+            return False
+        return (self.same[race - 1, x, y] / total) < self.tolerance
+
+    def update(self, checkpoint=None, checkpoint_every=100):
+        """
+        This method executes each iteration for num_iter. A run
+        restored by resume() carries on from its iteration.
+
+        Parameters:
+        -----------
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every iterations, see save_checkpoint()
+        checkpoint_every : integer
+                The number of iterations between checkpoints
+        """
+
+        for i in range(self.iteration, self.num_iter):
+            n_changes = self.step()
+            self.record(n_changes)
+            if n_changes == 0:
+                # n_changes is zero if everyone is happy
+                break
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def step(self):
+        """
+        This method runs one iteration and returns the number of moves.
+        """
+        # the agents of this iteration are the first n_agents entries of
+        # the log; agents that move get a new entry past them
+        n_agents = self.n_agents
+        # enough move rolls for every agent, drawn like Schelling
+        move_rolls = self.rng.random(n_agents).tolist()
+
+        # the places in the log of the agents to check, in order
+        unhappy = self.unsatisfied().reshape(-1)[self.log[:n_agents]]
+        queue = np.flatnonzero(unhappy).tolist()
+        n_changes = 0
+        last = -1
+        while queue:
+            j = heapq.heappop(queue)
+            if j <= last:
+                # queued more than once
+                continue
+            last = j
+            x, y = divmod(int(self.log[j]), self.height)
+            # an earlier move this iteration may have changed the
+            # neighborhood, so check again before moving
+            if not self.is_unsatisfied(x, y) or self.n_pool == 0:
+                continue
+            new = self.move_to_empty((x, y), move_rolls[n_changes])
+            n_changes += 1
+
+            # the agents later in this iteration around the two houses
+            # may have changed their mind
+            around = np.concatenate(
+                [self.neighbors.flat_cells(x * self.height + y),
+                 self.neighbors.flat_cells(new)])
+            later = self.agent_pos[around]
+            for k in later[(later > j) & (later < n_agents)].tolist():
+                heapq.heappush(queue, k)
+
+        self.n_agents = compact_log(self.log, self.n_agents, self.agent_pos)
+        return n_changes
+
+    def status_grid(self):
+        """
+        This method returns the grid as an array of races, 0 for an
+        empty house, indexed by [x, y].
+        """
+        return self.races.astype(np.uint8)
+
+    def load_state_arrays(self, state):
+        """
+        This method restores the grid returned by state_arrays(). The
+        agents and empty houses are ordered like the ones Schelling
+        rebuilds.
+        """
+        self.races[:] = state['races']
+        races = self.races.reshape(-1)
+        self.set_agents(np.flatnonzero(races), np.flatnonzero(races == 0))
+        self.count_all()
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint: the grid and the live part of the agent log and of
+        the pool, in order.
+        """
+        return {'races': self.races.copy(),
+                'agents': self.log[:self.n_agents].copy(),
+                'empty': self.pool[:self.n_pool].copy()}
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method restores the arrays returned by checkpoint_arrays().
+        """
+        self.races[:] = arrays['races']
+        self.set_agents(arrays['agents'], arrays['empty'])
+        self.count_all()
+
+    def move_to_empty(self, key, roll=None):
+        """
+        This method moves the agent to a random empty house and returns
+        the flat cell of the new house.
+
+        Parameters:
+        -----------
+        key : tuple
+                The (x, y) location of the agent
+        roll : float
+                A uniform draw in [0, 1) that picks the new house. Drawn
+                from self.rng when not given.
+        """
+        x, y = key
+        cell = x * self.height + y
+        race = self.races[x, y]
+        if roll is None:
+            roll = self.rng.random()
+        # take a random empty house, like EmptyPool.choice()
+        new = int(self.pool[min(int(roll * self.n_pool), self.n_pool - 1)])
+        new_x, new_y = divmod(new, self.height)
+
+        # the agent gets a new entry at the end of the log
+        self.log[self.n_agents] = new
+        self.agent_pos[new] = self.n_agents
+        self.n_agents += 1
+        self.agent_pos[cell] = -1
+
+        # EmptyPool.remove(new), then EmptyPool.add(cell)
+        i = self.pool_pos[new]
+        self.n_pool -= 1
+        last = self.pool[self.n_pool]
+        self.pool[i] = last
+        self.pool_pos[last] = i
+        self.pool_pos[new] = -1
+        self.pool[self.n_pool] = cell
+        self.pool_pos[cell] = self.n_pool
+        self.n_pool += 1
+
+        self.races[x, y] = 0
+        self.shift_counts(x, y, race, -1)
+        self.races[new_x, new_y] = race
+        self.shift_counts(new_x, new_y, race, 1)
+        return new
+
+    def shift_counts(self, x, y, race, step):
+        """
+        This method adds step to the neighbor counts around (x, y) after
+        an agent of the given race arrives (step=1) or leaves (step=-1).
+        """
+        neighbors = self.neighbors.flat_cells(x * self.height + y)
+        self.same[race - 1].reshape(-1)[neighbors] += step
+        self.total.reshape(-1)[neighbors] += step
+
+
+if __name__ == "__main__":
+
+    w = 500
+    h = 500
+    empty_ratio = 0.3
+    tol = 0.3
+    max_iter = 500
+    n_race = 2
+
+    schelling_grid = SchellingGrid(w, h, empty_ratio, tol, max_iter, n_race)
+    schelling_grid.populate()
+    schelling_grid.update()
+    schelling_grid.plot_nchanges(
+        "Tolerance = {}%".format(
+            tol * 100),
+        '../figures/schelling_grid_changes.png')
@@ -0,0 +1,241 @@
+# A compiled version of the Schelling model. The agents live in flat
+# arrays and each iteration is one call of a Numba kernel that visits them
+# one at a time, exactly like Schelling.update(), so a seeded run gives
+# the same results as Schelling. Without numba the kernel runs as plain
+# Python; see jit.py.
+
+import numpy as np
+from schelling_model import Schelling
+import common_path  # noqa: F401
+from empty_pool import EmptyPool
+from jit import njit, append_log, compact_log
+
+
+@njit(cache=True)
+def schelling_step(races, agents, n_agents, agent_pos, pool, n_pool,
+                   pool_pos, indptr, indices, tolerance, move_rolls):
+    """
+    This function runs one iteration of Schelling.update() over the flat
+    arrays and returns the number of moves and the new length of the
+    agent log. pool and pool_pos work like the cells and index of an
+    EmptyPool.
+    """
+    n_changes = 0
+    n = n_agents
+
+    for j in range(n_agents):
+        cell = agents[j]
+        race = races[cell]
+        num_similar = 0
+        num_total = 0
+        for k in range(indptr[cell], indptr[cell + 1]):
+            neighbor_race = races[indices[k]]
+            if neighbor_race != 0:
+                num_total += 1
+                if neighbor_race == race:
+                    num_similar += 1
+
+        # we cannot be unhappy if we have no neighbors
+        if num_total == 0 or num_similar / num_total >= tolerance:
+            continue
+        if n_pool == 0:
+            continue
+
+        # take a random empty house, like EmptyPool.choice()
+        roll = move_rolls[n_changes]
+        new = pool[min(int(roll * n_pool), n_pool - 1)]
+        races[new] = race
+        n = append_log(agents, n, agent_pos, new)
+        races[cell] = 0
+        agent_pos[cell] = -1
+
+        # EmptyPool.remove(new), then EmptyPool.add(cell)
+        i = pool_pos[new]
+        n_pool -= 1
+        last = pool[n_pool]
+        if i < n_pool:
+            pool[i] = last
+            pool_pos[last] = i
+        pool_pos[new] = -1
+        pool[n_pool] = cell
+        pool_pos[cell] = n_pool
+        n_pool += 1
+
+        n_changes += 1
+
+    n = compact_log(agents, n, agent_pos)
+    return n_changes, n
+
+
+class SchellingJit(Schelling):
+    """A Schelling Segregation Model, compiled with Numba.
+
+    The rules, the order in which agents are visited and the random
+    draws are those of Schelling: self.races holds the grid as a flat
+    array, self.log holds the agents in the insertion order of
+    Schelling's dict (see jit.py) and self.pool the empty houses in the
+    order of its EmptyPool. Neighborhoods come from the CSR tables of
+    neighbors.Neighborhood.
+    """
+
+    ENGINE_VERSION = 1
+
+    def __init__(self, width, height, ratio_empty,
+                 tolerance, num_iter, num_races=2, seed=None,
+                 neighborhood='moore', boundary='bounded'):
+        super(SchellingJit, self).__init__(width, height, ratio_empty,
+                                           tolerance, num_iter, num_races,
+                                           seed, neighborhood=neighborhood,
+                                           boundary=boundary)
+        n_houses = width * height
+        self.races = np.zeros(n_houses, dtype=np.int8)
+        self.agent_pos = np.full(n_houses, -1, dtype=np.int64)
+        self.pool_pos = np.full(n_houses, -1, dtype=np.int64)
+        self.set_agents(np.zeros(0, dtype=np.int64),
+                        np.zeros(0, dtype=np.int64))
+
+    @property
+    def agents(self):
+        """agents as a {(x, y): race} dict, like Schelling"""
+        cells = self.log[:self.n_agents]
+        xs, ys = np.divmod(cells, self.height)
+        return dict(zip(zip(xs.tolist(), ys.tolist()),
+                        self.races[cells].tolist()))
+
+    @agents.setter
+    def agents(self, agents):
+        if agents:
+            raise AttributeError("SchellingJit keeps agents in self.races")
+
+    @property
+    def empty_houses(self):
+        """the empty houses as an EmptyPool, like Schelling"""
+        xs, ys = np.divmod(self.pool[:self.n_pool], self.height)
+        return EmptyPool(zip(xs.tolist(), ys.tolist()))
+
+    @empty_houses.setter
+    def empty_houses(self, houses):
+        if houses:
+            raise AttributeError("SchellingJit keeps houses in self.pool")
+
+    def set_agents(self, agents, empty):
+        """
+        This method fills the agent log and the pool of empty houses
+        with the given flat cells, in order. An agent adds at most one
+        entry an iteration, so twice the population leaves room for the
+        live entries and one iteration of new ones.
+        """
+        self.log = np.zeros(2 * len(agents) + 1, dtype=np.int64)
+        self.log[:len(agents)] = agents
+        self.agent_pos[:] = -1
+        self.agent_pos[agents] = np.arange(len(agents))
+        self.n_agents = len(agents)
+
+        self.pool = np.zeros(len(self.races), dtype=np.int64)
+        self.pool[:len(empty)] = empty
+        self.pool_pos[:] = -1
+        self.pool_pos[empty] = np.arange(len(empty))
+        self.n_pool = len(empty)
+
+    def populate(self):
+        """
+        This method initializes the population at the start of
+        the simulation. Agents are randomly distributed on the
+        grid.
+        """
+        n_houses = self.width * self.height
+        houses = self.rng.permutation(n_houses)
+
+        # how many are empty?
+        self.n_empty = int(self.ratio_empty * n_houses)
+
+        # where do members of each race live? Schelling adds them to
+        # its dict race by race
+        inhabited = houses[self.n_empty:]
+        by_race = [inhabited[i::self.num_races]
+                   for i in range(self.num_races)]
+        self.races[:] = 0
+        for i, cells in enumerate(by_race):
+            self.races[cells] = i + 1
+        self.set_agents(np.concatenate(by_race), houses[:self.n_empty])
+
+    def update(self, checkpoint=None, checkpoint_every=100):
+        """
+        This method executes each iteration for num_iter. A run
+        restored by resume() carries on from its iteration.
+
+        Parameters:
+        -----------
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every iterations, see save_checkpoint()
+        checkpoint_every : integer
+                The number of iterations between checkpoints
+        """
+        indptr, indices = self.neighbors.table()
+
+        for i in range(self.iteration, self.num_iter):
+            # enough move rolls for every agent, drawn like Schelling
+            move_rolls = self.rng.random(self.n_agents)
+            n_changes, self.n_agents = schelling_step(
+                self.races, self.log, self.n_agents, self.agent_pos,
+                self.pool, self.n_pool, self.pool_pos, indptr, indices,
+                self.tolerance, move_rolls)
+            self.record(n_changes)
+            if n_changes == 0:
+                # n_changes is zero if everyone is happy
+                break
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def status_grid(self):
+        """
+        This method returns the grid as an array of races, 0 for an
+        empty house, indexed by [x, y].
+        """
+        return self.races.astype(np.uint8).reshape(self.width, self.height)
+
+    def load_state_arrays(self, state):
+        """
+        This method restores the grid returned by state_arrays(). The
+        agents and empty houses are ordered like the ones Schelling
+        rebuilds.
+        """
+        self.races[:] = state['races'].reshape(-1)
+        self.set_agents(np.flatnonzero(self.races),
+                        np.flatnonzero(self.races == 0))
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint: the flat grid and the live part of the agent log and
+        of the pool, in order.
+        """
+        return {'races': self.races.copy(),
+                'agents': self.log[:self.n_agents].copy(),
+                'empty': self.pool[:self.n_pool].copy()}
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method restores the arrays returned by checkpoint_arrays().
+        """
+        self.races[:] = arrays['races']
+        self.set_agents(arrays['agents'], arrays['empty'])
+
+
+if __name__ == "__main__":
+
+    w = 500
+    h = 500
+    empty_ratio = 0.3
+    tol = 0.3
+    max_iter = 500
+    n_race = 2
+
+    schelling_jit = SchellingJit(w, h, empty_ratio, tol, max_iter, n_race)
+    schelling_jit.populate()
+    schelling_jit.update()
+    schelling_jit.plot_nchanges(
+        "Tolerance = {}%".format(
+            tol * 100),
+        '../figures/schelling_jit_changes.png')
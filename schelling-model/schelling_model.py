@@ -4,29 +4,137 @@
 # import necessary libraries
 
 import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
 import numpy as np
 import itertools
-import random
-import copy
-from list_funcs import intersection
+import heapq
+import common_path  # noqa: F401
+from empty_pool import EmptyPool
+from neighbors import Neighborhood
+from results import save_checkpoint, load_checkpoint
+
+# white for empty houses, then one color per race
+RACE_COLORS = ListedColormap(['w', 'b', 'r', 'g', 'c', 'm', 'y', 'k'])
 
 
 class Schelling(object):
     """This is the class that describes a Schelling Segregation
-    Model."""
+    Model.
+
+    With incremental=True the model caches the neighbor counts of every
+    house (self.neighbor_counts[race] per race, self.neighbor_counts[0]
+    for the total) and patches them on each move. Only agents on the
+    dirty list are checked: agents whose neighborhood changed since they
+    were last found satisfied. They are visited in the same order as the
+    full sweep and see the same moves, so a seeded run gives the same
+    changes_per_iter either way.
+
+    neighborhood ('moore' or 'von_neumann') and boundary ('bounded' or
+    'torus') set the shape of the neighborhoods and what happens at the
+    edge of the grid; see neighbors.Neighborhood.
+
+    By default an iteration is asynchronous: agents are checked one at
+    a time, in the order of self.agents, and each one sees the moves of
+    the agents before it. With synchronous=True every agent is checked
+    against the grid as it was at the start of the iteration, then all
+    unsatisfied agents pick an empty house at once. Agents that pick the
+    same house are resolved by a seeded random priority: the highest one
+    moves and the others stay put until the next iteration. Houses left
+    by movers only become free in the next iteration. A synchronous run
+    can keep cycling where an asynchronous one settles, so num_iter
+    matters more. incremental only applies to asynchronous runs.
+    """
+
+    # bump whenever a change alters the results of a seeded run, so that
+    # cached runs are not reused
+    ENGINE_VERSION = 1
 
     def __init__(self, width, height, ratio_empty,
-                 tolerance, num_iter, num_races=2):
+                 tolerance, num_iter, num_races=2, seed=None,
+                 incremental=False, neighborhood='moore',
+                 boundary='bounded', synchronous=False):
         super(Schelling, self).__init__()
+        if incremental and synchronous:
+            raise ValueError("incremental updates are only kept for "
+                             "asynchronous runs")
         self.width = width
         self.height = height
         self.ratio_empty = ratio_empty
         self.tolerance = tolerance
         self.num_iter = num_iter
         self.num_races = num_races
-        self.empty_houses = []
+        self.neighborhood = neighborhood
+        self.boundary = boundary
+        self.neighbors = Neighborhood((width, height), 1, neighborhood,
+                                      boundary)
+        # every model owns its random stream; seed may be an integer or
+        # a numpy SeedSequence. Without a seed a run cannot be repeated,
+        # so a RunCache leaves it alone
+        self.seeded = seed is not None
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.rng = np.random.default_rng(seed)
+        self.incremental = incremental
+        self.synchronous = synchronous
+        self.empty_houses = EmptyPool()
         self.agents = {}
-        self.changes_per_iter = []
+        # the number of moves in each iteration, preallocated for
+        # num_iter iterations
+        self.metrics = {'changes': np.zeros(num_iter, dtype=np.int64)}
+        self.n_recorded = 0
+        # iterations done by the current run, so that an update() after
+        # resume() carries on from there
+        self.iteration = 0
+        # the figure reused by plot()
+        self.fig = None
+        self.ax = None
+        self.image = None
+
+        # bookkeeping for incremental updates: the order in which agents
+        # were placed (the order of self.agents) and the dirty agents
+        self.rank = {}
+        self.next_rank = 0
+        self.dirty = {}
+        self.dirty_heap = []
+
+    @property
+    def changes_per_iter(self):
+        """the number of moves in each recorded iteration"""
+        return self.metrics['changes'][:self.n_recorded]
+
+    def record(self, n_changes):
+        """
+        This method stores the number of moves of an iteration.
+        """
+        if self.n_recorded == len(self.metrics['changes']):
+            # update() was called again, make room for another run
+            self.metrics['changes'] = np.concatenate(
+                [self.metrics['changes'],
+                 np.zeros(max(self.num_iter, 1), dtype=np.int64)])
+        self.metrics['changes'][self.n_recorded] = n_changes
+        self.n_recorded += 1
+
+    def recorded_metrics(self):
+        """
+        This method returns the recorded part of every metric buffer.
+        """
+        return {name: values[:self.n_recorded]
+                for name, values in self.metrics.items()}
+
+    def params(self):
+        """
+        This method returns the parameters that define a run.
+        """
+        return {'width': self.width,
+                'height': self.height,
+                'ratio_empty': self.ratio_empty,
+                'tolerance': self.tolerance,
+                'num_iter': self.num_iter,
+                'num_races': self.num_races,
+                'neighborhood': self.neighborhood,
+                'boundary': self.boundary,
+                'synchronous': self.synchronous}
 
     def populate(self):
         """
@@ -35,34 +143,77 @@ class Schelling(object):
         grid.
         """
 
-        # initialize the grid
-        self.all_houses = list(
-            itertools.product(
-                range(
-                    self.width), range(
-                    self.height)))
-
-        # mix it up
-        random.shuffle(self.all_houses)
+        # mix up the flat house indices and look the (x, y) keys up in
+        # row-major order; product() shares the coordinate ints between
+        # the keys, which keeps the dicts small
+        n_houses = self.width * self.height
+        houses = list(itertools.product(range(self.width), range(self.height)))
+        houses = [houses[i] for i in self.rng.permutation(n_houses).tolist()]
 
         # how many are empty?
-        self.n_empty = int(self.ratio_empty * len(self.all_houses))
-        # create list of empty house locations
-        self.empty_houses = self.all_houses[:self.n_empty]
+        self.n_empty = int(self.ratio_empty * n_houses)
+        # create pool of empty house locations
+        self.empty_houses = EmptyPool(houses[:self.n_empty])
 
-        # create list of inhabited house locations
-        self.inhabited = self.all_houses[self.n_empty:]
+        # create "agents" for each race, living in every num_races-th
+        # inhabited house; keys are locations, values are race
+        for i in range(self.num_races):
+            self.agents.update(dict.fromkeys(
+                houses[self.n_empty + i::self.num_races], i + 1))
 
-        # where do members of each race live?
-        houses_by_race = [self.inhabited[i::self.num_races]
-                          for i in range(self.num_races)]
+        if self.incremental:
+            self.start_incremental()
 
-        # create "agents" for each race
-        for i in range(self.num_races):
-            # keys are locations
-            # values are race
-            self.agents = dict(list(self.agents.items()) + list(dict(zip(houses_by_race[i],
-                                                                         [i + 1] * len(houses_by_race[i]))).items()))
+    def start_incremental(self):
+        """
+        This method sets up the incremental bookkeeping for the current
+        agents: neighbor counts, placement order and a dirty list
+        holding everyone.
+        """
+        self.count_all()
+        self.rank = {}
+        self.next_rank = 0
+        self.dirty = {}
+        self.dirty_heap = []
+        for agent in self.agents:
+            self.rank[agent] = self.next_rank
+            self.next_rank += 1
+            self.mark_dirty(agent)
+
+    def count_all(self):
+        """
+        This method recomputes the cached neighbor counts of every house.
+        """
+        self.neighbor_counts = np.zeros(
+            (self.num_races + 1, self.width, self.height), dtype=np.int16)
+        xs = np.array([agent[0] for agent in self.agents], dtype=np.intp)
+        ys = np.array([agent[1] for agent in self.agents], dtype=np.intp)
+        races = np.array(list(self.agents.values()), dtype=np.intp)
+        for dx, dy in self.neighbors.offsets:
+            nx, ny, inside = self.neighbors.shift(xs, ys, dx, dy)
+            np.add.at(self.neighbor_counts,
+                      (races[inside], nx[inside], ny[inside]), 1)
+            np.add.at(self.neighbor_counts[0], (nx[inside], ny[inside]), 1)
+
+    def shift_counts(self, house, race, step):
+        """
+        This method adds step to the cached counts around house after an
+        agent of the given race moves in (step=1) or out (step=-1).
+        """
+        same = self.neighbor_counts[race]
+        total = self.neighbor_counts[0]
+        for neighbor in self.neighbors.cells(house):
+            same[neighbor] += step
+            total[neighbor] += step
+
+    def mark_dirty(self, agent):
+        """
+        This method queues an agent to be checked at its next turn.
+        """
+        rank = self.rank[agent]
+        if self.dirty.get(agent) != rank:
+            self.dirty[agent] = rank
+            heapq.heappush(self.dirty_heap, (rank, agent))
 
     def is_unsatisfied(self, x, y):
         """
@@ -82,26 +233,21 @@ class Schelling(object):
         # print("checking if unhappy")
         race = self.agents[(x, y)]
 
+        if self.incremental:
+            total = self.neighbor_counts[0, x, y]
+            if total == 0:
+                return False
+            return (self.neighbor_counts[race, x, y] / total) < self.tolerance
+
         # initialize the counts
         num_similar = 0
         num_different = 0
 
-        # get the neighbors of the agent
-        neighbors = list(
-            itertools.product(
-                range(
-                    x - 1,
-                    x + 2),
-                range(
-                    y - 1,
-                    y + 2)))
-        neighbors.remove((x, y))  # remove the current agent
-        # get inhabited neighors list
-        neighbors = intersection(neighbors, self.agents)
-
-        # update race counts
-        for neighbor in neighbors:
-            neighbor_race = self.agents[neighbor]
+        # update race counts, probing each neighbor of the agent
+        for neighbor in self.neighbors.cells((x, y)):
+            neighbor_race = self.agents.get(neighbor)
+            if neighbor_race is None:
+                continue
             if neighbor_race == race:
                 num_similar += 1
             else:
@@ -115,49 +261,309 @@ class Schelling(object):
             # we can be either happy or unhappy if we have neighbors
             return (num_similar / (num_similar + num_different)) < self.tolerance
 
-    def update(self):
+    def update(self, checkpoint=None, checkpoint_every=100):
         """
-        This method executes each iteration for num_iter
+        This method executes each iteration for num_iter, asynchronously
+        or, if the model was made with synchronous=True, synchronously. A
+        run restored by resume() carries on from its iteration.
+
+        Parameters:
+        -----------
+        checkpoint : string or None
+                A file that receives a checkpoint of the run every
+                checkpoint_every iterations, see save_checkpoint()
+        checkpoint_every : integer
+                The number of iterations between checkpoints
         """
 
-        for i in range(self.num_iter):
-            # create a copy of the old agents
-            self.old_agents = copy.deepcopy(self.agents)
-            n_changes = 0
-            for agent in self.old_agents:
-                # check if agent is unhappy
-                # I don't love this implementation... why not just pass (x,y)?
-                if self.is_unsatisfied(agent[0], agent[1]):
-                    # print("updating")
-                    self.move_to_empty(agent)
-                    n_changes += 1
-            self.changes_per_iter.append(n_changes)
+        for i in range(self.iteration, self.num_iter):
+            if self.synchronous:
+                n_changes = self.step_synchronous()
+            else:
+                n_changes = self.step()
+            self.record(n_changes)
             if n_changes == 0:
                 # n_changes is zero if everyone is happy
                 break
+            self.end_iteration(checkpoint, checkpoint_every)
+        self.iteration = 0
+
+    def end_iteration(self, checkpoint, checkpoint_every):
+        """
+        This method counts a finished iteration of a run that goes on,
+        and saves a checkpoint to the file checkpoint (if not None) every
+        checkpoint_every iterations.
+        """
+        self.iteration += 1
+        if checkpoint is not None and self.iteration % checkpoint_every == 0:
+            self.save_checkpoint(checkpoint)
+
+    def save_checkpoint(self, file_name):
+        """
+        This method saves the run so far to file_name, from where
+        resume() can carry it on. See results.save_checkpoint().
+        """
+        save_checkpoint(file_name, self)
 
-    def move_to_empty(self, key):
+    def resume(self, file_name):
+        """
+        This method restores a checkpoint saved by save_checkpoint(): the
+        agents, the empty houses, the metrics, the random stream and the
+        iteration. The next update() then carries the run on as if it had
+        never stopped. The model must be of the same class and grid size;
+        other parameters may differ, which forks a what-if run from the
+        checkpoint (give it a new self.rng to change the draws too).
+        """
+        run = load_checkpoint(file_name)
+        if run['model'] != type(self).__name__ or \
+                (run['params']['width'], run['params']['height']) != \
+                (self.width, self.height):
+            raise ValueError("{} is a checkpoint of a {} on a {}x{} grid"
+                             .format(file_name, run['model'],
+                                     run['params']['width'],
+                                     run['params']['height']))
+        self.load_metrics(run['metrics'])
+        self.load_checkpoint_arrays(run['checkpoint'])
+        self.rng.bit_generator.state = run['rng_state']
+        self.iteration = run['iteration']
+
+    def step(self):
+        """
+        This method runs one asynchronous iteration and returns the
+        number of moves.
+        """
+        # enough move rolls for every agent, drawn for the whole
+        # iteration and used up one per move
+        move_rolls = iter(self.rng.random(len(self.agents)))
+        if self.incremental:
+            return self.update_dirty(move_rolls)
+
+        # snapshot the agent locations; races are always read from the
+        # live dict
+        self.old_agents = tuple(self.agents)
+        n_changes = 0
+        for agent in self.old_agents:
+            # check if agent is unhappy
+            # I don't love this implementation... why not just pass (x,y)?
+            if self.is_unsatisfied(agent[0], agent[1]):
+                # print("updating")
+                self.move_to_empty(agent, next(move_rolls))
+                n_changes += 1
+        return n_changes
+
+    def step_synchronous(self):
+        """
+        This method runs one synchronous iteration and returns the
+        number of moves. Agents are visited in (x, y) order, and every
+        agent is checked before anyone moves.
+        """
+        unsatisfied = [agent for agent in sorted(self.agents)
+                       if self.is_unsatisfied(agent[0], agent[1])]
+
+        # everyone picks an empty house, the highest priority gets it
+        move_rolls = self.rng.random(len(unsatisfied))
+        picks = [self.empty_houses.choice(roll) for roll in move_rolls]
+        priorities = self.rng.random(len(unsatisfied))
+        winners = {}
+        for agent, new_house, priority in zip(unsatisfied, picks,
+                                              priorities):
+            if new_house not in winners or priority > winners[new_house][1]:
+                winners[new_house] = (agent, priority)
+        for new_house, (agent, priority) in winners.items():
+            self.move_agent(agent, new_house)
+        return len(winners)
+
+    def update_dirty(self, move_rolls):
+        """
+        This method runs one iteration over the dirty agents only and
+        returns the number of moves.
+
+        Agents are visited in placement order, which is the order of
+        self.agents. Agents placed during this iteration wait for the
+        next one, like in the snapshot of the full sweep, and so do
+        agents made dirty after their turn has passed.
+        """
+        horizon = self.next_rank
+        last = -1
+        deferred = []
+        n_changes = 0
+        while self.dirty_heap and self.dirty_heap[0][0] < horizon:
+            rank, agent = heapq.heappop(self.dirty_heap)
+            if self.dirty.get(agent) != rank:
+                # the agent has moved since it was queued
+                continue
+            if rank <= last:
+                deferred.append((rank, agent))
+                continue
+            last = rank
+            del self.dirty[agent]
+            if self.is_unsatisfied(agent[0], agent[1]):
+                self.move_to_empty(agent, next(move_rolls))
+                n_changes += 1
+
+        for entry in deferred:
+            heapq.heappush(self.dirty_heap, entry)
+        return n_changes
+
+    def move_to_empty(self, key, roll=None):
         """
         This method moves the agent to a new house if it is
         unsatisfied.
+
+        Parameters:
+        -----------
+        key : tuple
+                The (x, y) location of the agent
+        roll : float
+                A uniform draw in [0, 1) that picks the new house. Drawn
+                from self.rng when not given.
+        """
+        # find a new location
+        if roll is None:
+            roll = self.rng.random()
+        self.move_agent(key, self.empty_houses.choice(roll))
+
+    def move_agent(self, agent, new_house):
+        """
+        This method moves the agent to the empty house new_house.
         """
         # get the race
-        agent = key
         agent_race = self.agents[agent]
-        # find a new location
-        new_house = random.choice(self.empty_houses)
         # add new location to agents
         self.agents[new_house] = agent_race
         # delete the old agent
         del self.agents[agent]
         # remove the newly filled house from empty houses
         self.empty_houses.remove(new_house)
-        # add the old house to the empty_houses list
-        self.empty_houses.append(agent)
+        # add the old house to the empty_houses pool
+        self.empty_houses.add(agent)
+
+        if self.incremental:
+            del self.rank[agent]
+            self.rank[new_house] = self.next_rank
+            self.next_rank += 1
+            self.shift_counts(agent, agent_race, -1)
+            self.shift_counts(new_house, agent_race, 1)
+            # everyone around the old and new house may have changed
+            # their mind, and the mover has to check its new home
+            for house in (agent, new_house):
+                for neighbor in self.neighbors.cells(house):
+                    if neighbor in self.agents:
+                        self.mark_dirty(neighbor)
+            self.mark_dirty(new_house)
+
+    def status_grid(self):
+        """
+        This method returns the grid as an array of races, 0 for an
+        empty house, indexed by [x, y].
+        """
+        grid = np.zeros((self.width, self.height), dtype=np.uint8)
+        if self.agents:
+            xs, ys = np.array(list(self.agents), dtype=np.intp).T
+            grid[xs, ys] = list(self.agents.values())
+        return grid
+
+    def state_arrays(self):
+        """
+        This method returns the state of the grid as arrays.
+        """
+        return {'races': self.status_grid()}
+
+    def load_state_arrays(self, state):
+        """
+        This method rebuilds the agents from the arrays returned by
+        state_arrays().
+        """
+        races = state['races']
+        xs, ys = np.nonzero(races)
+        self.agents = dict(zip(zip(xs.tolist(), ys.tolist()),
+                               races[xs, ys].tolist()))
+        xs, ys = np.nonzero(races == 0)
+        self.empty_houses = EmptyPool(zip(xs.tolist(), ys.tolist()))
+        if self.incremental:
+            self.start_incremental()
+
+    def checkpoint_arrays(self):
+        """
+        This method returns the state of the model as arrays for a
+        checkpoint. Houses are flat x * height + y indices, kept in the
+        order of self.agents and of the empty houses, since that order
+        decides which agent gets which random draw.
+        """
+        return {'agents': self.flat_cells(self.agents),
+                'races': np.array(list(self.agents.values()), dtype=np.int8),
+                'empty': self.flat_cells(self.empty_houses)}
+
+    def load_checkpoint_arrays(self, arrays):
+        """
+        This method rebuilds the agents and the empty houses from the
+        arrays returned by checkpoint_arrays(), in their order. The
+        incremental bookkeeping starts over with every agent dirty,
+        which checks them all in the order of the full sweep.
+        """
+        self.agents = dict(zip(self.cell_keys(arrays['agents']),
+                               arrays['races'].tolist()))
+        self.empty_houses = EmptyPool(self.cell_keys(arrays['empty']))
+        if self.incremental:
+            self.start_incremental()
+
+    def flat_cells(self, houses):
+        """
+        This method returns an array of the flat indices of (x, y) houses.
+        """
+        houses = np.array(list(houses), dtype=np.int64).reshape(-1, 2)
+        return houses[:, 0] * self.height + houses[:, 1]
+
+    def cell_keys(self, flat):
+        """
+        This method returns the (x, y) keys of an array of flat indices.
+        """
+        xs, ys = np.divmod(flat, self.height)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def load_metrics(self, metrics):
+        """
+        This method puts stored metrics back into the metric buffers.
+        """
+        for name, values in metrics.items():
+            self.metrics[name] = np.zeros(max(len(values), self.num_iter, 1),
+                                          dtype=np.int64)
+            self.metrics[name][:len(values)] = values
+            self.n_recorded = len(values)
+
+    def load_result(self, run):
+        """
+        This method puts a run stored with its final state (see
+        results.save_run) back into the model: its metrics, its agents
+        and empty spots in their order, and its random stream.
+        """
+        self.load_metrics(run['metrics'])
+        self.load_checkpoint_arrays(run['checkpoint'])
+        self.rng.bit_generator.state = run['rng_state']
+
+    def figure(self):
+        """
+        This method returns the figure and axes used by plot(), creating
+        them on first use or after they were closed.
+        """
+        if self.fig is None or not plt.fignum_exists(self.fig.number):
+            self.fig, self.ax = plt.subplots()
+            self.image = None
+        return self.fig, self.ax
+
+    def close_plot(self):
+        """
+        This method closes the figure used by plot().
+        """
+        if self.fig is not None:
+            plt.close(self.fig)
+        self.fig = self.ax = self.image = None
 
     def plot(self, title, file_name):
         """
-        This method plots the population of agents on a graph.
+        This method plots the population of agents on a graph. The whole
+        grid is drawn as one image, and the figure is reused by later
+        calls.
 
         Parameters:
         -----------
@@ -166,19 +572,23 @@ class Schelling(object):
         file_name : string
                 The file name of the graph
         """
-        fig, ax = plt.subplots()
-
-        agent_colors = {1: 'b', 2: 'r', 3: 'g', 4: 'c', 5: 'm', 6: 'y', 7: 'k'}
-        for agent in self.agents:
-            ax.scatter(agent[0] + 0.5, agent[1] + 0.5,
-                       color=agent_colors[self.agents[agent]])
+        fig, ax = self.figure()
+        races = self.status_grid()
+
+        if self.image is None:
+            self.image = ax.imshow(races.T, origin='lower',
+                                   extent=(0, races.shape[0],
+                                           0, races.shape[1]),
+                                   cmap=RACE_COLORS, vmin=0,
+                                   vmax=RACE_COLORS.N - 1,
+                                   interpolation='nearest')
+            ax.set_xticks([])
+            ax.set_yticks([])
+        else:
+            self.image.set_data(races.T)
 
         ax.set_title(title, fontsize=10, fontweight='bold')
-        ax.set_xlim(0, self.width)
-        ax.set_ylim(0, self.height)
-        ax.set_xticks([])
-        ax.set_yticks([])
-        plt.savefig(file_name)
+        fig.savefig(file_name)
 
     def plot_nchanges(self, title, file_name):
         """
@@ -200,7 +610,8 @@ class Schelling(object):
         ax.set_xlabel("Iteration Number")
         ax.set_ylabel("Number of Moves Per Iteration")
         ax.set_title(title, fontsize=10, fontweight='bold')
-        plt.savefig(file_name)
+        fig.savefig(file_name)
+        plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -277,7 +688,8 @@ if __name__ == "__main__":
     max_iter = 500
     n_race = 2
 
-    schelling_dad_sim = Schelling(w, h, empty_ratio, tol, max_iter, n_race)
+    schelling_dad_sim = Schelling(w, h, empty_ratio, tol, max_iter, n_race,
+                                  incremental=True)
     schelling_dad_sim.populate()
 
     # initial plot
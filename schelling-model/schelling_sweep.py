@@ -0,0 +1,73 @@
+# Parameter sweeps of the Schelling model, e.g.
+#
+#     python schelling_sweep.py --tolerance 0.3 0.5 0.8 --num-races 2 3 \
+#         --replicates 20 --seed 1 --out tolerance_sweep.csv
+
+import argparse
+from schelling_model import Schelling
+from schelling_grid import SchellingGrid
+from schelling_jit import SchellingJit
+import common_path  # noqa: F401
+from sweep import run_sweep, write_csv
+from results import ResultStore
+
+ENGINES = {'dict': Schelling, 'grid': SchellingGrid,
+           'jit': SchellingJit}
+
+
+def run_schelling(params, seed):
+    """
+    This function runs one Schelling simulation and returns one row per
+    iteration with the number of moves.
+
+    Parameters:
+    -----------
+    params : dict
+            The Schelling arguments plus 'engine' ('dict', 'grid' or
+            'jit') and optionally 'store', a ResultStore directory
+            that receives the run
+    seed : numpy SeedSequence
+            The seed of this run
+    """
+    params = dict(params)
+    engine = ENGINES[params.pop('engine', 'dict')]
+    store = params.pop('store', None)
+    model = engine(seed=seed, **params)
+
+    model.populate()
+    model.update()
+    if store is not None:
+        ResultStore(store).save(model)
+
+    return [{'iteration': i, 'changes': changes}
+            for i, changes in enumerate(model.changes_per_iter)]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="Sweep Schelling parameters over a process pool")
+    parser.add_argument('--width', type=int, nargs='+', default=[50])
+    parser.add_argument('--height', type=int, nargs='+', default=[50])
+    parser.add_argument('--ratio-empty', type=float, nargs='+', default=[0.3])
+    parser.add_argument('--tolerance', type=float, nargs='+', default=[0.3])
+    parser.add_argument('--num-iter', type=int, nargs='+', default=[500])
+    parser.add_argument('--num-races', type=int, nargs='+', default=[2])
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='dict')
+    parser.add_argument('--replicates', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='schelling_sweep.csv')
+    parser.add_argument('--store', default=None,
+                        help="also save every run to this ResultStore")
+    args = parser.parse_args()
+
+    grid = {'width': args.width,
+            'height': args.height,
+            'ratio_empty': args.ratio_empty,
+            'tolerance': args.tolerance,
+            'num_iter': args.num_iter,
+            'num_races': args.num_races}
+    rows = run_sweep(run_schelling, grid, args.replicates, args.seed,
+                     args.workers, engine=args.engine, store=args.store)
+    write_csv(rows, args.out)
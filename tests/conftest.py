@@ -0,0 +1,9 @@
+# The model directories import their modules by plain name; put them and
+# the shared modules on the path for the tests.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('common', 'infection-model', 'schelling-model'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
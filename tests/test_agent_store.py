@@ -0,0 +1,28 @@
+import numpy as np
+from virus_grid import VirusGridModel
+
+
+def test_per_agent_max_range():
+    model = VirusGridModel("t", 40, 30, 0.0, 14, 0.7, 0.0, 1, max_range=3,
+                           seed=1)
+    model.populate()
+    ids = model.attributes.add('id', np.int64, default=-1)
+    ranges = model.attributes.add('max_range', np.int8)
+    agents = np.flatnonzero(model.status)
+    ids[agents] = np.arange(len(agents))
+    ranges[agents] = np.arange(len(agents)) % 4
+
+    for _ in range(5):
+        before = np.full(len(agents), -1)
+        before[ids[ids >= 0]] = np.flatnonzero(ids >= 0)
+        model.move_all()
+        after = np.full(len(agents), -1)
+        after[ids[ids >= 0]] = np.flatnonzero(ids >= 0)
+
+        assert (after >= 0).all()
+        x0, y0 = np.divmod(before, model.width)
+        x1, y1 = np.divmod(after, model.width)
+        moved = np.maximum(abs(x1 - x0), abs(y1 - y0))
+        assert (moved <= ranges[after]).all()
+        assert moved.max() == 3
+        assert (ranges[after] == np.arange(len(agents)) % 4).all()
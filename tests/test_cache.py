@@ -0,0 +1,47 @@
+import numpy as np
+from cache import RunCache
+from infection_model import VirusModel
+from schelling_model import Schelling
+
+
+def virus(seed=5):
+    return VirusModel("t", 25, 25, 0.05, 6, 0.5, 0.1, 15, seed=seed)
+
+
+def schelling():
+    return Schelling(20, 20, 0.3, 0.5, 10, 2, seed=5)
+
+
+def test_hit_gives_the_same_run(tmp_path):
+    cache = RunCache(str(tmp_path))
+    for build, args in ((virus, (False,)), (schelling, ())):
+        first, second = build(), build()
+        assert not cache.run(first, *args)
+        assert cache.run(second, *args)
+        for name, values in first.recorded_metrics().items():
+            assert np.array_equal(second.recorded_metrics()[name], values)
+        for name, values in first.checkpoint_arrays().items():
+            assert np.array_equal(second.checkpoint_arrays()[name], values)
+
+
+def test_unseeded_runs_are_not_cached(tmp_path):
+    cache = RunCache(str(tmp_path))
+    assert not cache.run(virus(None), False)
+    assert not cache.run(virus(None), False)
+    assert cache.size() == 0
+
+
+def test_used_models_are_not_cached(tmp_path):
+    cache = RunCache(str(tmp_path))
+    populated = virus()
+    populated.populate()
+    expected = virus()
+    expected.populate()
+    expected.update(False)
+
+    assert not cache.run(populated, False)
+    assert cache.size() == 0
+    assert np.array_equal(populated.recorded_metrics()['infected'],
+                          expected.recorded_metrics()['infected'])
+    assert not cache.run(virus(), False)
+    assert cache.size() > 0
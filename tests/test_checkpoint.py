@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from infection_model import VirusModel
+from virus_grid import VirusGridModel
+from virus_jit import VirusJitModel
+from virus_events import VirusEventModel
+from virus_strains import VirusStrainModel
+from virus_tiles import VirusTiledModel
+from schelling_model import Schelling
+from schelling_grid import SchellingGrid
+from schelling_jit import SchellingJit
+
+
+def virus(cls, **kwargs):
+    return lambda: cls("t", 30, 30, 0.01, 40, 0.5, 0.05, 40, seed=6,
+                       **kwargs)
+
+
+def schelling(cls, **kwargs):
+    return lambda: cls(30, 30, 0.3, 0.7, 40, 2, seed=6, **kwargs)
+
+
+MODELS = {
+    'dict': virus(VirusModel),
+    'dict-frontier': virus(VirusModel, frontier=True),
+    'dict-synchronous': virus(VirusModel, synchronous=True),
+    'grid': virus(VirusGridModel, boundary='torus'),
+    'jit': virus(VirusJitModel),
+    'events': virus(VirusEventModel),
+    'strains': virus(VirusStrainModel),
+    'tiles': virus(VirusTiledModel, workers=2),
+    'schelling': schelling(Schelling),
+    'schelling-incremental': schelling(Schelling, incremental=True),
+    'schelling-synchronous': schelling(Schelling, synchronous=True),
+    'schelling-grid': schelling(SchellingGrid),
+    'schelling-jit': schelling(SchellingJit),
+}
+
+
+def run(model, **kwargs):
+    if isinstance(model, VirusModel):
+        model.update(False, **kwargs)
+    else:
+        model.update(**kwargs)
+
+
+@pytest.mark.parametrize('name', sorted(MODELS))
+def test_resume_is_bit_identical(name, tmp_path):
+    make = MODELS[name]
+    checkpoint = str(tmp_path / "run.ckpt")
+
+    model = make()
+    model.populate()
+    run(model, checkpoint=checkpoint, checkpoint_every=9)
+    assert model.n_recorded > 28
+
+    resumed = make()
+    resumed.resume(checkpoint)
+    assert resumed.iteration > 0
+    run(resumed)
+
+    assert model.recorded_metrics().keys() == \
+        resumed.recorded_metrics().keys()
+    for metric, values in model.recorded_metrics().items():
+        assert values.tobytes() == \
+            resumed.recorded_metrics()[metric].tobytes()
+    assert model.status_grid().tobytes() == resumed.status_grid().tobytes()
+    assert model.rng.bit_generator.state['state'] == \
+        resumed.rng.bit_generator.state['state']
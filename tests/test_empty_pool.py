@@ -0,0 +1,30 @@
+import numpy as np
+from empty_pool import EmptyPool
+
+
+def test_pool_tracks_a_set():
+    rng = np.random.default_rng(0)
+    cells = [(x, y) for x in range(10) for y in range(10)]
+    pool = EmptyPool(cells[:50])
+    empty = set(cells[:50])
+    for cell in rng.permutation(len(cells)).tolist() * 3:
+        cell = cells[cell]
+        if cell in empty:
+            pool.remove(cell)
+            empty.discard(cell)
+        else:
+            pool.add(cell)
+            empty.add(cell)
+        assert len(pool) == len(empty)
+        assert set(pool) == empty
+        assert all(pool.cells[pool.index[c]] == c for c in empty)
+        if empty:
+            assert pool.choice(rng.random()) in empty
+
+
+def test_choice_is_uniform_over_the_slots():
+    pool = EmptyPool(range(4))
+    picks = [pool.choice(roll) for roll in (0.0, 0.24, 0.25, 0.5, 0.99)]
+    assert picks == [0, 0, 1, 2, 3]
+    pool.remove(1)
+    assert list(pool) == [0, 3, 2]
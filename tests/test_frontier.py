@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from infection_model import VirusModel
+
+
+@pytest.mark.parametrize('synchronous', [False, True])
+@pytest.mark.parametrize('params', [
+    dict(max_range=1),
+    dict(max_range=2, neighborhood='von_neumann', boundary='torus'),
+])
+def test_frontier_matches_full_scan(params, synchronous):
+    models = [VirusModel("t", 30, 40, 0.05, 6, 0.5, 0.05, 60, seed=4,
+                         frontier=frontier, synchronous=synchronous,
+                         **params)
+              for frontier in (False, True)]
+    for model in models:
+        model.populate()
+        model.update(False)
+    full, frontier = models
+
+    assert full.recorded_metrics()['deaths'].sum() > 0
+    for name, values in full.recorded_metrics().items():
+        assert np.array_equal(frontier.recorded_metrics()[name], values)
+    assert list(frontier.infected_agents.items()) == \
+        list(full.infected_agents.items())
+    assert list(frontier.healthy_agents) == list(full.healthy_agents)
+
+    # the exposure counts still match a count from scratch
+    exposure = {}
+    for agent in full.infected_agents:
+        for neighbor in full.contacts.cells(agent):
+            exposure[neighbor] = exposure.get(neighbor, 0) + 1
+    assert frontier.exposure == exposure
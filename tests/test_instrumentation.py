@@ -0,0 +1,50 @@
+import pytest
+from infection_model import VirusModel
+from schelling_model import Schelling
+from instrumentation import Instruments
+
+POOL_COUNTERS = ('pool_adds', 'pool_removes', 'pool_choices')
+
+
+def make_virus():
+    return VirusModel("t", 30, 30, 0.01, 40, 0.5, 0.05, 30, seed=2)
+
+
+def make_schelling():
+    return Schelling(30, 30, 0.3, 0.7, 30, 2, seed=2)
+
+
+def run(model, **kwargs):
+    if isinstance(model, VirusModel):
+        model.update(False, **kwargs)
+    else:
+        model.update(**kwargs)
+
+
+@pytest.mark.parametrize('make', [make_virus, make_schelling])
+def test_pool_counts_across_resume(make, tmp_path):
+    checkpoint = str(tmp_path / "run.ckpt")
+
+    # an uninterrupted run, with the counters as they were when the
+    # last checkpoint was saved
+    model = make()
+    instruments = Instruments(model)
+    at = {}
+    instruments.observe(lambda model, i: at.__setitem__(
+        model.iteration + 1,
+        {name: instruments.counters[name] for name in POOL_COUNTERS}))
+    model.populate()
+    run(model, checkpoint=checkpoint, checkpoint_every=7)
+
+    # the same run carried on from that checkpoint counts the pool
+    # operations of the remaining iterations
+    resumed = make()
+    resumed_instruments = Instruments(resumed)
+    resumed.resume(checkpoint)
+    assert resumed.iteration == 28
+    run(resumed)
+    for name in POOL_COUNTERS:
+        assert resumed_instruments.counters[name] == \
+            instruments.counters[name] - at[28][name]
+    assert sum(resumed_instruments.counters[name]
+               for name in POOL_COUNTERS) > 0
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import numpy as np
+from infection_model import VirusModel
+from virus_jit import VirusJitModel
+from schelling_model import Schelling
+from schelling_jit import SchellingJit
+
+VIRUS_CASES = [dict(max_range=1),
+               dict(max_range=2, neighborhood='von_neumann',
+                    boundary='torus')]
+SCHELLING_CASES = [dict(ratio_empty=0.3, tolerance=0.5, num_races=2),
+                   dict(ratio_empty=0.1, tolerance=0.6, num_races=3,
+                        neighborhood='von_neumann', boundary='torus')]
+
+
+def check_virus(params, seed):
+    models = [cls("t", 30, 40, 0.05, 6, 0.5, 0.05, 60, seed=seed, **params)
+              for cls in (VirusModel, VirusJitModel)]
+    for model in models:
+        model.populate()
+        model.update(False)
+    dict_model, jit_model = models
+    assert dict_model.recorded_metrics()['deaths'].sum() > 0
+    for name, values in dict_model.recorded_metrics().items():
+        assert np.array_equal(jit_model.recorded_metrics()[name], values)
+    assert np.array_equal(jit_model.status_grid(), dict_model.status_grid())
+    assert list(jit_model.infected_agents.items()) == \
+        list(dict_model.infected_agents.items())
+
+
+def check_schelling(params, seed):
+    models = [cls(40, 50, num_iter=60, seed=seed, **params)
+              for cls in (Schelling, SchellingJit)]
+    for model in models:
+        model.populate()
+        model.update()
+    dict_model, jit_model = models
+    assert np.array_equal(jit_model.changes_per_iter,
+                          dict_model.changes_per_iter)
+    assert np.array_equal(jit_model.status_grid(), dict_model.status_grid())
+    assert list(jit_model.agents.items()) == list(dict_model.agents.items())
+
+
+def check_all():
+    for seed in (0, 1):
+        for params in VIRUS_CASES:
+            check_virus(params, seed)
+        for params in SCHELLING_CASES:
+            check_schelling(params, seed)
+
+
+def test_same_runs_as_dict_engines():
+    check_all()
+
+
+def test_same_runs_without_numba():
+    # a fresh interpreter in which numba cannot be imported runs the
+    # kernels as plain Python
+    script = ("import sys\n"
+              "sys.modules['numba'] = None\n"
+              "import jit, test_jit\n"
+              "assert not jit.HAVE_NUMBA\n"
+              "test_jit.check_all()\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__))] + sys.path))
+    subprocess.run([sys.executable, '-c', script], env=env, check=True)
+
@@ -0,0 +1,32 @@
+from infection_model import VirusModel
+from schelling_model import Schelling
+
+
+def window(cell, shape):
+    x, y = cell
+    return [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+            if (dx, dy) != (0, 0) and 0 <= x + dx < shape[0] and
+            0 <= y + dy < shape[1]]
+
+
+def test_schelling_probes_match_the_window():
+    model = Schelling(30, 20, 0.3, 0.5, 10, 3, seed=1)
+    model.populate()
+    for agent, race in model.agents.items():
+        races = [model.agents[cell] for cell in window(agent, (30, 20))
+                 if cell in model.agents]
+        expected = bool(races) and \
+            races.count(race) / len(races) < model.tolerance
+        assert model.is_unsatisfied(*agent) == expected
+
+
+def test_virus_probes_match_the_window():
+    model = VirusModel("t", 30, 20, 0.05, 6, 0.5, 0.1, 10, seed=1)
+    model.populate()
+    infected = set(model.infected_agents)
+    n_exposed = 0
+    for agent in model.healthy_agents:
+        expected = bool(infected.intersection(window(agent, (30, 20))))
+        assert model.exposed(agent) == expected
+        n_exposed += expected
+    assert n_exposed > 0
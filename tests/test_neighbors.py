@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from neighbors import Neighborhood
+
+
+@pytest.mark.parametrize('boundary', ['bounded', 'torus'])
+@pytest.mark.parametrize('kind', ['moore', 'von_neumann'])
+def test_table_distances(kind, boundary):
+    size_x, size_y = 7, 9
+    hood = Neighborhood((size_x, size_y), 3, kind, boundary,
+                        include_center=True)
+    indptr, indices = hood.table()
+    distances = hood.table_distances()
+    assert len(distances) == len(indices)
+
+    cells = np.repeat(np.arange(size_x * size_y), np.diff(indptr))
+    dx = abs(indices // size_y - cells // size_y)
+    dy = abs(indices % size_y - cells % size_y)
+    if boundary == 'torus':
+        dx = np.minimum(dx, size_x - dx)
+        dy = np.minimum(dy, size_y - dy)
+    expected = np.maximum(dx, dy) if kind == 'moore' else dx + dy
+    assert (distances == expected).all()
+
+
+def test_small_torus_is_rejected():
+    Neighborhood((5, 5), 2, boundary='torus')
+    Neighborhood((4, 4), 2, boundary='bounded')
+    with pytest.raises(ValueError):
+        Neighborhood((4, 9), 2, boundary='torus')
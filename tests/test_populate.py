@@ -0,0 +1,33 @@
+import numpy as np
+from infection_model import VirusModel, EMPTY, HEALTHY, INFECTED
+from virus_grid import VirusGridModel
+from virus_jit import VirusJitModel
+from schelling_model import Schelling
+from schelling_grid import SchellingGrid
+from schelling_jit import SchellingJit
+
+
+def test_virus_layout_comes_from_one_permutation():
+    cells = np.random.default_rng(4).permutation(30 * 40)
+    expected = np.full(30 * 40, HEALTHY, dtype=np.uint8)
+    expected[cells[:600]] = EMPTY
+    expected[cells[600:660]] = INFECTED
+    for cls in (VirusModel, VirusGridModel, VirusJitModel):
+        model = cls("t", 30, 40, 0.05, 6, 0.5, 0.1, 10, seed=4)
+        model.populate()
+        assert np.array_equal(model.status_grid().ravel(), expected)
+        assert len(model.infected_agents) == 60
+
+
+def test_schelling_layout_comes_from_one_permutation():
+    houses = np.random.default_rng(4).permutation(30 * 40)
+    expected = np.zeros(30 * 40, dtype=np.uint8)
+    for race in range(3):
+        expected[houses[360 + race::3]] = race + 1
+    models = [cls(30, 40, 0.3, 0.5, 10, 3, seed=4)
+              for cls in (Schelling, SchellingGrid, SchellingJit)]
+    for model in models:
+        model.populate()
+        assert np.array_equal(model.status_grid().ravel(), expected)
+        assert list(model.agents) == list(models[0].agents)
+        assert list(model.empty_houses) == list(models[0].empty_houses)
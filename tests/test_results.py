@@ -0,0 +1,26 @@
+import numpy as np
+from infection_model import VirusModel
+from results import load_run, save_run
+
+
+def test_load_result_restores_the_finished_model(tmp_path):
+    model = VirusModel("t", 30, 30, 0.2, 5, 0.4, 0.1, 20, seed=3)
+    model.populate()
+    model.update(False)
+    assert model.recorded_metrics()['deaths'][-1] > 0
+    file_name = str(tmp_path / 'run.npz')
+    save_run(file_name, model, with_state=True)
+
+    loaded = VirusModel("t", 30, 30, 0.2, 5, 0.4, 0.1, 20, seed=3)
+    loaded.load_result(load_run(file_name))
+    # the cells of dead agents stay out of the empty spots
+    assert list(loaded.empty_spots) == list(model.empty_spots)
+    for name, values in model.checkpoint_arrays().items():
+        assert np.array_equal(loaded.checkpoint_arrays()[name], values)
+    for name, values in model.recorded_metrics().items():
+        assert np.array_equal(loaded.recorded_metrics()[name], values)
+
+    model.update(False)
+    loaded.update(False)
+    for name, values in model.recorded_metrics().items():
+        assert np.array_equal(loaded.recorded_metrics()[name], values)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from schelling_model import Schelling
+from schelling_grid import SchellingGrid
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('params', [
+    dict(ratio_empty=0.3, tolerance=0.3, num_races=2),
+    dict(ratio_empty=0.1, tolerance=0.6, num_races=3,
+         neighborhood='von_neumann', boundary='torus'),
+])
+def test_same_moves_as_schelling(seed, params):
+    models = [cls(40, 50, num_iter=100, seed=seed, **params)
+              for cls in (Schelling, SchellingGrid)]
+    for model in models:
+        model.populate()
+        model.update()
+    schelling, grid = models
+    assert np.array_equal(grid.changes_per_iter, schelling.changes_per_iter)
+    assert np.array_equal(grid.status_grid(), schelling.status_grid())
+    assert list(grid.agents) == list(schelling.agents)
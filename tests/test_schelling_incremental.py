@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from schelling_model import Schelling
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('params', [
+    dict(ratio_empty=0.3, tolerance=0.5, num_races=2),
+    dict(ratio_empty=0.1, tolerance=0.6, num_races=3,
+         neighborhood='von_neumann', boundary='torus'),
+])
+def test_dirty_heap_matches_full_rescan(seed, params):
+    models = [Schelling(40, 50, num_iter=60, seed=seed,
+                        incremental=incremental, **params)
+              for incremental in (False, True)]
+    for model in models:
+        model.populate()
+        model.update()
+    full, incremental = models
+
+    assert full.changes_per_iter.sum() > 0
+    assert np.array_equal(incremental.changes_per_iter,
+                          full.changes_per_iter)
+    assert list(incremental.agents.items()) == list(full.agents.items())
+    assert list(incremental.empty_houses) == list(full.empty_houses)
+
+    # the cached neighbor counts still match a count from scratch
+    cached = incremental.neighbor_counts
+    incremental.count_all()
+    assert np.array_equal(cached, incremental.neighbor_counts)
@@ -0,0 +1,52 @@
+import random
+import numpy as np
+import pytest
+from infection_model import VirusModel
+from virus_grid import VirusGridModel
+from virus_jit import VirusJitModel
+from virus_events import VirusEventModel
+from virus_ensemble import VirusEnsemble
+from schelling_model import Schelling
+from schelling_grid import SchellingGrid
+from schelling_jit import SchellingJit
+
+VIRUS_ENGINES = [VirusModel, VirusGridModel, VirusJitModel, VirusEventModel]
+SCHELLING_ENGINES = [Schelling, SchellingGrid, SchellingJit]
+
+
+def run(cls, seed):
+    if cls is VirusEnsemble:
+        model = cls("t", 30, 30, 0.05, 6, 0.5, 0.05, 40, 3, seed=seed)
+        model.populate()
+        model.update()
+        return model, model.status
+    if cls in VIRUS_ENGINES:
+        model = cls("t", 30, 30, 0.05, 6, 0.5, 0.05, 40, seed=seed)
+        model.populate()
+        model.update(False)
+        return model, model.status_grid()
+    model = cls(30, 30, 0.3, 0.5, 20, 2, seed=seed)
+    model.populate()
+    model.update()
+    return model, model.status_grid()
+
+
+@pytest.mark.parametrize('cls', VIRUS_ENGINES + [VirusEnsemble] +
+                         SCHELLING_ENGINES)
+def test_same_seed_same_run(cls):
+    # the global random streams play no part in a seeded run
+    random.seed(1)
+    np.random.seed(1)
+    first, first_grid = run(cls, 7)
+    random.seed(2)
+    np.random.seed(2)
+    second, second_grid = run(cls, np.random.SeedSequence(7))
+    other, other_grid = run(cls, 8)
+
+    assert first.recorded_metrics().keys() == \
+        second.recorded_metrics().keys()
+    for name, values in first.recorded_metrics().items():
+        assert np.hstack(values).tobytes() == \
+            np.hstack(second.recorded_metrics()[name]).tobytes()
+    assert first_grid.tobytes() == second_grid.tobytes()
+    assert first_grid.tobytes() != other_grid.tobytes()
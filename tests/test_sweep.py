@@ -0,0 +1,32 @@
+import csv
+import numpy as np
+from sweep import run_sweep, run_seed, write_csv
+
+
+def draw(params, seed):
+    rng = np.random.default_rng(seed)
+    return [{'value': rng.integers(1 << 30)} for _ in range(params['n'])]
+
+
+def test_rows_rerun_from_csv(tmp_path):
+    rows = run_sweep(draw, {'n': [1, 2]}, replicates=3, seed=7, workers=1)
+    file_name = str(tmp_path / 'sweep.csv')
+    write_csv(rows, file_name)
+    with open(file_name, newline='') as f:
+        read = list(csv.DictReader(f))
+
+    assert len(read) == len(rows) == 9
+    runs = {}
+    for row in read:
+        runs.setdefault(row['spawn_key'], []).append(int(row['value']))
+    assert len(runs) == 6
+    for row in read:
+        rerun = draw({'n': int(row['n'])}, run_seed(row))
+        assert [r['value'] for r in rerun] == runs[row['spawn_key']]
+
+
+def test_empty_sweep(tmp_path):
+    file_name = str(tmp_path / 'sweep.csv')
+    write_csv(run_sweep(draw, {'n': []}, workers=1), file_name)
+    with open(file_name) as f:
+        assert f.read() == ''
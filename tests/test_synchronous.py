@@ -0,0 +1,61 @@
+import numpy as np
+from infection_model import VirusModel
+from schelling_model import Schelling
+
+
+def reverse(agents):
+    return dict(reversed(list(agents.items())))
+
+
+def test_virus_order_does_not_matter():
+    models = [VirusModel("t", 30, 40, 0.05, 6, 0.5, 0.05, 60, seed=seed,
+                         synchronous=True)
+              for seed in (3, 3)]
+    for model in models:
+        model.populate()
+    shuffled = models[1]
+    shuffled.healthy_agents = reverse(shuffled.healthy_agents)
+    shuffled.infected_agents = reverse(shuffled.infected_agents)
+    for model in models:
+        model.update(False)
+
+    first, second = models
+    assert first.recorded_metrics()['deaths'].sum() > 0
+    for name, values in first.recorded_metrics().items():
+        assert np.array_equal(second.recorded_metrics()[name], values)
+    assert np.array_equal(first.status_grid(), second.status_grid())
+
+
+def test_schelling_order_does_not_matter():
+    models = [Schelling(40, 50, 0.3, 0.5, 30, 2, seed=3, synchronous=True)
+              for _ in range(2)]
+    for model in models:
+        model.populate()
+    models[1].agents = reverse(models[1].agents)
+    for model in models:
+        model.update()
+
+    first, second = models
+    assert np.array_equal(first.changes_per_iter, second.changes_per_iter)
+    assert np.array_equal(first.status_grid(), second.status_grid())
+
+
+def test_schelling_agents_see_the_start_of_the_iteration():
+    model = Schelling(40, 50, 0.2, 0.6, 10, 3, seed=5, synchronous=True)
+    model.populate()
+    for _ in range(10):
+        before = model.status_grid()
+        unsatisfied = {agent for agent in model.agents
+                       if model.is_unsatisfied(*agent)}
+        n_changes = model.step_synchronous()
+        after = model.status_grid()
+
+        left = set(zip(*np.nonzero((before > 0) & (after != before))))
+        arrived = set(zip(*np.nonzero((after > 0) & (after != before))))
+        # only agents unhappy with the old grid move, only into houses
+        # that were empty, and nobody moves into a house left this turn
+        assert left <= unsatisfied
+        assert all(before[house] == 0 for house in arrived)
+        assert len(left) == len(arrived) == n_changes
+        assert np.array_equal(np.bincount(before.ravel(), minlength=4),
+                              np.bincount(after.ravel(), minlength=4))
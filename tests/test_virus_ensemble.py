@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from virus_grid import VirusGridModel
+from virus_ensemble import VirusEnsemble
+
+
+@pytest.mark.parametrize('boundary', ['bounded', 'torus'])
+def test_one_replicate_is_a_grid_run(boundary):
+    params = (30, 40, 0.03, 14, 0.6, 0.02, 100)
+    grid = VirusGridModel("t", *params, max_range=2, seed=4,
+                          boundary=boundary)
+    ensemble = VirusEnsemble("t", *params, replicates=1, max_range=2,
+                             seed=4, boundary=boundary)
+    for model in (grid, ensemble):
+        model.populate()
+    grid.update(False)
+    ensemble.update()
+
+    series = ensemble.recorded_metrics()
+    assert np.array_equal(series['infected'][0], grid.infected_population)
+    assert np.array_equal(series['deaths'][0][1:], grid.deaths_per_iter)
+    assert np.array_equal(ensemble.status[0], grid.status)
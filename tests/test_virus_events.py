@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from virus_events import VirusEventModel, MOVE
+
+
+def make(move_radius=None):
+    return VirusEventModel("t", 50, 50, 0.03, 10, 0.6, 0.02, 60,
+                           max_range=2, seed=3, move_rate=0.5,
+                           move_radius=move_radius)
+
+
+@pytest.mark.parametrize('move_radius', [None, 3])
+def test_resume_handles_the_same_events(move_radius, tmp_path):
+    checkpoint = str(tmp_path / "run.ckpt")
+    model = make(move_radius)
+    model.populate()
+    model.update(False, checkpoint=checkpoint, checkpoint_every=13)
+
+    resumed = make(move_radius)
+    resumed.resume(checkpoint)
+    assert resumed.iteration > 0
+    resumed.update(False)
+    assert np.array_equal(resumed.infected_population,
+                          model.infected_population)
+    assert np.array_equal(resumed.deaths_per_iter, model.deaths_per_iter)
+    assert np.array_equal(resumed.status_grid(), model.status_grid())
+
+
+def test_only_agents_near_the_outbreak_move():
+    model = VirusEventModel("t", 60, 60, 0.03, 10, 0.9, 0.02, 1,
+                            max_range=1, seed=1, move_radius=2)
+    model.populate()
+    model.start()
+    movers = {agent for agent, kind in model.pending if kind == MOVE}
+    near = {cell for agent in model.infected_agents
+            for cell in model.moving_area.cells(agent)}
+    assert movers and movers <= near
+    assert len(movers) < len(model.healthy_agents) + \
+        len(model.infected_agents)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from infection_model import VirusModel
+from virus_grid import VirusGridModel
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('params', [
+    dict(max_range=1),
+    dict(max_range=2, neighborhood='von_neumann', boundary='torus'),
+])
+def test_same_run_as_synchronous_dict_model(seed, params):
+    args = ("t", 30, 40, 0.05, 6, 0.5, 0.05, 60)
+    grid = VirusGridModel(*args, seed=seed, **params)
+    dict_model = VirusModel(*args, seed=seed, synchronous=True, **params)
+    for model in (grid, dict_model):
+        model.populate()
+        model.update(False)
+
+    assert dict_model.recorded_metrics()['deaths'].sum() > 0
+    assert grid.n_recorded == dict_model.n_recorded
+    for name, values in dict_model.recorded_metrics().items():
+        assert np.array_equal(grid.recorded_metrics()[name], values)
+    assert np.array_equal(grid.status_grid(), dict_model.status_grid())
+    assert grid.infected_agents == dict_model.infected_agents
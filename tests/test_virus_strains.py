@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from infection_agent import infection
+from virus_grid import VirusGridModel
+from virus_strains import VirusStrainModel
+
+
+@pytest.mark.parametrize('boundary', ['bounded', 'torus'])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_one_strain_is_the_grid_model(seed, boundary):
+    args = ("t", 40, 30, 0.05, 5, 0.5, 0.03, 150, 2)
+    grid = VirusGridModel(*args, seed=seed, boundary=boundary)
+    strains = VirusStrainModel(*args, seed=seed, boundary=boundary)
+    for model in (grid, strains):
+        model.populate()
+        model.update(False)
+
+    for name, values in grid.recorded_metrics().items():
+        assert np.array_equal(strains.recorded_metrics()[name], values)
+    assert np.array_equal(strains.status, grid.status)
+    assert np.array_equal(strains.days_ill, grid.days_ill)
+    assert np.array_equal(strains.infected_by_strain[0],
+                          strains.infected_population)
+
+
+def test_strains_add_up():
+    strains = [infection(0.01, 10, 0.5, immunity=(0, 1)),
+               infection(0.08, 6, 0.9, immunity=(1,))]
+    model = VirusStrainModel("t", 60, 60, 0.0, 0, 0.5, 0.02, 200, seed=1,
+                             strains=strains)
+    model.populate()
+    model.update(False)
+
+    metrics = model.recorded_metrics()
+    assert (model.infected_by_strain.sum(axis=0) ==
+            model.infected_population).all()
+    assert (metrics['deaths_0'] + metrics['deaths_1'] ==
+            metrics['deaths']).all()
+    assert metrics['deaths_1'].sum() > 0
@@ -0,0 +1,52 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+import pytest
+import virus_tiles
+from virus_grid import VirusGridModel
+from virus_tiles import VirusTiledModel
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3])
+@pytest.mark.parametrize('params', [
+    dict(max_range=1),
+    dict(max_range=2, neighborhood='von_neumann', boundary='torus'),
+])
+def test_same_run_as_grid_model(workers, params):
+    args = ("t", 30, 40, 0.05, 6, 0.5, 0.05, 60)
+    grid = VirusGridModel(*args, seed=2, **params)
+    tiled = VirusTiledModel(*args, seed=2, workers=workers, **params)
+    assert len(tiled.strips()) == workers
+    for model in (grid, tiled):
+        model.populate()
+        model.update(False)
+
+    assert grid.recorded_metrics()['deaths'].sum() > 0
+    for name, values in grid.recorded_metrics().items():
+        assert np.array_equal(tiled.recorded_metrics()[name], values)
+    assert np.array_equal(tiled.status, grid.status)
+    assert np.array_equal(tiled.days_ill, grid.days_ill)
+    # the stream has moved on by the same draws
+    assert tiled.rng.bit_generator.state['state'] == \
+        grid.rng.bit_generator.state['state']
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason="the patched step only reaches forked workers")
+def test_dead_worker_stops_the_run(monkeypatch):
+    step = virus_tiles.Tile.step
+
+    def crash(tile):
+        if tile.rank == 1:
+            os._exit(3)
+        step(tile)
+
+    monkeypatch.setattr(virus_tiles.Tile, 'step', crash)
+    model = VirusTiledModel("t", 40, 40, 0.05, 6, 0.5, 0.1, 20, seed=1,
+                            workers=2, timeout=2)
+    model.populate()
+    start = time.time()
+    with pytest.raises(RuntimeError, match=r"\[3\]"):
+        model.update(False)
+    assert time.time() - start < 30